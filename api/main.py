@@ -1,25 +1,64 @@
 import os
-from typing import List, Optional, Any, Dict
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Any, Dict
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request #type:ignore
-from fastapi.responses import JSONResponse, HTMLResponse#type:ignore
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse#type:ignore
 from fastapi.middleware.cors import CORSMiddleware#type:ignore
 from fastapi.staticfiles import StaticFiles#type:ignore
 from fastapi.templating import Jinja2Templates#type:ignore
 from pathlib import Path
+from langchain_core.messages import AIMessage, HumanMessage #type:ignore
 from src.document_ingestion.data_ingestion import (
     DocHandler,
     DocumentComparator,
     ChatIngestor,
 )
-from src.document_analyzer.data_analysis import DocumentAnalyzer
-from src.document_compare.document_comparator import DocumentComparatorLLM
-from src.document_chat.retrieval import ConversationalRAG
+from src.document_analyzer.data_analysis import DocumentAnalyzer, analysis_cache_version
+from src.document_compare.document_comparator import DocumentComparatorLLM, comparison_cache_version
+from src.document_ingestion.ingestion_jobs import get_job_manager, shutdown_job_manager
+from src.document_chat.retrieval import ConversationalRAG, REWRITE_CACHE
+from utlis.model_loader import MODEL_REGISTRY
+from utlis.vectorstore_cache import VECTORSTORE_CACHE
+from utlis.answer_cache import ANSWER_CACHE
+from utlis.embedding_cache import get_embedding_store
+from utlis.concurrency import run_blocking, shutdown_blocking_pool
+from utlis.document_parser import DOCUMENT_PARSER
+from utlis.pdf_extractor import pdf_metadata, shutdown_pool as shutdown_pdf_pool
+from utlis.document_ops import FastAPIFileAdapter
+from utlis.file_io import MAX_UPLOAD_BYTES, UploadTooLargeError, sha256_upload
+from utlis.result_cache import get_result_cache
+from utlis.structured_output import STRUCTURED_OUTPUT_STATS
+from utlis.chat_history import get_chat_history_store, llm_summarizer
+from logger import GLOBAL_LOGGER as log
 
 FAISS_BASE = os.getenv("FAISS_BASE", "faiss_index")
 UPLOAD_BASE = os.getenv("UPLOAD_BASE", "data")
 FAISS_INDEX_NAME = os.getenv("FAISS_INDEX_NAME", "index") 
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(4 * MAX_UPLOAD_BYTES)))
+# Fold turns that fall out of the history token budget into an LLM-written summary
+CHAT_HISTORY_SUMMARIZE = os.getenv("CHAT_HISTORY_SUMMARIZE", "false").lower() in ("1", "true", "yes")
+_BACKGROUND_TASKS: set = set()
 
-app = FastAPI(title="Document Portal API", version="0.1")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build LLM/embedding clients once per worker instead of once per request
+    try:
+        MODEL_REGISTRY.warm_up()
+    except Exception as e:
+        log.warning("Model registry warm-up failed; models will load lazily", error=str(e))
+    # Creating the manager marks jobs orphaned by a previous worker as failed
+    try:
+        get_job_manager()
+    except Exception as e:
+        log.warning("Ingestion job recovery failed", error=str(e))
+    yield
+    shutdown_job_manager()
+    shutdown_pdf_pool()
+    shutdown_blocking_pool()
+
+app = FastAPI(title="Document Portal API", version="0.1", lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
@@ -33,6 +72,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def reject_oversized_requests(request: Request, call_next):
+    # Refuse oversized uploads from the Content-Length header, before the body is read
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={"detail": f"Request body exceeds {MAX_REQUEST_BYTES} bytes"})
+    return await call_next(request)
+
 @app.get("/", response_class=HTMLResponse)
 async def serve_ui(request: Request):
     resp = templates.TemplateResponse("index.html", {"request": request})
@@ -43,38 +90,81 @@ async def serve_ui(request: Request):
 def health() -> Dict[str, str]:
     return {"status": "ok", "service": "document-portal"}
 
+@app.get("/metrics")
+def metrics() -> Dict[str, Any]:
+    return {
+        "vectorstore_cache": VECTORSTORE_CACHE.stats(),
+        "embedding_cache": get_embedding_store().stats(),
+        "parsed_page_cache": DOCUMENT_PARSER.stats(),
+        "rewrite_cache": REWRITE_CACHE.stats(),
+        "answer_cache": ANSWER_CACHE.stats(),
+        "chat_history": get_chat_history_store().stats(),
+        "result_cache": get_result_cache().stats(),
+        "structured_output": STRUCTURED_OUTPUT_STATS.stats(),
+    }
+
 # ---------- ANALYZE ----------
 @app.post("/analyze")
 async def analyze_document(file: UploadFile = File(...)) -> Any:
     try:
+        key = await _result_key("analyze", [file], analysis_cache_version())
+        cached = await run_blocking(get_result_cache().get, key)
+        if cached is not None:
+            return JSONResponse(content=cached, headers={"X-Cache": "HIT"})
+        dh = DocHandler()
+        saved_path = await run_blocking(dh.save_pdf, FastAPIFileAdapter(file))
+        pages, file_meta = await run_blocking(_read_pages, dh, saved_path)
+        analyzer = DocumentAnalyzer()
+        result = await analyzer.aanalyze_pages(pages, file_meta)
+        await run_blocking(get_result_cache().put, key, "analyze", result)
+        return JSONResponse(content=result, headers={"X-Cache": "MISS"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _http_error("Analysis failed", e)
+
+@app.post("/analyze/stream")
+async def analyze_document_stream(file: UploadFile = File(...)) -> Any:
+    try:
+        key = await _result_key("analyze", [file], analysis_cache_version())
+        cached = await run_blocking(get_result_cache().get, key)
+        if cached is not None:
+            return _sse_response(_cached_events(cached), headers={"X-Cache": "HIT"})
         dh = DocHandler()
-        saved_path = dh.save_pdf(FastAPIFileAdapter(file))
-        text = _read_pdf_via_handler(dh, saved_path)
+        saved_path = await run_blocking(dh.save_pdf, FastAPIFileAdapter(file))
+        pages, file_meta = await run_blocking(_read_pages, dh, saved_path)
         analyzer = DocumentAnalyzer()
-        result = analyzer.analyze_document(text)
-        return JSONResponse(content=result)
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
+        raise _http_error("Analysis failed", e)
+    return _sse_response(_caching_events(analyzer.astream_pages_analysis(pages, file_meta), key, "analyze"), headers={"X-Cache": "MISS"})
 
 # ---------- COMPARE ----------
 @app.post("/compare")
 async def compare_documents(reference: UploadFile = File(...), actual: UploadFile = File(...)) -> Any:
     try:
+        key = await _result_key("compare", [reference, actual], comparison_cache_version())
+        cached = await run_blocking(get_result_cache().get, key)
+        if cached is not None:
+            return JSONResponse(content={"rows": cached["rows"], "session_id": None}, headers={"X-Cache": "HIT"})
         dc = DocumentComparator()
-        ref_path, act_path = dc.save_uploaded_files(
-            FastAPIFileAdapter(reference), FastAPIFileAdapter(actual)
+        ref_path, act_path = await run_blocking(
+            dc.save_uploaded_files, FastAPIFileAdapter(reference), FastAPIFileAdapter(actual)
         )
-        _ = ref_path, act_path
-        combined_text = dc.combine_documents()
+        ref_pages = await run_blocking(dc.read_pages, ref_path)
+        act_pages = await run_blocking(dc.read_pages, act_path)
         comp = DocumentComparatorLLM()
-        df = comp.compare_documents(combined_text)
-        return {"rows": df.to_dict(orient="records"), "session_id": dc.session_id}
+        df = await comp.acompare_pages(ref_pages, act_pages)
+        rows = df.to_dict(orient="records")
+        # Rows of failed batches are placeholders: never serve them from the cache
+        if not comp.failed_batches:
+            await run_blocking(get_result_cache().put, key, "compare", {"rows": rows})
+        return JSONResponse(content={"rows": rows, "session_id": dc.session_id}, headers={"X-Cache": "MISS"})
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
+        raise _http_error("Comparison failed", e)
 
 # ---------- CHAT: INDEX ----------
 @app.post("/chat/index")
@@ -88,7 +178,8 @@ async def chat_build_index(
 ) -> Any:
     try:
         wrapped = [FastAPIFileAdapter(f) for f in files]
-        ci = ChatIngestor(
+        ci = await run_blocking(
+            ChatIngestor,
             temp_base=UPLOAD_BASE,
             faiss_base=FAISS_BASE,
             use_session_dirs=use_session_dirs,
@@ -96,14 +187,63 @@ async def chat_build_index(
         )
         # NOTE: ensure your ChatIngestor saves with index_name="index" or FAISS_INDEX_NAME
         # e.g., if it calls FAISS.save_local(dir, index_name=FAISS_INDEX_NAME)
-        ci.built_retriver(  # if your method name is actually build_retriever, fix it there as well
-            wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
+        await run_blocking(  # if your method name is actually build_retriever, fix it there as well
+            ci.built_retriver, wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
         )
         return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs}
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Indexing failed: {e}")
+        raise _http_error("Indexing failed", e)
+
+@app.post("/chat/index/jobs")
+async def chat_build_index_job(
+    files: List[UploadFile] = File(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    chunk_size: int = Form(1000),
+    chunk_overlap: int = Form(200),
+    k: int = Form(5),
+) -> Any:
+    # Save uploads within the request (they are gone afterwards), then return a job id
+    # while parsing/splitting/embedding/indexing runs in the ingestion worker pool.
+    try:
+        wrapped = [FastAPIFileAdapter(f) for f in files]
+        ci = await run_blocking(
+            ChatIngestor,
+            temp_base=UPLOAD_BASE,
+            faiss_base=FAISS_BASE,
+            use_session_dirs=use_session_dirs,
+            session_id=session_id or None,
+        )
+        paths = await run_blocking(ci.save_files, wrapped)
+        if not paths:
+            raise HTTPException(status_code=400, detail="No supported files uploaded")
+        job_id = await run_blocking(
+            get_job_manager().submit, ci, paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
+        )
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "session_id": ci.session_id, "status": "queued", "k": k, "use_session_dirs": use_session_dirs},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _http_error("Indexing job submission failed", e)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Any:
+    job = await run_blocking(get_job_manager().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str) -> Any:
+    job = await run_blocking(get_job_manager().cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
 
 # ---------- CHAT: QUERY ----------
 @app.post("/chat/query")
@@ -122,8 +262,10 @@ async def chat_query(
             raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
 
         rag = ConversationalRAG(session_id=session_id)
-        rag.load_retriever_from_faiss(index_dir, k=k, index_name=FAISS_INDEX_NAME)  # build retriever + chain
-        response = rag.invoke(question, chat_history=[])
+        await run_blocking(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME)  # build retriever + chain
+        history = await _load_history(session_id)
+        response = await rag.ainvoke(question, chat_history=history)
+        await _remember(session_id, question, response)
 
         return {
             "answer": response,
@@ -134,25 +276,123 @@ async def chat_query(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+        raise _http_error("Query failed", e)
+
+@app.post("/chat/query/stream")
+async def chat_query_stream(
+    question: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    k: int = Form(5),
+) -> Any:
+    try:
+        if use_session_dirs and not session_id:
+            raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
+
+        index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
+        if not os.path.isdir(index_dir):
+            raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+
+        rag = ConversationalRAG(session_id=session_id)
+        await run_blocking(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME)
+        history = await _load_history(session_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _http_error("Query failed", e)
+
+    async def events() -> AsyncIterator[Dict[str, Any]]:
+        tokens: List[str] = []
+        async for event in rag.astream(question, chat_history=history):
+            if event["event"] == "token":
+                tokens.append(event["data"])
+            yield event
+        await _remember(session_id, question, "".join(tokens))
+
+    return _sse_response(events(), session_id=session_id)
+
+@app.delete("/chat/history/{session_id}")
+async def clear_chat_history(session_id: str) -> Dict[str, Any]:
+    await run_blocking(get_chat_history_store().clear, session_id)
+    return {"session_id": session_id, "cleared": True}
 
 
 # ---------- Helpers ----------
-class FastAPIFileAdapter:
-    """Adapt FastAPI UploadFile -> .name + .getbuffer() API"""
-    def __init__(self, uf: UploadFile):
-        self._uf = uf
-        self.name = uf.filename
-    def getbuffer(self) -> bytes:
-        self._uf.file.seek(0)
-        return self._uf.file.read()
-
-def _read_pdf_via_handler(handler: DocHandler, path: str) -> str:
-    if hasattr(handler, "read_pdf"):
-        return handler.read_pdf(path)  # type: ignore
-    if hasattr(handler, "read_"):
-        return handler.read_(path)  # type: ignore
-    raise RuntimeError("DocHandler has neither read_pdf nor read_ method.")
+
+async def _load_history(session_id: Optional[str]):
+    """Token-budgeted server-side history for the session (none without a session id)."""
+    if not session_id:
+        return []
+    return await run_blocking(get_chat_history_store().window, session_id)
+
+async def _remember(session_id: Optional[str], question: str, answer: str):
+    if not session_id or not answer:
+        return
+    store = get_chat_history_store()
+    await run_blocking(store.append, session_id, [HumanMessage(content=question), AIMessage(content=answer)])
+    if CHAT_HISTORY_SUMMARIZE:
+        # Off the request path: the next turn picks the summary up once it is written
+        task = asyncio.create_task(_summarize_history(session_id))
+        _BACKGROUND_TASKS.add(task)
+        task.add_done_callback(_BACKGROUND_TASKS.discard)
+
+async def _summarize_history(session_id: str):
+    try:
+        summarizer = llm_summarizer(MODEL_REGISTRY.get_llm())
+        await run_blocking(get_chat_history_store().summarize, session_id, summarizer)
+    except Exception as e:
+        log.warning("Chat history summarization failed", session_id=session_id, error=str(e))
+
+def _http_error(message: str, e: BaseException) -> HTTPException:
+    """500 for pipeline failures, 413 when the root cause is an oversized upload."""
+    cause: Optional[BaseException] = e
+    while cause is not None:
+        if isinstance(cause, UploadTooLargeError):
+            return HTTPException(status_code=413, detail=str(cause))
+        cause = cause.__cause__
+    return HTTPException(status_code=500, detail=f"{message}: {e}")
+
+async def _result_key(kind: str, uploads: List[UploadFile], version: str) -> str:
+    # Content hashes of the uploads (in order) + pipeline version + configured model
+    digests = [await run_blocking(sha256_upload, u.file) for u in uploads]
+    return get_result_cache().make_key(kind, digests, version, MODEL_REGISTRY.llm_identity())
+
+async def _cached_events(result: Any) -> AsyncIterator[Dict[str, Any]]:
+    yield {"event": "result", "data": result}
+
+async def _caching_events(events: AsyncIterator[Dict[str, Any]], key: str, kind: str) -> AsyncIterator[Dict[str, Any]]:
+    # Pass events through and store the final result once the stream completes
+    async for ev in events:
+        if ev["event"] == "result":
+            await run_blocking(get_result_cache().put, key, kind, ev["data"])
+        yield ev
+
+def _sse_response(events: AsyncIterator[Dict[str, Any]], headers: Optional[Dict[str, str]] = None, **meta: Any) -> StreamingResponse:
+    """Render pipeline events as Server-Sent Events; failures become a final 'error' event."""
+    async def body():
+        if meta:
+            yield _sse_frame("meta", meta)
+        try:
+            async for ev in events:
+                yield _sse_frame(ev["event"], ev["data"])
+            yield _sse_frame("done", {})
+        except Exception as e:
+            log.error("Streaming response failed", error=str(e))
+            yield _sse_frame("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+def _sse_frame(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _read_pages(handler: DocHandler, path: str):
+    # Page texts (parsed-page cache keyed by the upload's sha256) plus the PDF's own metadata
+    pages = DOCUMENT_PARSER.parse_pages(path, digest=getattr(handler, "sha256", None))
+    return pages, pdf_metadata(path)
 
 
 
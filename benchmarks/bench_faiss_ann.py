@@ -0,0 +1,96 @@
+"""
+Benchmark: recall vs latency of the configurable ANN index types against flat search.
+
+Builds each index with utlis.ann_index.build_index (the same code path FaissManager
+uses) on a synthetic clustered corpus, then sweeps the query-time knob:
+  flat    : exact baseline (ground truth)
+  hnsw    : efSearch sweep
+  ivf_pq  : nprobe sweep
+
+Reports build time, index size (serialized bytes), mean latency per query and
+recall@k against the flat results.
+
+Usage:
+    python benchmarks/bench_faiss_ann.py --vectors 100000 --dim 384
+    python benchmarks/bench_faiss_ann.py --vectors 20000 --ef-search 16 64 --nprobe 4 16
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import faiss  # type: ignore
+from utlis.ann_index import build_index, index_settings, set_search_params
+
+
+def make_corpus(n: int, dim: int, queries: int, clusters: int, seed: int = 0):
+    """Gaussian blobs around random centroids, roughly like topic-clustered embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype("float32")
+    assign = rng.integers(0, clusters, size=n + queries)
+    data = centroids[assign] + 0.35 * rng.normal(size=(n + queries, dim)).astype("float32")
+    return np.ascontiguousarray(data[:n]), np.ascontiguousarray(data[n:])
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def timed_search(index, queries: np.ndarray, k: int):
+    started = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return (time.perf_counter() - started) * 1000 / len(queries), ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    logging.getLogger("doc_portal").setLevel(logging.WARNING)
+    faiss.omp_set_num_threads(1)  # per-query latency, as seen by one request
+    corpus, queries = make_corpus(args.vectors, args.dim, args.queries, args.clusters)
+
+    config = {"vector_index": {
+        "hnsw": {"m": args.hnsw_m},
+        "ivf_pq": {"nlist": args.nlist, "pq_m": args.pq_m, "min_train_vectors": 0},
+    }}
+
+    print(f"{'index':<10}{'param':>14}{'build':>10}{'size MB':>10}{'ms/query':>10}{'recall@' + str(args.k):>11}")
+    for kind in ("flat", "hnsw", "ivf_pq"):
+        settings = index_settings({"vector_index": {**config["vector_index"], "type": kind}})
+        started = time.perf_counter()
+        index = build_index(corpus, settings)
+        build_s = time.perf_counter() - started
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        if kind == "flat":
+            latency, truth = timed_search(index, queries, args.k)
+            print(f"{kind:<10}{'exact':>14}{build_s:>9.2f}s{size_mb:>10.1f}{latency:>10.3f}{1.0:>11.3f}")
+            continue
+
+        sweep = [("ef_search", v) for v in args.ef_search] if kind == "hnsw" else [("nprobe", v) for v in args.nprobe]
+        for name, value in sweep:
+            set_search_params(index, **{name: value})
+            latency, found = timed_search(index, queries, args.k)
+            print(f"{kind:<10}{f'{name}={value}':>14}{build_s:>9.2f}s{size_mb:>10.1f}{latency:>10.3f}"
+                  f"{recall_at_k(found, truth):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
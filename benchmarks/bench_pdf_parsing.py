@@ -0,0 +1,93 @@
+"""
+Benchmark: old PDF loaders vs the unified DocumentParser backend.
+
+Compares, per PDF in the corpus:
+  pypdf        : langchain PyPDFLoader (what load_documents and the legacy ingestors used)
+  fitz-serial  : the old DocHandler/DocumentComparator page loop
+  parser-cold  : DocumentParser with an empty cache (parallel PyMuPDF extraction)
+  parser-warm  : DocumentParser on a re-analysis of the same file (cache hit)
+
+Pass --corpus DIR to use real PDFs; otherwise a synthetic corpus is generated.
+
+Usage:
+    python benchmarks/bench_pdf_parsing.py --pages 50 200 1000
+    python benchmarks/bench_pdf_parsing.py --corpus path/to/pdfs
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fitz  # type: ignore
+from langchain_community.document_loaders import PyPDFLoader  # type: ignore
+from utlis.document_parser import DocumentParser
+
+PARAGRAPH = (
+    "This agreement is entered into by the parties named herein. Clause {n}: the supplier shall "
+    "deliver the goods described in Schedule A within thirty (30) days of the purchase order. "
+)
+
+
+def make_pdf(path: Path, pages: int):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        text = "\n".join(PARAGRAPH.format(n=f"{i + 1}.{j}") for j in range(12))
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    doc.save(str(path))
+    doc.close()
+
+
+def fitz_serial(path: Path):
+    with fitz.open(str(path)) as doc:
+        return [doc.load_page(i).get_text() for i in range(doc.page_count)]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=None)
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 200, 1000])
+    args = parser.parse_args()
+
+    logging.getLogger("doc_portal").setLevel(logging.WARNING)
+    workdir = Path(tempfile.mkdtemp(prefix="doc_portal_parse_bench_"))
+    try:
+        if args.corpus:
+            pdfs = sorted(args.corpus.glob("*.pdf"))
+        else:
+            pdfs = []
+            for n in args.pages:
+                path = workdir / f"synthetic_{n}p.pdf"
+                make_pdf(path, n)
+                pdfs.append(path)
+
+        print(f"{'file':<24}{'pages':>7}{'pypdf':>10}{'fitz-serial':>13}{'parser-cold':>13}{'parser-warm':>13}{'speedup':>9}")
+        for path in pdfs:
+            doc_parser = DocumentParser(cache_dir=workdir / "cache" / path.stem)
+            t_pypdf, pypdf_docs = timed(lambda p: PyPDFLoader(str(p)).load(), path)
+            t_serial, _ = timed(fitz_serial, path)
+            t_cold, docs = timed(doc_parser.load, path)
+            t_warm, _ = timed(doc_parser.load, path)
+            print(f"{path.name[:23]:<24}{len(docs):>7}{t_pypdf:>9.3f}s{t_serial:>12.3f}s"
+                  f"{t_cold:>12.3f}s{t_warm:>12.3f}s{t_pypdf / t_cold:>8.1f}x")
+            if len(pypdf_docs) != len(docs):
+                print(f"  page count mismatch: pypdf={len(pypdf_docs)} parser={len(docs)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Load test: how many concurrent /analyze requests one API worker can serve.
+
+Runs the FastAPI app in-process (one event loop == one uvicorn worker) with the LLM
+replaced by a fake model that sleeps for --llm-latency seconds, then fires --requests
+uploads with --concurrency in flight. Two modes are measured:
+
+  blocking : the route awaits the old synchronous analyze_document (event loop stalls)
+  async    : the route as shipped (ainvoke + work offloaded to the blocking pool)
+
+Usage:
+    python benchmarks/load_test_async.py --requests 32 --concurrency 16 --llm-latency 0.5
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import fitz  # type: ignore
+import httpx  # type: ignore
+from langchain_core.language_models.fake_chat_models import FakeListChatModel  # type: ignore
+
+FAKE_ANALYSIS = json.dumps({
+    "Summary": ["Benchmark document."], "Title": "Bench", "Author": ["Bench"],
+    "DateCreated": "2025-01-01", "LastModifiedDate": "2025-01-01", "Publisher": "Bench",
+    "Language": "English", "PageCount": 3, "SentimentTone": "Neutral",
+})
+
+
+def make_pdf(path: Path, pages: int = 3):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Benchmark page {i + 1}\n" + "lorem ipsum " * 50)
+    doc.save(str(path))
+    doc.close()
+
+
+async def run_load(app, pdf_bytes: bytes, requests: int, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(client):
+        async with sem:
+            started = time.perf_counter()
+            resp = await client.post("/analyze", files={"file": ("bench.pdf", pdf_bytes, "application/pdf")})
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(requests)))
+        wall = time.perf_counter() - started
+    return wall, latencies
+
+
+def report(mode: str, requests: int, wall: float, latencies):
+    lat = sorted(latencies)
+    p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+    print(f"{mode:<9} wall={wall:7.2f}s  throughput={requests / wall:6.2f} req/s  "
+          f"p50={statistics.median(lat):6.2f}s  p95={p95:6.2f}s")
+    return requests / wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    workdir = Path(tempfile.mkdtemp(prefix="doc_portal_bench_"))
+    os.environ["DATA_STORAGE_PATH"] = str(workdir / "analysis")
+    # Every request uploads the same PDF: with the result cache on, all but the first
+    # would be cache hits that never reach the (fake) LLM
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    pdf_path = workdir / "bench.pdf"
+    make_pdf(pdf_path)
+    pdf_bytes = pdf_path.read_bytes()
+
+    from utlis.model_loader import MODEL_REGISTRY
+    from src.document_analyzer.data_analysis import DocumentAnalyzer
+    from api.main import app
+
+    fake_llm = FakeListChatModel(responses=[FAKE_ANALYSIS], sleep=args.llm_latency)
+    MODEL_REGISTRY.get_llm = lambda: fake_llm  # type: ignore[method-assign]
+
+    shipped = DocumentAnalyzer.aanalyze_document
+
+    async def blocking_analyze(self, document_text):
+        return self.analyze_document(document_text)
+
+    DocumentAnalyzer.aanalyze_document = blocking_analyze  # type: ignore[method-assign]
+    wall, lat = asyncio.run(run_load(app, pdf_bytes, args.requests, args.concurrency))
+    blocking_rps = report("blocking", args.requests, wall, lat)
+
+    DocumentAnalyzer.aanalyze_document = shipped  # type: ignore[method-assign]
+    wall, lat = asyncio.run(run_load(app, pdf_bytes, args.requests, args.concurrency))
+    async_rps = report("async", args.requests, wall, lat)
+
+    print(f"concurrency gain per worker: {async_rps / blocking_rps:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,4 +25,8 @@ class PromptType(str, Enum):
     DOCUMENT_ANALYSIS = "document_analysis"
     DOCUMENT_COMPARISON = "document_comparison"
     CONTEXTUALIZE_QUESTION = "contextualize_question"
-    CONTEXT_QA = "context_qa"
\ No newline at end of file
+    CONTEXT_QA = "context_qa"
+    CHAT_HISTORY_SUMMARY = "chat_history_summary"
+    SECTION_SUMMARY = "section_summary"
+    DOCUMENT_ANALYSIS_REDUCE = "document_analysis_reduce"
+    PAGE_DIFF_COMPARISON = "page_diff_comparison"
\ No newline at end of file
@@ -28,6 +28,49 @@ Your response should follow this format:
 {format_instruction}
 """)
 
+# Prompt for describing pre-computed page diffs between two PDFs
+page_diff_comparison_prompt = ChatPromptTemplate.from_template("""
+You will be given line diffs for the pages that differ between a reference PDF and
+an actual PDF. Lines starting with '-' are from the reference, lines starting with
+'+' are from the actual document; other lines are unchanged context.
+
+For every page listed, describe in plain words what changed. Return exactly one
+entry per page and copy the page label exactly as given (e.g. "3", "3->4", or
+"ref 2" / "act 2" for a page that exists only in the reference / actual document).
+
+Page diffs:
+{page_diffs}
+
+Your response should follow this format:
+{format_instruction}
+""")
+
+# Map step of the chunked analysis: summarize one section of a large document
+section_summary_prompt = ChatPromptTemplate.from_template("""
+You are summarizing one section (pages {pages}) of a larger document.
+Write a concise bullet-point summary of the key points in this section. Also note any
+cues about the document's title, authors, dates, publisher, language and tone.
+
+Section:
+{section_text}
+""")
+
+# Reduce step of the chunked analysis: merge section summaries into the metadata schema
+document_analysis_reduce_prompt = ChatPromptTemplate.from_template("""
+You are a highly capable assistant trained to analyze and summarize documents.
+You are given summaries of consecutive sections of one document and the metadata
+stored in the PDF file itself. Fields the file metadata provides are filled in from
+it, so the schema below leaves them out.
+Return ONLY valid JSON matching the exact schema below.
+{format_instructions}
+
+File metadata:
+{file_metadata}
+
+Section summaries:
+{section_summaries}
+""")
+
 # Prompt for contextual question rewriting
 contextualize_question_prompt = ChatPromptTemplate.from_messages([
     ("system", (
@@ -50,10 +93,25 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
     ("human", "{input}"),
 ])
 
+# Prompt for folding old chat turns into a rolling summary
+chat_history_summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", (
+        "Condense the conversation below into a short summary that preserves the facts, names, numbers and open "
+        "questions a follow-up question might refer to. Extend the existing summary; do not repeat it verbatim.\n\n"
+        "Existing summary:\n{summary}"
+    )),
+    MessagesPlaceholder("messages"),
+    ("human", "Write the updated summary."),
+])
+
 # Central dictionary to register prompts
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
     "document_comparison": document_comparison_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
+    "chat_history_summary": chat_history_summary_prompt,
+    "page_diff_comparison": page_diff_comparison_prompt,
+    "section_summary": section_summary_prompt,
+    "document_analysis_reduce": document_analysis_reduce_prompt,
 }
\ No newline at end of file
@@ -1,12 +1,85 @@
 import os
 import sys
-from utlis.model_loader import ModelLoader
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import create_model
+from utlis.model_loader import MODEL_REGISTRY
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 from model.models import *
-from langchain_core.output_parsers import JsonOutputParser # type: ignore
-from langchain.output_parsers import OutputFixingParser # type: ignore
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser # type: ignore
 from prompt.prompt_library import PROMPT_REGISTRY # type: ignore
+from utlis.result_cache import prompt_version
+from utlis.structured_output import RobustJsonOutputParser
+
+# Token budget of one map-step section (~4 characters per token) and how many
+# section summaries may be in flight at once
+ANALYSIS_SECTION_TOKENS = int(os.getenv("ANALYSIS_SECTION_TOKENS", "6000"))
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "4"))
+
+# pdf_metadata() key -> Metadata field it fills; the LLM is not asked for these when the file has them
+FILE_METADATA_FIELDS = {
+    "page_count": "PageCount",
+    "title": "Title",
+    "author": "Author",
+    "created": "DateCreated",
+    "modified": "LastModifiedDate",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _span(first: str, last: str) -> str:
+    start, end = first.split("-")[0], last.split("-")[-1]
+    return start if start == end else f"{start}-{end}"
+
+
+def pack_sections(items: List[Tuple[str, str]], max_tokens: int = ANALYSIS_SECTION_TOKENS) -> List[Tuple[str, str]]:
+    """
+    Greedily pack consecutive (page label, text) items into sections of at most
+    max_tokens, never splitting an item unless it alone exceeds the budget.
+    Returns [(page span, section text)] in document order.
+    """
+    max_chars = max_tokens * 4
+    pieces: List[Tuple[str, str]] = []
+    for label, text in items:
+        if len(text) <= max_chars:
+            pieces.append((label, text))
+        else:
+            pieces.extend((label, text[i:i + max_chars]) for i in range(0, len(text), max_chars))
+
+    sections: List[Tuple[str, str]] = []
+    labels: List[str] = []
+    parts: List[str] = []
+    size = 0
+    for label, text in pieces:
+        if parts and size + len(text) > max_chars:
+            sections.append((_span(labels[0], labels[-1]), "\n".join(parts)))
+            labels, parts, size = [], [], 0
+        labels.append(label)
+        parts.append(text)
+        size += len(text)
+    if parts:
+        sections.append((_span(labels[0], labels[-1]), "\n".join(parts)))
+    return sections
+
+
+def split_sections(pages: List[str], max_tokens: int = ANALYSIS_SECTION_TOKENS) -> List[Tuple[str, str]]:
+    """Page texts -> page-aligned sections within the token budget."""
+    items = [(str(n), f"\n--- Page {n} ---\n{text}") for n, text in enumerate(pages, start=1) if text.strip()]
+    return pack_sections(items, max_tokens)
+
+
+def analysis_cache_version() -> str:
+    """Version of the analysis pipeline (prompts, schema, section budget) for the result cache."""
+    return prompt_version(
+        [PromptType.DOCUMENT_ANALYSIS.value, PromptType.SECTION_SUMMARY.value, PromptType.DOCUMENT_ANALYSIS_REDUCE.value],
+        JsonOutputParser(pydantic_object=Metadata).get_format_instructions(),
+        str(ANALYSIS_SECTION_TOKENS),
+    )
+
 
 class DocumentAnalyzer:
     """
@@ -15,14 +88,17 @@ class DocumentAnalyzer:
     """
     def __init__(self):
         try:
-            self.loader=ModelLoader()
-            self.llm=self.loader.load_llm()
+            self.llm=MODEL_REGISTRY.get_llm()
+            # Same client with the provider's JSON mode bound, for the calls parsed as JSON
+            self.json_llm = MODEL_REGISTRY.get_json_llm()
             
-            # Prepare parsers
+            # Prepare parsers: local JSON repair first, an LLM fix only as a last resort
             self.parser = JsonOutputParser(pydantic_object=Metadata)
-            self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
+            self.fixing_parser = RobustJsonOutputParser(parser=self.parser, llm=self.llm, source="document_analyzer")
             
             self.prompt = PROMPT_REGISTRY["document_analysis"]
+            self.section_prompt = PROMPT_REGISTRY[PromptType.SECTION_SUMMARY.value]
+            self.reduce_prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS_REDUCE.value]
             
             log.info("DocumentAnalyzer initialized successfully")
             
@@ -33,17 +109,17 @@ class DocumentAnalyzer:
         
         
     
-    def analyze_document(self, document_text:str)-> dict:
+    def analyze_document(self, document_text:str, format_instructions: Optional[str] = None)-> dict:
         """
         Analyze a document's text and extract structured metadata & summary.
         """
         try:
-            chain = self.prompt | self.llm | self.fixing_parser
+            chain = self.prompt | self.json_llm | self.fixing_parser
             
             log.info("Meta-data analysis chain initialized")
 
             response = chain.invoke({
-                "format_instructions": self.parser.get_format_instructions(),
+                "format_instructions": format_instructions or self.parser.get_format_instructions(),
                 "document_text": document_text
             })
 
@@ -54,5 +130,212 @@ class DocumentAnalyzer:
         except Exception as e:
             log.error("Metadata analysis failed", error=str(e))
             raise DocumentPortalException("Metadata extraction failed",sys)
-        
-    
\ No newline at end of file
+
+    async def aanalyze_document(self, document_text:str, format_instructions: Optional[str] = None)-> dict:
+        """
+        Async variant of analyze_document; awaits the LLM instead of blocking the event loop.
+        """
+        try:
+            chain = self.prompt | self.json_llm | self.fixing_parser
+
+            response = await chain.ainvoke({
+                "format_instructions": format_instructions or self.parser.get_format_instructions(),
+                "document_text": document_text
+            })
+
+            log.info("Metadata extraction successful", keys=list(response.keys()))
+
+            return response
+
+        except Exception as e:
+            log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys)
+
+    async def astream_analysis(self, document_text:str, format_instructions: Optional[str] = None):
+        """
+        Stream raw LLM tokens as they arrive, then the parsed metadata as the final event.
+        """
+        try:
+            chain = self.prompt | self.json_llm | StrOutputParser()
+            parts = []
+            async for token in chain.astream({
+                "format_instructions": format_instructions or self.parser.get_format_instructions(),
+                "document_text": document_text
+            }):
+                parts.append(token)
+                yield {"event": "token", "data": token}
+
+            response = await self.fixing_parser.aparse("".join(parts))
+            log.info("Metadata extraction successful", keys=list(response.keys()))
+            yield {"event": "result", "data": response}
+
+        except Exception as e:
+            log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys)
+
+    # ---------- Map-reduce over pages (documents larger than one context window) ----------
+
+    def _format_instructions(self, file_meta: Optional[Dict[str, Any]]) -> str:
+        """Metadata schema without the fields the file metadata already provides."""
+        known = {field for key, field in FILE_METADATA_FIELDS.items() if (file_meta or {}).get(key)}
+        if not known:
+            return self.parser.get_format_instructions()
+        fields = {name: (f.annotation, ...) for name, f in Metadata.model_fields.items() if name not in known}
+        return JsonOutputParser(pydantic_object=create_model("Metadata", **fields)).get_format_instructions()
+
+    @staticmethod
+    def _apply_file_metadata(response: dict, file_meta: Optional[Dict[str, Any]]) -> dict:
+        """Fill the fields the PDF states itself; the model is only asked for the rest."""
+        if not file_meta:
+            return response
+        response["PageCount"] = file_meta.get("page_count", response.get("PageCount"))
+        if file_meta.get("title"):
+            response["Title"] = file_meta["title"]
+        if file_meta.get("author"):
+            response["Author"] = [a.strip() for a in file_meta["author"].replace(";", ",").split(",") if a.strip()]
+        if file_meta.get("created"):
+            response["DateCreated"] = file_meta["created"]
+        if file_meta.get("modified"):
+            response["LastModifiedDate"] = file_meta["modified"]
+        return response
+
+    def _reduce_inputs(self, summaries: List[Tuple[str, str]], file_meta: Optional[Dict[str, Any]]) -> dict:
+        return {
+            "format_instructions": self._format_instructions(file_meta),
+            "file_metadata": "\n".join(f"{k}: {v}" for k, v in (file_meta or {}).items() if v) or "(none)",
+            "section_summaries": "\n\n".join(f"[Pages {span}]\n{text}" for span, text in summaries),
+        }
+
+    def _section_chain(self):
+        return self.section_prompt | self.llm | StrOutputParser()
+
+    def _summarize(self, sections: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Map step: one summary per section, at most ANALYSIS_MAX_CONCURRENCY in flight."""
+        outputs = self._section_chain().batch(
+            [{"pages": span, "section_text": text} for span, text in sections],
+            config={"max_concurrency": ANALYSIS_MAX_CONCURRENCY},
+        )
+        return [(span, out) for (span, _), out in zip(sections, outputs)]
+
+    def _collapse(self, summaries: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        # Summaries of a very long document can still overflow the reduce prompt:
+        # re-summarize groups of them until they fit one section
+        while len(summaries) > 1 and estimate_tokens("".join(t for _, t in summaries)) > ANALYSIS_SECTION_TOKENS:
+            groups = pack_sections(summaries)
+            if len(groups) == len(summaries):
+                break
+            summaries = self._summarize(groups)
+        return summaries
+
+    async def _asummarize(self, sections: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        outputs = await self._section_chain().abatch(
+            [{"pages": span, "section_text": text} for span, text in sections],
+            config={"max_concurrency": ANALYSIS_MAX_CONCURRENCY},
+        )
+        return [(span, out) for (span, _), out in zip(sections, outputs)]
+
+    async def _acollapse(self, summaries: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        while len(summaries) > 1 and estimate_tokens("".join(t for _, t in summaries)) > ANALYSIS_SECTION_TOKENS:
+            groups = pack_sections(summaries)
+            if len(groups) == len(summaries):
+                break
+            summaries = await self._asummarize(groups)
+        return summaries
+
+    def analyze_pages(self, pages: List[str], file_meta: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Analyze a document given as page texts. A document that fits one section goes
+        through analyze_document in a single call; a larger one is summarized section
+        by section and the summaries are reduced into the metadata schema.
+        """
+        try:
+            sections = split_sections(pages)
+            if len(sections) <= 1:
+                text = sections[0][1] if sections else ""
+                response = self.analyze_document(text, self._format_instructions(file_meta))
+                return self._apply_file_metadata(response, file_meta)
+
+            summaries = self._collapse(self._summarize(sections))
+            response = (self.reduce_prompt | self.json_llm | self.fixing_parser).invoke(self._reduce_inputs(summaries, file_meta))
+            log.info("Map-reduce analysis successful", pages=len(pages), sections=len(sections))
+            return self._apply_file_metadata(response, file_meta)
+
+        except DocumentPortalException:
+            raise
+        except Exception as e:
+            log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys)
+
+    async def aanalyze_pages(self, pages: List[str], file_meta: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Async variant of analyze_pages; section summaries run concurrently.
+        """
+        try:
+            sections = split_sections(pages)
+            if len(sections) <= 1:
+                text = sections[0][1] if sections else ""
+                response = await self.aanalyze_document(text, self._format_instructions(file_meta))
+                return self._apply_file_metadata(response, file_meta)
+
+            summaries = await self._acollapse(await self._asummarize(sections))
+            chain = self.reduce_prompt | self.json_llm | self.fixing_parser
+            response = await chain.ainvoke(self._reduce_inputs(summaries, file_meta))
+            log.info("Map-reduce analysis successful", pages=len(pages), sections=len(sections))
+            return self._apply_file_metadata(response, file_meta)
+
+        except DocumentPortalException:
+            raise
+        except Exception as e:
+            log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys)
+
+    async def astream_pages_analysis(self, pages: List[str], file_meta: Optional[Dict[str, Any]] = None):
+        """
+        Streaming variant of aanalyze_pages: a progress event per finished section,
+        then the reduce step's tokens, then the parsed metadata as the final event.
+        """
+        try:
+            sections = split_sections(pages)
+            if len(sections) <= 1:
+                text = sections[0][1] if sections else ""
+                async for event in self.astream_analysis(text, self._format_instructions(file_meta)):
+                    if event["event"] == "result":
+                        event = {"event": "result", "data": self._apply_file_metadata(event["data"], file_meta)}
+                    yield event
+                return
+
+            chain = self._section_chain()
+            semaphore = asyncio.Semaphore(ANALYSIS_MAX_CONCURRENCY)
+
+            async def summarize(i: int, span: str, text: str) -> Tuple[int, str]:
+                async with semaphore:
+                    return i, await chain.ainvoke({"pages": span, "section_text": text})
+
+            tasks = [asyncio.ensure_future(summarize(i, span, text)) for i, (span, text) in enumerate(sections)]
+            done: Dict[int, str] = {}
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    i, summary = await finished
+                    done[i] = summary
+                    yield {"event": "progress", "data": {"sections_done": len(done), "sections": len(sections), "pages": sections[i][0]}}
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            summaries = await self._acollapse([(span, done[i]) for i, (span, _) in enumerate(sections)])
+            parts = []
+            async for token in (self.reduce_prompt | self.json_llm | StrOutputParser()).astream(
+                self._reduce_inputs(summaries, file_meta)
+            ):
+                parts.append(token)
+                yield {"event": "token", "data": token}
+
+            response = await self.fixing_parser.aparse("".join(parts))
+            log.info("Map-reduce analysis successful", pages=len(pages), sections=len(sections))
+            yield {"event": "result", "data": self._apply_file_metadata(response, file_meta)}
+
+        except DocumentPortalException:
+            raise
+        except Exception as e:
+            log.error("Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys)
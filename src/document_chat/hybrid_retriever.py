@@ -0,0 +1,81 @@
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun  # type: ignore
+from langchain_core.documents import Document  # type: ignore
+from langchain_core.retrievers import BaseRetriever  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+from utlis.sparse_index import BM25Index
+
+DEFAULT_HYBRID_SETTINGS: Dict[str, Any] = {
+    "enabled": True,
+    "dense_weight": 1.0,
+    "sparse_weight": 1.0,
+    "rrf_k": 60,
+    "fetch_k": 20,
+}
+
+
+def hybrid_settings(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Merge retriever.hybrid from config.yaml over the defaults."""
+    retriever = (config or {}).get("retriever") or {}
+    return {**DEFAULT_HYBRID_SETTINGS, **(retriever.get("hybrid") or {})}
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or f"{doc.metadata.get('source')}::{doc.page_content}"
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Document]], weights: List[float], k: int, rrf_k: int = 60
+) -> List[Document]:
+    """
+    Fuse ranked result lists: score(d) = sum over lists of weight / (rrf_k + rank).
+    Documents are matched across lists by docstore id.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(ranked, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (FAISS) + sparse (BM25) retrieval fused with weighted reciprocal rank fusion.
+
+    Each side fetches fetch_k candidates; the fused top k is returned. Exact-term
+    queries (clause numbers, invoice ids, product codes) are carried by the sparse
+    side where embeddings alone tend to miss them.
+    """
+
+    vectorstore: FAISS
+    sparse_index: BM25Index
+    k: int = 5
+    fetch_k: int = 20
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+    rrf_k: int = 60
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @classmethod
+    def from_settings(cls, vectorstore: FAISS, sparse_index: BM25Index, k: int, settings: Dict[str, Any]) -> "HybridRetriever":
+        return cls(
+            vectorstore=vectorstore,
+            sparse_index=sparse_index,
+            k=k,
+            fetch_k=max(k, int(settings["fetch_k"])),
+            dense_weight=float(settings["dense_weight"]),
+            sparse_weight=float(settings["sparse_weight"]),
+            rrf_k=int(settings["rrf_k"]),
+        )
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        sparse = [doc for doc, _ in self.sparse_index.search(query, k=self.fetch_k)]
+        return reciprocal_rank_fusion(
+            [dense, sparse], [self.dense_weight, self.sparse_weight], k=self.k, rrf_k=self.rrf_k
+        )
@@ -1,20 +1,63 @@
 import sys
 import os
+import re
+import json
+import hashlib
 from operator import itemgetter
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any, Tuple
 
+from langchain_core.documents import Document #type:ignore
 from langchain_core.messages import BaseMessage #type:ignore
 from langchain_core.output_parsers import StrOutputParser #type:ignore
 from langchain_core.prompts import ChatPromptTemplate #type:ignore
-from langchain_community.vectorstores import FAISS #type:ignore
+from langchain_core.runnables import RunnableLambda #type:ignore
 
-from utlis.model_loader import ModelLoader
+from utlis.model_loader import MODEL_REGISTRY
+from utlis.vectorstore_cache import VECTORSTORE_CACHE
+from utlis.faiss_store import FAISS_MMAP, FaissStore, load_faiss_index
+from utlis.answer_cache import ANSWER_CACHE
+from utlis import ann_index
+from utlis.sparse_index import BM25Index
+from src.document_chat.hybrid_retriever import HybridRetriever, hybrid_settings
+from src.multi_document_chat.mmr import MaximalMarginalRelevance
+from src.multi_document_chat.contextualcompression import EmbeddingsSentenceFilter
+from utlis.concurrency import run_blocking
+from utlis.lru_cache import LRUCache
 from exception.custom_exception import DocumentPortalException
 from logger import GLOBAL_LOGGER as log
 from prompt.prompt_library import PROMPT_REGISTRY
 from model.models import PromptType
 
 
+# A post-retrieval stage: (question, docs) -> docs, e.g. MMR re-ranking or compression
+RetrievalStage = Callable[[str, List[Document]], List[Document]]
+
+# Rewritten questions keyed by (chat history hash, question), shared across sessions
+REWRITE_CACHE = LRUCache(max_entries=int(os.getenv("REWRITE_CACHE_SIZE", "1024")))
+
+# Words that point back into the conversation; a question without them (and long
+# enough to carry its own subject) is treated as standalone and not rewritten
+_REFERENCE_RE = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|him|her|his|hers|"
+    r"above|previous|earlier|former|latter|same|there|else|again|one|ones)\b"
+    r"|^\s*(and|also|but|so|or|what about|how about|why|more|then)\b",
+    re.IGNORECASE,
+)
+STANDALONE_MIN_WORDS = 4
+
+
+def needs_rewrite(question: str, chat_history: Optional[List[BaseMessage]]) -> bool:
+    """Cheap router: rewrite only follow-ups that may depend on earlier turns."""
+    if not chat_history:
+        return False
+    return len(question.split()) < STANDALONE_MIN_WORDS or bool(_REFERENCE_RE.search(question))
+
+
+def _history_key(chat_history: List[BaseMessage], question: str) -> str:
+    turns = [(m.type, m.content) for m in chat_history]
+    return hashlib.sha256(json.dumps([turns, question], ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
 class ConversationalRAG:
     """
     LCEL-based Conversational RAG with lazy retriever initialization.
@@ -25,7 +68,7 @@ class ConversationalRAG:
         answer = rag.invoke("What is ...?", chat_history=[])
     """
 
-    def __init__(self, session_id: Optional[str], retriever=None):
+    def __init__(self, session_id: Optional[str], retriever=None, stages: Optional[List[RetrievalStage]] = None):
         try:
             self.session_id = session_id
 
@@ -40,7 +83,19 @@ class ConversationalRAG:
 
             # Lazy pieces
             self.retriever = retriever
+            # Set by load_retriever_from_faiss; the answer cache needs to know the index
+            self.index_path: Optional[str] = None
+            self.index_name = "index"
+            self.embeddings = None
+            # Fingerprint of k, search type and stages: answers are only shared between
+            # retrievers that would have fetched the same context
+            self.retrieval_key = ""
+            # Explicit stages win; otherwise they are configured from config.yaml on load
+            self._explicit_stages = stages is not None
+            self.stages: List[RetrievalStage] = list(stages or [])
             self.chain = None
+            self.question_rewriter = None
+            self.answer_chain = None
             if self.retriever is not None:
                 self._build_lcel_chain()
 
@@ -56,30 +111,74 @@ class ConversationalRAG:
         index_path: str,
         k: int = 5,
         index_name: str = "index",
-        search_type: str = "similarity",
+        search_type: Optional[str] = None,
         search_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """
-        Load FAISS vectorstore from disk and build retriever + LCEL chain.
+        Load FAISS vectorstore (from the per-session cache, or disk on a miss)
+        and build retriever + LCEL chain.
+
+        search_type defaults to "hybrid" (BM25 + vector, RRF-fused) when enabled in
+        config and the index has a sparse index, else "similarity".
         """
         try:
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory not found: {index_path}")
 
-            embeddings = ModelLoader().load_embeddings()
-            vectorstore = FAISS.load_local(
+            embeddings = MODEL_REGISTRY.get_embeddings()
+            self.index_path, self.index_name, self.embeddings = index_path, index_name, embeddings
+            config = MODEL_REGISTRY.config
+            settings = ann_index.index_settings(config)
+            fusion = hybrid_settings(config)
+            if search_type is None:
+                search_type = "hybrid" if fusion["enabled"] and BM25Index.exists_for(index_path) else "similarity"
+            vectorstore = VECTORSTORE_CACHE.get_or_load(
                 index_path,
-                embeddings,
-                index_name=index_name,
-                allow_dangerous_deserialization=True,  # ok if you trust the index
+                index_name,
+                lambda: load_faiss_index(
+                    index_path,
+                    embeddings,
+                    index_name=index_name,
+                    search_params=ann_index.search_params(settings),
+                    read_only=FAISS_MMAP,
+                ),
             )
 
             if search_kwargs is None:
                 search_kwargs = {"k": k}
+            k = int(search_kwargs.get("k", k))
+            if not self._explicit_stages:
+                self.stages = self._stages_from_config(config, vectorstore, embeddings, k)
+            # MMR needs a wider candidate pool than the k it finally keeps
+            mmr = (config.get("retriever") or {}).get("mmr") or {}
+            fetch_k = max(k, int(mmr.get("fetch_k", k))) if any(
+                isinstance(s, MaximalMarginalRelevance) for s in self.stages
+            ) else k
+            # ANN knobs are not retriever kwargs: pass them with each search of this
+            # retriever instead of changing the index shared through the cache
+            search_kwargs = dict(search_kwargs)
+            tuning = {key: search_kwargs.pop(key) for key in ("nprobe", "ef_search") if key in search_kwargs}
+            if tuning:
+                vectorstore = ann_index.with_search_params(vectorstore, **tuning)
 
-            self.retriever = vectorstore.as_retriever(
-                search_type=search_type, search_kwargs=search_kwargs
+            self.retrieval_key = self._retrieval_key(
+                search_type, k, fetch_k, {**search_kwargs, **tuning},
+                {**fusion, "bm25": (config.get("retriever") or {}).get("bm25")} if search_type == "hybrid" else None,
             )
+
+            if search_type == "hybrid":
+                # One BM25 connection per cached index, not one per query
+                sparse = VECTORSTORE_CACHE.get_attached(
+                    index_path,
+                    index_name,
+                    "bm25",
+                    lambda: BM25Index.for_index(index_path, (config.get("retriever") or {}).get("bm25")),
+                )
+                self.retriever = HybridRetriever.from_settings(vectorstore, sparse, fetch_k, fusion)
+            else:
+                self.retriever = vectorstore.as_retriever(
+                    search_type=search_type, search_kwargs={**search_kwargs, "k": fetch_k}
+                )
             self._build_lcel_chain()
 
             log.info(
@@ -87,6 +186,8 @@ class ConversationalRAG:
                 index_path=index_path,
                 index_name=index_name,
                 k=k,
+                search_type=search_type,
+                stages=[type(s).__name__ for s in self.stages],
                 session_id=self.session_id,
             )
             return self.retriever
@@ -104,12 +205,18 @@ class ConversationalRAG:
                 )
             chat_history = chat_history or []
             payload = {"input": user_input, "chat_history": chat_history}
+            probe = self._cache_probe(user_input, chat_history)
+            cached = ANSWER_CACHE.lookup(self.index_path, *probe, retrieval_key=self.retrieval_key) if probe else None
+            if cached is not None:
+                return cached
             answer = self.chain.invoke(payload)
             if not answer:
                 log.warning(
                     "No answer generated", user_input=user_input, session_id=self.session_id
                 )
                 return "no answer generated."
+            if probe:
+                ANSWER_CACHE.put(self.index_path, probe[0], user_input, probe[1], answer, retrieval_key=self.retrieval_key)
             log.info(
                 "Chain invoked successfully",
                 session_id=self.session_id,
@@ -121,11 +228,92 @@ class ConversationalRAG:
             log.error("Failed to invoke ConversationalRAG", error=str(e))
             raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
 
+    async def ainvoke(self, user_input: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Invoke the LCEL pipeline without blocking the event loop."""
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before ainvoke().", sys
+                )
+            chat_history = chat_history or []
+            payload = {"input": user_input, "chat_history": chat_history}
+            probe = await run_blocking(self._cache_probe, user_input, chat_history)
+            cached = ANSWER_CACHE.lookup(self.index_path, *probe, retrieval_key=self.retrieval_key) if probe else None
+            if cached is not None:
+                return cached
+            answer = await self.chain.ainvoke(payload)
+            if not answer:
+                log.warning(
+                    "No answer generated", user_input=user_input, session_id=self.session_id
+                )
+                return "no answer generated."
+            if probe:
+                ANSWER_CACHE.put(self.index_path, probe[0], user_input, probe[1], answer, retrieval_key=self.retrieval_key)
+            log.info(
+                "Chain invoked successfully",
+                session_id=self.session_id,
+                user_input=user_input,
+                answer_preview=str(answer)[:150],
+            )
+            return answer
+        except Exception as e:
+            log.error("Failed to invoke ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
+
+    async def astream(
+        self, user_input: str, chat_history: Optional[List[BaseMessage]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the pipeline as events: the rewritten question, then the retrieved
+        sources, then answer tokens as the LLM produces them.
+        """
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before astream().", sys
+                )
+            chat_history = chat_history or []
+            payload = {"input": user_input, "chat_history": chat_history}
+
+            probe = await run_blocking(self._cache_probe, user_input, chat_history)
+            cached = ANSWER_CACHE.lookup(self.index_path, *probe, retrieval_key=self.retrieval_key) if probe else None
+            if cached is not None:
+                yield {"event": "question", "data": user_input}
+                yield {"event": "token", "data": cached}
+                return
+
+            question = await self._acontextualize(payload)
+            yield {"event": "question", "data": question}
+
+            docs = await self._aretrieve(question)
+            yield {"event": "sources", "data": [self._describe_source(d) for d in docs]}
+
+            parts: List[str] = []
+            async for token in self.answer_chain.astream({**payload, "context": self._format_docs(docs)}):
+                parts.append(token)
+                yield {"event": "token", "data": token}
+
+            answer = "".join(parts)
+            if not answer:
+                log.warning("No answer generated", user_input=user_input, session_id=self.session_id)
+                return
+            if probe:
+                ANSWER_CACHE.put(self.index_path, probe[0], user_input, probe[1], answer, retrieval_key=self.retrieval_key)
+            log.info(
+                "Chain streamed successfully",
+                session_id=self.session_id,
+                user_input=user_input,
+                answer_preview=answer[:150],
+            )
+        except Exception as e:
+            log.error("Failed to stream ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Streaming error in ConversationalRAG", sys)
+
     # ---------- Internals ----------
 
     def _load_llm(self):
         try:
-            llm = ModelLoader().load_llm()
+            llm = MODEL_REGISTRY.get_llm()
             if not llm:
                 raise ValueError("LLM could not be loaded")
             log.info("LLM loaded successfully", session_id=self.session_id)
@@ -134,36 +322,133 @@ class ConversationalRAG:
             log.error("Failed to load LLM", error=str(e))
             raise DocumentPortalException("LLM loading error in ConversationalRAG", sys)
 
+    @staticmethod
+    def _stages_from_config(config: Dict[str, Any], vectorstore, embeddings, k: int) -> List[RetrievalStage]:
+        retriever_cfg = config.get("retriever") or {}
+        mmr = retriever_cfg.get("mmr") or {}
+        compression = retriever_cfg.get("compression") or {}
+        stages: List[RetrievalStage] = []
+        if mmr.get("enabled"):
+            stages.append(MaximalMarginalRelevance(vectorstore, embeddings, k=k, lambda_mult=float(mmr.get("lambda_mult", 0.5))))
+        if compression.get("enabled"):
+            stages.append(EmbeddingsSentenceFilter(
+                embeddings,
+                similarity_threshold=float(compression.get("similarity_threshold", 0.45)),
+                drop_threshold=float(compression.get("drop_threshold", 0.2)),
+                min_sentences=int(compression.get("min_sentences", 2)),
+            ))
+        return stages
+
+    def _retrieval_key(
+        self,
+        search_type: str,
+        k: int,
+        fetch_k: int,
+        search_kwargs: Dict[str, Any],
+        fusion: Optional[Dict[str, Any]],
+    ) -> str:
+        stages = [
+            [type(s).__name__, {a: v for a, v in vars(s).items() if isinstance(v, (bool, int, float, str))}]
+            for s in self.stages
+        ]
+        settings = {
+            "index_name": self.index_name, "search_type": search_type, "k": k, "fetch_k": fetch_k,
+            "search_kwargs": search_kwargs, "stages": stages, "fusion": fusion,
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+    def _cache_probe(self, user_input: str, chat_history: List[BaseMessage]) -> Optional[Tuple[str, List[float]]]:
+        """
+        (index version, question embedding) when the answer cache applies, else None.
+        Only standalone questions are cached: a follow-up's answer depends on the turns
+        before it, not just on its own wording.
+        """
+        if not ANSWER_CACHE.enabled or self.index_path is None or self.embeddings is None:
+            return None
+        if needs_rewrite(user_input, chat_history):
+            return None
+        version = FaissStore(self.index_path, self.index_name).version()
+        return version, self.embeddings.embed_query(user_input)
+
+    def _contextualize(self, payload: Dict[str, Any]) -> str:
+        question, history = payload["input"], payload.get("chat_history") or []
+        if not needs_rewrite(question, history):
+            return question
+        key = _history_key(history, question)
+        rewritten = REWRITE_CACHE.get(key)
+        if rewritten is None:
+            rewritten = self.question_rewriter.invoke(payload)
+            REWRITE_CACHE.put(key, rewritten)
+        return rewritten
+
+    async def _acontextualize(self, payload: Dict[str, Any]) -> str:
+        question, history = payload["input"], payload.get("chat_history") or []
+        if not needs_rewrite(question, history):
+            return question
+        key = _history_key(history, question)
+        rewritten = REWRITE_CACHE.get(key)
+        if rewritten is None:
+            rewritten = await self.question_rewriter.ainvoke(payload)
+            REWRITE_CACHE.put(key, rewritten)
+        return rewritten
+
+    def _apply_stages(self, question: str, docs: List[Document]) -> List[Document]:
+        for stage in self.stages:
+            docs = stage(question, docs)
+        return docs
+
+    def _retrieve(self, question: str) -> List[Document]:
+        return self._apply_stages(question, self.retriever.invoke(question))
+
+    async def _aretrieve(self, question: str) -> List[Document]:
+        docs = await self.retriever.ainvoke(question)
+        if not self.stages:
+            return docs
+        # Stages do NumPy work and (cached) embedding calls: keep them off the event loop
+        return await run_blocking(self._apply_stages, question, docs)
+
     @staticmethod
     def _format_docs(docs) -> str:
         return "\n\n".join(getattr(d, "page_content", str(d)) for d in docs)
 
+    @staticmethod
+    def _describe_source(doc) -> Dict[str, Any]:
+        md = getattr(doc, "metadata", None) or {}
+        return {
+            "source": md.get("source") or md.get("file_path"),
+            "page": md.get("page"),
+            "preview": getattr(doc, "page_content", str(doc))[:200],
+        }
+
     def _build_lcel_chain(self):
         try:
             if self.retriever is None:
                 raise DocumentPortalException("No retriever set before building chain", sys)
 
             # 1) Rewrite user question with chat history context
-            question_rewriter = (
+            self.question_rewriter = question_rewriter = (
                 {"input": itemgetter("input"), "chat_history": itemgetter("chat_history")}
                 | self.contextualize_prompt
                 | self.llm
                 | StrOutputParser()
             )
 
-            # 2) Retrieve docs for rewritten question
-            retrieve_docs = question_rewriter | self.retriever | self._format_docs
+            # 2) Retrieve docs for the (rewritten only when needed) question
+            retrieve_docs = (
+                RunnableLambda(self._contextualize, afunc=self._acontextualize)
+                | RunnableLambda(self._retrieve, afunc=self._aretrieve)
+                | self._format_docs
+            )
 
             # 3) Answer using retrieved context + original input + chat history
+            self.answer_chain = self.qa_prompt | self.llm | StrOutputParser()
             self.chain = (
                 {
                     "context": retrieve_docs,
                     "input": itemgetter("input"),
                     "chat_history": itemgetter("chat_history"),
                 }
-                | self.qa_prompt
-                | self.llm
-                | StrOutputParser()
+                | self.answer_chain
             )
 
             log.info("LCEL graph built successfully", session_id=self.session_id)
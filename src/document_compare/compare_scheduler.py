@@ -0,0 +1,132 @@
+import os
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+from logger import GLOBAL_LOGGER as log
+from src.document_compare.page_diff import PagePair
+
+# Size of one LLM comparison batch (~4 characters per token, and a page cap so one
+# answer stays short), how many batches run at once and how often a failed batch is retried
+COMPARE_BATCH_TOKENS = int(os.getenv("COMPARE_BATCH_TOKENS", "3000"))
+COMPARE_BATCH_PAGES = int(os.getenv("COMPARE_BATCH_PAGES", "8"))
+COMPARE_MAX_CONCURRENCY = int(os.getenv("COMPARE_MAX_CONCURRENCY", "4"))
+COMPARE_BATCH_RETRIES = int(os.getenv("COMPARE_BATCH_RETRIES", "2"))
+
+
+def batch_pairs(
+    pairs: List[PagePair],
+    max_tokens: int = COMPARE_BATCH_TOKENS,
+    max_pages: int = COMPARE_BATCH_PAGES,
+) -> List[List[PagePair]]:
+    """Split changed page pairs, in order, into batches within the token and page caps."""
+    batches: List[List[PagePair]] = []
+    current: List[PagePair] = []
+    size = 0
+    for pair in pairs:
+        cost = len(pair.diff) // 4 + 10
+        if current and (size + cost > max_tokens or len(current) >= max_pages):
+            batches.append(current)
+            current, size = [], 0
+        current.append(pair)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class ComparisonScheduler:
+    """
+    Runs page-diff comparison batches through an LLM chain concurrently.
+
+    At most max_concurrency batches are in flight. A batch that raises (provider
+    error, unparseable output) is retried on its own with jittered exponential
+    backoff; once its retries are exhausted its result is None and the other
+    batches still complete, so one bad batch never fails the whole comparison.
+    """
+
+    def __init__(
+        self,
+        chain: Any,
+        make_inputs: Callable[[List[PagePair]], dict],
+        max_concurrency: int = COMPARE_MAX_CONCURRENCY,
+        max_retries: int = COMPARE_BATCH_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+    ):
+        self.chain = chain
+        self.make_inputs = make_inputs
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter keeps concurrent batches from retrying in lock-step
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _failed(self, index: int, batch: List[PagePair], attempt: int, error: Exception) -> bool:
+        """Log a failed attempt; True if the batch should be retried."""
+        pages = [p.label for p in batch]
+        if attempt >= self.max_retries:
+            log.error("Comparison batch failed", batch=index, pages=pages, attempts=attempt + 1, error=str(error))
+            return False
+        log.warning("Comparison batch failed, retrying", batch=index, pages=pages, attempt=attempt + 1, error=str(error))
+        return True
+
+    # ---------- Sync ----------
+
+    def _run_batch(self, index: int, batch: List[PagePair]) -> Optional[Any]:
+        attempt = 0
+        while True:
+            try:
+                return self.chain.invoke(self.make_inputs(batch))
+            except Exception as e:
+                if not self._failed(index, batch, attempt, e):
+                    return None
+                time.sleep(self._delay(attempt))
+                attempt += 1
+
+    def run(self, batches: List[List[PagePair]]) -> List[Optional[Any]]:
+        """One result per batch, in batch order (None for a batch that kept failing)."""
+        if not batches:
+            return []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+            results = list(pool.map(self._run_batch, range(len(batches)), batches))
+        self._log_done(batches, results, started)
+        return results
+
+    # ---------- Async ----------
+
+    async def _arun_batch(self, semaphore: asyncio.Semaphore, index: int, batch: List[PagePair]) -> Optional[Any]:
+        async with semaphore:
+            attempt = 0
+            while True:
+                try:
+                    return await self.chain.ainvoke(self.make_inputs(batch))
+                except Exception as e:
+                    if not self._failed(index, batch, attempt, e):
+                        return None
+                    await asyncio.sleep(self._delay(attempt))
+                    attempt += 1
+
+    async def arun(self, batches: List[List[PagePair]]) -> List[Optional[Any]]:
+        if not batches:
+            return []
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._arun_batch(semaphore, i, b) for i, b in enumerate(batches)))
+        self._log_done(batches, results, started)
+        return list(results)
+
+    @staticmethod
+    def _log_done(batches, results, started: float):
+        log.info(
+            "Comparison batches completed",
+            batches=len(batches),
+            pages=sum(len(b) for b in batches),
+            failed=sum(1 for r in results if r is None),
+            seconds=round(time.perf_counter() - started, 3),
+        )
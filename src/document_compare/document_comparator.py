@@ -1,23 +1,50 @@
 import sys
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv #type: ignore
 import pandas as pd #type: ignore
 from langchain_core.output_parsers import JsonOutputParser #type: ignore
-from langchain.output_parsers import OutputFixingParser #type: ignore
-from utlis.model_loader import ModelLoader 
+from utlis.model_loader import MODEL_REGISTRY
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 from prompt.prompt_library import PROMPT_REGISTRY
 from model.models import SummaryResponse,PromptType
+from src.document_compare.page_diff import NO_CHANGE, PAGE_DIFF_MAX_CHARS, PagePair, align_pages, format_pairs
+from src.document_compare.compare_scheduler import (
+    COMPARE_BATCH_PAGES,
+    COMPARE_BATCH_TOKENS,
+    ComparisonScheduler,
+    batch_pairs,
+)
+from utlis.result_cache import prompt_version
+from utlis.structured_output import RobustJsonOutputParser
+
+
+def comparison_cache_version() -> str:
+    """Version of the page-diff comparison pipeline (prompt, schema, diff and batch sizes) for the result cache."""
+    return prompt_version(
+        [PromptType.PAGE_DIFF_COMPARISON.value],
+        JsonOutputParser(pydantic_object=SummaryResponse).get_format_instructions(),
+        str(PAGE_DIFF_MAX_CHARS),
+        str(COMPARE_BATCH_TOKENS),
+        str(COMPARE_BATCH_PAGES),
+    )
+
 
 class DocumentComparatorLLM:
     def __init__(self):
         load_dotenv()
-        self.loader = ModelLoader()
-        self.llm = self.loader.load_llm()
+        self.llm = MODEL_REGISTRY.get_llm()
+        self.json_llm = MODEL_REGISTRY.get_json_llm()
         self.parser = JsonOutputParser(pydantic_object=SummaryResponse)
-        self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
+        self.fixing_parser = RobustJsonOutputParser(
+            parser=self.parser, llm=self.llm, source="document_comparator", expect_list=True
+        )
         self.prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_COMPARISON.value]
-        self.chain = self.prompt | self.llm | self.parser
+        self.chain = self.prompt | self.json_llm | self.fixing_parser
+        self.diff_chain = PROMPT_REGISTRY[PromptType.PAGE_DIFF_COMPARISON.value] | self.json_llm | self.fixing_parser
+        self.scheduler = ComparisonScheduler(self.diff_chain, self._diff_inputs)
+        # Batches of the last compare_pages call that failed after their retries
+        self.failed_batches = 0
         log.info("DocumentComparatorLLM initialized", model=self.llm)
 
     def compare_documents(self, combined_docs: str) -> pd.DataFrame:
@@ -35,6 +62,94 @@ class DocumentComparatorLLM:
             log.error("Error in compare_documents", error=str(e))
             raise DocumentPortalException("Error comparing documents", sys)
 
+    async def acompare_documents(self, combined_docs: str) -> pd.DataFrame:
+        try:
+            inputs = {
+                "combined_docs": combined_docs,
+                "format_instruction": self.parser.get_format_instructions()
+            }
+
+            log.info("Invoking document comparison LLM chain (async)")
+            response = await self.chain.ainvoke(inputs)
+            log.info("Chain invoked successfully", response_preview=str(response)[:200])
+            return self._format_response(response)
+        except Exception as e:
+            log.error("Error in acompare_documents", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
+    # ---------- Page-level diff pre-pass ----------
+
+    def compare_pages(self, ref_pages: List[str], act_pages: List[str]) -> pd.DataFrame:
+        """
+        Compare two documents given as page texts. Pages are aligned and diffed
+        locally; identical pages are reported as NO CHANGE without an LLM call and
+        only the changed page pairs are sent to the LLM, in concurrent batches.
+        """
+        try:
+            pairs = align_pages(ref_pages, act_pages)
+            batches = batch_pairs([p for p in pairs if p.status != "unchanged"])
+            rows, self.failed_batches = self._merge(pairs, batches, self.scheduler.run(batches))
+            return self._format_response(rows)
+        except Exception as e:
+            log.error("Error in compare_pages", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
+    async def acompare_pages(self, ref_pages: List[str], act_pages: List[str]) -> pd.DataFrame:
+        try:
+            pairs = align_pages(ref_pages, act_pages)
+            batches = batch_pairs([p for p in pairs if p.status != "unchanged"])
+            rows, self.failed_batches = self._merge(pairs, batches, await self.scheduler.arun(batches))
+            return self._format_response(rows)
+        except Exception as e:
+            log.error("Error in acompare_pages", error=str(e))
+            raise DocumentPortalException("Error comparing documents", sys)
+
+    def _diff_inputs(self, changed: List[PagePair]) -> dict:
+        return {
+            "page_diffs": format_pairs(changed),
+            "format_instruction": self.parser.get_format_instructions(),
+        }
+
+    @staticmethod
+    def _merge(pairs: List[PagePair], batches: List[List[PagePair]], batch_results: List) -> Tuple[list[dict], int]:
+        """
+        Rows in page order: NO CHANGE for identical pages, the LLM's description
+        otherwise (from whichever batch described the page). Also returns how many
+        batches failed; their pages are marked as not described.
+        """
+        described: Dict[str, str] = {}
+        failed_labels = set()
+        failed = 0
+        for batch, response in zip(batches, batch_results):
+            if not isinstance(response, list):
+                failed += 1
+                failed_labels.update(p.label for p in batch)
+                continue
+            for row in response:
+                if isinstance(row, dict) and "Page" in row:
+                    label = str(row["Page"]).strip().removeprefix("Page").strip()
+                    described[label] = str(row.get("change", ""))
+
+        rows = []
+        for pair in pairs:
+            if pair.status == "unchanged":
+                change = NO_CHANGE
+            elif pair.label in failed_labels:
+                change = f"Page {pair.status}; no description available (the comparison request failed)."
+            else:
+                # Fall back to a plain description so every changed page is reported
+                change = described.get(pair.label) or {
+                    "added": "Page added in the actual document.",
+                    "removed": "Page removed from the actual document.",
+                }.get(pair.status, "Text changed on this page.")
+            rows.append({"Page": pair.label, "change": change})
+        unchanged = sum(1 for p in pairs if p.status == "unchanged")
+        log.info(
+            "Page comparison merged",
+            pages=len(pairs), unchanged=unchanged, changed=len(pairs) - unchanged, failed_batches=failed,
+        )
+        return SummaryResponse.model_validate(rows).model_dump(), failed
+
     def _format_response(self, response_parsed: list[dict]) -> pd.DataFrame: #type: ignore
         try:
             df = pd.DataFrame(response_parsed)
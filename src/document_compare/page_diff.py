@@ -0,0 +1,95 @@
+import os
+import re
+import hashlib
+import difflib
+from typing import List, NamedTuple, Optional
+
+# Cap on the diff text sent to the LLM for a single page pair
+PAGE_DIFF_MAX_CHARS = int(os.getenv("PAGE_DIFF_MAX_CHARS", "4000"))
+
+NO_CHANGE = "NO CHANGE"
+
+_WS_RE = re.compile(r"[ \t\f\v]+")
+
+
+def normalize_page(text: str) -> str:
+    """Collapse runs of spaces and drop blank lines so re-extraction noise is not a change."""
+    lines = (_WS_RE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(normalize_page(text).encode("utf-8")).hexdigest()
+
+
+class PagePair(NamedTuple):
+    """One aligned reference/actual page; either side is None for a removed/added page."""
+    ref_page: Optional[int]  # 1-based
+    act_page: Optional[int]
+    status: str  # "unchanged" | "changed" | "added" | "removed"
+    diff: str = ""
+
+    @property
+    def label(self) -> str:
+        """
+        Unique within one alignment: "3" or "3->4" for paired pages, "ref 2" for a page
+        only in the reference, "act 2" for a page only in the actual document.
+        """
+        if self.ref_page is None:
+            return f"act {self.act_page}"
+        if self.act_page is None:
+            return f"ref {self.ref_page}"
+        if self.act_page == self.ref_page:
+            return str(self.ref_page)
+        return f"{self.ref_page}->{self.act_page}"
+
+
+def line_diff(ref_text: str, act_text: str, max_chars: int = PAGE_DIFF_MAX_CHARS) -> str:
+    """Changed lines only ('-' reference, '+' actual), one line of context, truncated to max_chars."""
+    diff = difflib.unified_diff(
+        normalize_page(ref_text).splitlines(),
+        normalize_page(act_text).splitlines(),
+        lineterm="",
+        n=1,
+    )
+    body = "\n".join(line for line in diff if not line.startswith(("---", "+++")))
+    if len(body) > max_chars:
+        body = body[:max_chars] + "\n... (diff truncated)"
+    return body
+
+
+def align_pages(ref_pages: List[str], act_pages: List[str]) -> List[PagePair]:
+    """
+    Align two documents page by page on normalized content hashes.
+
+    Pages whose hashes match (in order) are unchanged, even if pages were inserted
+    or removed elsewhere and the numbering shifted. Mismatched runs are paired up
+    position by position as changed pages; leftovers are added or removed pages.
+    """
+    ref_hashes = [page_hash(p) for p in ref_pages]
+    act_hashes = [page_hash(p) for p in act_pages]
+    matcher = difflib.SequenceMatcher(a=ref_hashes, b=act_hashes, autojunk=False)
+
+    pairs: List[PagePair] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs.extend(PagePair(i + 1, j + 1, "unchanged") for i, j in zip(range(i1, i2), range(j1, j2)))
+            continue
+        common = min(i2 - i1, j2 - j1)
+        for offset in range(common):
+            i, j = i1 + offset, j1 + offset
+            pairs.append(PagePair(i + 1, j + 1, "changed", line_diff(ref_pages[i], act_pages[j])))
+        for i in range(i1 + common, i2):
+            pairs.append(PagePair(i + 1, None, "removed", line_diff(ref_pages[i], "")))
+        for j in range(j1 + common, j2):
+            pairs.append(PagePair(None, j + 1, "added", line_diff("", act_pages[j])))
+    return pairs
+
+
+def format_pairs(pairs: List[PagePair]) -> str:
+    """Prompt text for the changed pairs: one block per page with its line diff."""
+    blocks = []
+    for pair in pairs:
+        header = f"Page {pair.label} ({pair.status})"
+        blocks.append(f"{header}\n{pair.diff or '(whitespace-only change)'}")
+    return "\n\n".join(blocks)
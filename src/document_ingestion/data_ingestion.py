@@ -1,95 +1,229 @@
 from __future__ import annotations
 import os
 import sys
-import json
 import uuid
+import re
 import hashlib
 import shutil
+import unicodedata
 from pathlib import Path
-from typing import Iterable, List, Optional, Dict, Any
-import fitz  # type: ignore
+from typing import Callable, Iterable, List, Optional, Dict, Any
 from langchain.schema import Document #type: ignore
 from langchain_text_splitters import RecursiveCharacterTextSplitter #type: ignore
 from langchain_community.vectorstores import FAISS #type: ignore
-from utlis.model_loader import ModelLoader #type: ignore
+from utlis.model_loader import ModelLoader, MODEL_REGISTRY #type: ignore
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
-from utlis.file_io import generate_session_id, save_uploaded_files #type: ignore
+from utlis.vectorstore_cache import VECTORSTORE_CACHE
+from utlis.answer_cache import ANSWER_CACHE
+from utlis.faiss_store import FaissStore
+from utlis import ann_index
+from utlis.metadata_store import ChunkMetadataStore
+from utlis.sparse_index import BM25Index
+from src.document_chat.hybrid_retriever import HybridRetriever, hybrid_settings
+from utlis.embedding_cache import CachedEmbeddings
+from utlis.embedding_executor import BatchedEmbeddings
+from utlis.document_parser import DOCUMENT_PARSER
+from utlis.file_io import generate_session_id, save_uploaded_files, sha256_file, stream_to_disk #type: ignore
 from utlis.document_ops import load_documents, concat_for_analysis, concat_for_comparison #type: ignore
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
+# Progress callback: (stage, count) with stages parsed_pages / chunks / embedded / indexed.
+# It may raise to abort the build (used for job cancellation).
+ProgressCallback = Callable[[str, int], None]
+EMBED_PROGRESS_SLICE = 256
+
 # FAISS Manager (load-or-create)
 class FaissManager:
-    def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None):
+    def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None, session_id: Optional[str] = None):
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.session_id = session_id or self.index_dir.name
         
-        self.meta_path = self.index_dir / "ingested_meta.json"
-        self._meta: Dict[str, Any] = {"rows": {}} ## this is dict of rows
-        
-        if self.meta_path.exists():
-            try:
-                self._meta = json.loads(self.meta_path.read_text(encoding="utf-8")) or {"rows": {}} # load it if alrady there
-            except Exception:
-                self._meta = {"rows": {}} # init the empty one if does not exists
+        # Fingerprints/documents already indexed, shared by every manager of this dir
+        self.meta = ChunkMetadataStore.for_index(self.index_dir)
         
 
-        self.model_loader = model_loader or ModelLoader()
-        self.emb = self.model_loader.load_embeddings()
+        # Reuse the process-wide embeddings client unless a dedicated loader is passed in
+        self.model_loader = model_loader
+        # Same cached, mtime-checked config the query path reads
+        config = model_loader.config if model_loader is not None else MODEL_REGISTRY.config
+        self.index_settings = ann_index.index_settings(config)
+        self.retriever_settings = hybrid_settings(config)
+        # BM25 postings for the same chunks, keyed by the FAISS docstore ids
+        self.sparse = BM25Index.for_index(self.index_dir, (config.get("retriever") or {}).get("bm25"))
+        if model_loader is not None:
+            settings = model_loader.embedding_settings()
+            batched = BatchedEmbeddings.from_config(
+                model_loader.load_embeddings(), settings['provider'], model_loader.config.get('embedding_executor', {})
+            )
+            self.emb = CachedEmbeddings(batched, settings['model_name'])
+        else:
+            self.emb = MODEL_REGISTRY.get_embeddings()
+        self.store = FaissStore(self.index_dir)
         self.vs: Optional[FAISS] = None
+        if self._exists() and not self.meta.count():
+            self._backfill_meta()
         
     def _exists(self)-> bool:
-        return (self.index_dir / "index.faiss").exists() and (self.index_dir / "index.pkl").exists()
+        return self.store.exists()
     
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
     @staticmethod
     def _fingerprint(text: str, md: Dict[str, Any]) -> str:
-        src = md.get("source") or md.get("file_path")
-        rid = md.get("row_id")
-        if src is not None:
-            return f"{src}::{'' if rid is None else rid}"
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        # Content-addressed: same chunk of the same document -> same key, whatever the
+        # upload was renamed to on disk
+        content_hash = hashlib.sha256(FaissManager._normalize(text).encode("utf-8")).hexdigest()
+        doc_hash = md.get("doc_sha256")
+        return f"{doc_hash}:{content_hash}" if doc_hash else content_hash
     
-    def _save_meta(self):
-        self.meta_path.write_text(json.dumps(self._meta, ensure_ascii=False, indent=2), encoding="utf-8")
-        
+    def new_documents(self, docs: List[Document]) -> List[Document]:
+        """
+        Filter out chunks already in the index: whole documents by sha256, then single
+        chunks by fingerprint (also collapsing duplicates within this batch).
+        """
+        keyed = [(self._fingerprint(d.page_content, d.metadata or {}), d) for d in docs]
+        known_docs = self.meta.existing_documents((d.metadata or {}).get("doc_sha256") for _, d in keyed)
+        known = self.meta.existing_fingerprints(key for key, _ in keyed)
+        seen = set()
+        fresh: List[Document] = []
+        for key, d in keyed:
+            if (d.metadata or {}).get("doc_sha256") in known_docs or key in known or key in seen:
+                continue
+            seen.add(key)
+            fresh.append(d)
+        return fresh
+
+    def _backfill_meta(self):
+        """
+        Fingerprint the chunks of an index built before the metadata store existed, so
+        re-uploading its documents does not embed them again. Older chunks carry no
+        doc_sha256: it is recomputed from the source file while that is still on disk.
+        """
+        unmatched = set()
+
+        def records() -> List[Dict[str, Any]]:
+            vs = self.store.load(self.emb)
+            digests: Dict[str, Optional[str]] = {}
+            docs = []
+            for doc_id in vs.index_to_docstore_id.values():
+                d = vs.docstore.search(doc_id)
+                md = dict(d.metadata or {})
+                src = md.get("source") or md.get("file_path")
+                if not md.get("doc_sha256") and src:
+                    if src not in digests:
+                        digests[src] = sha256_file(Path(src)) if Path(src).is_file() else None
+                    if digests[src]:
+                        md["doc_sha256"] = digests[src]
+                if not md.get("doc_sha256"):
+                    unmatched.add(src or "unknown")
+                docs.append(Document(page_content=d.page_content, metadata=md))
+            return self._records(docs)
+
+        added = self.meta.backfill(records)
+        if not added:
+            return
+        log.info("Chunk metadata backfilled from FAISS docstore", index=str(self.index_dir), chunks=added)
+        if unmatched:
+            # Only chunk text is known for these: a re-upload matches by document hash and is embedded once more
+            log.warning(
+                "Backfilled chunks without a document hash; re-uploading these files re-indexes them once",
+                index=str(self.index_dir), sources=sorted(unmatched),
+            )
+        legacy = self.index_dir / "ingested_meta.json"
+        if legacy.exists():
+            # Superseded by the backfill: its path-based keys never match content fingerprints
+            os.replace(legacy, legacy.with_name(legacy.name + ".migrated"))
+            log.warning("Legacy ingested_meta.json replaced by the docstore backfill", path=str(legacy))
+
+    def _records(self, docs: List[Document]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "fingerprint": self._fingerprint(d.page_content, d.metadata or {}),
+                "doc_sha256": (d.metadata or {}).get("doc_sha256"),
+                "source": (d.metadata or {}).get("source"),
+                "session_id": self.session_id,
+                "page": (d.metadata or {}).get("page"),
+            }
+            for d in docs
+        ]
+
+    def _record(self, docs: List[Document]):
+        self.meta.add_chunks(self._records(docs))
         
     def add_documents(self,docs: List[Document]):
         
         if self.vs is None:
             raise RuntimeError("Call load_or_create() before add_documents_idempotent().")
         
-        new_docs: List[Document] = []
-        
-        for d in docs:
-            
-            key = self._fingerprint(d.page_content, d.metadata or {})
-            if key in self._meta["rows"]:
-                continue
-            self._meta["rows"][key] = True
-            new_docs.append(d)
+        new_docs = self.new_documents(docs)
             
         if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_meta()
+            # Append-only write: only the new vectors/docstore records hit the disk;
+            # the canonical index files are rewritten by periodic compaction.
+            texts = [d.page_content for d in new_docs]
+            metas = [d.metadata or {} for d in new_docs]
+            vectors = self.emb.embed_documents(texts)
+            ids = [uuid.uuid4().hex for _ in new_docs]
+            self.vs.add_embeddings(text_embeddings=list(zip(texts, vectors)), metadatas=metas, ids=ids)
+            manifest = self.store.append(ids, texts, metas, vectors)
+            self.sparse.add(ids, texts, metas)
+            if self.store.needs_compaction(manifest):
+                self.vs = self.store.compact(self.emb, transform=self._reindex)
+            self._record(new_docs)
+            VECTORSTORE_CACHE.invalidate(self.index_dir)
+            ANSWER_CACHE.invalidate(self.index_dir)
         return len(new_docs)
     
+    def _reindex(self, vs: FAISS) -> FAISS:
+        # A flat index that has grown past the training threshold becomes the configured ANN type
+        if ann_index.needs_rebuild(vs.index, self.index_settings):
+            return ann_index.rebuild(vs, self.index_settings)
+        return vs
+
+    def _backfill_sparse(self):
+        # Indexes built before the sparse index existed: index every stored chunk once
+        ids = list(self.vs.index_to_docstore_id.values())
+        docs = [self.vs.docstore.search(i) for i in ids]
+        self.sparse.add(ids, [d.page_content for d in docs], [d.metadata for d in docs])
+
+    def as_retriever(self, k: int = 5):
+        """Hybrid BM25 + vector retriever over this index (pure vector if disabled in config)."""
+        if self.retriever_settings["enabled"]:
+            return HybridRetriever.from_settings(self.vs, self.sparse, k, self.retriever_settings)
+        return self.vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
+
     def load_or_create(self,texts:Optional[List[str]]=None, metadatas: Optional[List[dict]] = None):
         ## if we running first time then it will not go in this block
         if self._exists():
-            self.vs = FAISS.load_local(
-                str(self.index_dir),
-                embeddings=self.emb,
-                allow_dangerous_deserialization=True,
-            )
+            self.vs = self.store.load(self.emb)
+            if self.sparse.count() < self.vs.index.ntotal:
+                self._backfill_sparse()
             return self.vs
         
         
         if not texts:
             raise DocumentPortalException("No existing FAISS index and no data to create one", sys)
-        self.vs = FAISS.from_texts(texts=texts, embedding=self.emb, metadatas=metadatas or [])
-        self.vs.save_local(str(self.index_dir))
+        # Metadata left over from a deleted index must not hide chunks from the new one
+        self.meta.reset()
+        self.sparse.reset()
+        docs = self.new_documents([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas or [{}] * len(texts))])
+        self.vs = ann_index.build_vectorstore(
+            [d.page_content for d in docs], self.emb, self.index_settings, metadatas=[d.metadata for d in docs]
+        )
+        self.store.write_base(self.vs)
+        self.sparse.add(
+            [self.vs.index_to_docstore_id[i] for i in range(len(docs))],
+            [d.page_content for d in docs],
+            [d.metadata for d in docs],
+        )
+        self._record(docs)
+        VECTORSTORE_CACHE.invalidate(self.index_dir)
+        ANSWER_CACHE.invalidate(self.index_dir)
         return self.vs
         
         
@@ -101,8 +235,6 @@ class ChatIngestor:
         session_id: Optional[str] = None,
     ):
         try:
-            self.model_loader = ModelLoader()
-            
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id()
             
@@ -135,35 +267,71 @@ class ChatIngestor:
         log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap)
         return chunks
     
+    def save_files(self, uploaded_files: Iterable) -> List[Path]:
+        try:
+            return save_uploaded_files(uploaded_files, self.temp_dir)
+        except Exception as e:
+            log.error("Failed to save files for ingestion", error=str(e))
+            raise DocumentPortalException("Failed to save files for ingestion", e) from e
+
     def built_retriver( self,
         uploaded_files: Iterable,
         *,
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
-        k: int = 5,):
+        k: int = 5,
+        progress: Optional[ProgressCallback] = None,):
+        paths = self.save_files(uploaded_files)
+        return self.build_from_paths(
+            paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k, progress=progress
+        )
+
+    def build_from_paths( self,
+        paths: List[Path],
+        *,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        k: int = 5,
+        progress: Optional[ProgressCallback] = None,):
+        report = progress or (lambda stage, count: None)
         try:
-            paths = save_uploaded_files(uploaded_files, self.temp_dir)
             docs = load_documents(paths)
             if not docs:
                 raise ValueError("No valid documents loaded")
+            report("parsed_pages", len(docs))
             
             chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            report("chunks", len(chunks))
             
             ## FAISS manager very very important class for the docchat
-            fm = FaissManager(self.faiss_dir, self.model_loader)
-            
-            texts = [c.page_content for c in chunks]
-            metas = [c.metadata for c in chunks]
+            fm = FaissManager(self.faiss_dir, session_id=self.session_id)
             
-            try:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-            except Exception:
+            # Skip documents/chunks already indexed before spending any embedding calls
+            exists = fm._exists()
+            new_chunks = fm.new_documents(chunks) if exists else chunks
+            texts = [c.page_content for c in new_chunks]
+            metas = [c.metadata for c in new_chunks]
+            log.info("Chunks deduplicated", total=len(chunks), new=len(new_chunks), index=str(self.faiss_dir))
+
+            if progress is not None:
+                # Embed ahead in slices so progress/cancellation is observable; the
+                # embedding cache makes the FAISS writes below reuse these vectors.
+                for i in range(0, len(texts), EMBED_PROGRESS_SLICE):
+                    fm.emb.embed_documents(texts[i:i + EMBED_PROGRESS_SLICE])
+                    report("embedded", min(i + EMBED_PROGRESS_SLICE, len(texts)))
+            # Last chance to cancel: after the write below only "indexed" is reported
+            report("embedded", len(texts))
+
+            if exists:
+                vs = fm.load_or_create()
+                added = fm.add_documents(new_chunks)
+            else:
                 vs = fm.load_or_create(texts=texts, metadatas=metas)
-                
-            added = fm.add_documents(chunks)
+                added = vs.index.ntotal
+            report("indexed", added)
             log.info("FAISS index updated", added=added, index=str(self.faiss_dir))
             
-            return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
+            return fm.as_retriever(k=k)
             
         except Exception as e:
             log.error("Failed to build retriever", error=str(e))
@@ -180,6 +348,7 @@ class DocHandler:
         self.data_dir = data_dir or os.getenv("DATA_STORAGE_PATH", os.path.join(os.getcwd(), "data", "document_analysis"))
         self.session_id = session_id or generate_session_id("session")
         self.session_path = os.path.join(self.data_dir, self.session_id)
+        self.sha256: Optional[str] = None
         os.makedirs(self.session_path, exist_ok=True)
         log.info("DocHandler initialized", session_id=self.session_id, session_path=self.session_path)
 
@@ -189,11 +358,7 @@ class DocHandler:
             if not filename.lower().endswith(".pdf"):
                 raise ValueError("Invalid file type. Only PDFs are allowed.")
             save_path = os.path.join(self.session_path, filename)
-            with open(save_path, "wb") as f:
-                if hasattr(uploaded_file, "read"):
-                    f.write(uploaded_file.read())
-                else:
-                    f.write(uploaded_file.getbuffer())
+            self.sha256 = stream_to_disk(uploaded_file, Path(save_path))
             log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id)
             return save_path
         except Exception as e:
@@ -202,11 +367,10 @@ class DocHandler:
 
     def read_pdf(self, pdf_path: str) -> str:
         try:
-            text_chunks = []
-            with fitz.open(pdf_path) as doc:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_chunks.append(f"\n--- Page {page_num + 1} ---\n{page.get_text()}")  # type: ignore
+            text_chunks = [
+                f"\n--- Page {page_num + 1} ---\n{text}"
+                for page_num, text in enumerate(DOCUMENT_PARSER.parse_pages(pdf_path))
+            ]
             text = "\n".join(text_chunks)
             log.info("PDF read successfully", pdf_path=pdf_path, session_id=self.session_id, pages=len(text_chunks))
             return text
@@ -221,6 +385,7 @@ class DocumentComparator:
         self.base_dir = Path(base_dir)
         self.session_id = session_id or generate_session_id()
         self.session_path = self.base_dir / self.session_id
+        self.sha256s: Dict[str, str] = {}
         self.session_path.mkdir(parents=True, exist_ok=True)
         log.info("DocumentComparator initialized", session_path=str(self.session_path))
 
@@ -231,11 +396,7 @@ class DocumentComparator:
             for fobj, out in ((reference_file, ref_path), (actual_file, act_path)):
                 if not fobj.name.lower().endswith(".pdf"):
                     raise ValueError("Only PDF files are allowed.")
-                with open(out, "wb") as f:
-                    if hasattr(fobj, "read"):
-                        f.write(fobj.read())
-                    else:
-                        f.write(fobj.getbuffer())
+                self.sha256s[out.name] = stream_to_disk(fobj, out)
             log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id)
             return ref_path, act_path
         except Exception as e:
@@ -244,21 +405,25 @@ class DocumentComparator:
 
     def read_pdf(self, pdf_path: Path) -> str:
         try:
-            with fitz.open(pdf_path) as doc:
-                if doc.is_encrypted:
-                    raise ValueError(f"PDF is encrypted: {pdf_path.name}")
-                parts = []
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text = page.get_text()  # type: ignore
-                    if text.strip():
-                        parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
+            parts = []
+            for page_num, text in enumerate(DOCUMENT_PARSER.parse_pages(pdf_path)):
+                if text.strip():
+                    parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
             log.info("PDF read successfully", file=str(pdf_path), pages=len(parts))
             return "\n".join(parts)
         except Exception as e:
             log.error("Error reading PDF", file=str(pdf_path), error=str(e))
             raise DocumentPortalException("Error reading PDF", e) from e
 
+    def read_pages(self, pdf_path: Path) -> List[str]:
+        """Page texts of one saved PDF (served from the parsed-page cache when seen before)."""
+        try:
+            pdf_path = Path(pdf_path)
+            return DOCUMENT_PARSER.parse_pages(pdf_path, digest=self.sha256s.get(pdf_path.name))
+        except Exception as e:
+            log.error("Error reading PDF pages", file=str(pdf_path), error=str(e))
+            raise DocumentPortalException("Error reading PDF", e) from e
+
     def combine_documents(self) -> str:
         try:
             doc_parts = []
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from logger import GLOBAL_LOGGER as log
+from exception.custom_exception import DocumentPortalException
+from src.document_ingestion.data_ingestion import ChatIngestor
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINAL_STATES = {SUCCEEDED, FAILED, CANCELLED}
+STAGES = ("parsed_pages", "chunks", "embedded", "indexed")
+# A queued/running job not updated for this long when a worker starts belongs to a dead worker
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobStore:
+    """
+    SQLite-backed job state, shared by every API worker so any of them can answer
+    /jobs/{id} and flag a cancellation for the worker that owns the job.
+    """
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, session_id TEXT,"
+            " params TEXT, progress TEXT, result TEXT, error TEXT, cancel_requested INTEGER DEFAULT 0,"
+            " created_at TEXT, updated_at TEXT)"
+        )
+        self._conn.commit()
+
+    def create(self, kind: str, session_id: Optional[str], params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        progress = {stage: 0 for stage in STAGES}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, session_id, params, progress, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, session_id, json.dumps(params), json.dumps(progress), _now(), _now()),
+            )
+            self._conn.commit()
+        return job_id
+
+    def update(self, job_id: str, **fields: Any):
+        for key in ("progress", "result"):
+            if key in fields and not isinstance(fields[key], str):
+                fields[key] = json.dumps(fields[key])
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def set_progress(self, job_id: str, stage: str, count: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = json_set(progress, ?, ?), updated_at = ? WHERE id = ?",
+                (f"$.{stage}", count, _now(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("params", "progress", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def request_cancel(self, job_id: str):
+        self.update(job_id, cancel_requested=1)
+
+    def fail_stale(self, older_than_seconds: float = JOB_STALE_SECONDS) -> int:
+        """
+        Mark queued/running jobs with no update for older_than_seconds as failed: their
+        worker died (restart, crash) and nothing will ever finish them.
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)).isoformat()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?) AND updated_at < ?",
+                (FAILED, "Interrupted: the worker running this job stopped", _now(), QUEUED, RUNNING, cutoff),
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+
+class IngestionJobManager:
+    """
+    Runs ChatIngestor builds on a bounded worker pool and records per-stage progress.
+
+    Uploads are saved to disk by the request handler before submit(), so the job only
+    needs file paths. Cancellation is cooperative: the flag is checked at every
+    progress report, and queued jobs that have not started are dropped immediately.
+    Once the index is written (the "indexed" report) a cancel is ignored. Jobs left
+    queued/running by a dead worker are marked failed when a manager starts.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int = 2, stale_seconds: float = JOB_STALE_SECONDS):
+        self.store = store
+        stale = self.store.fail_stale(stale_seconds)
+        if stale:
+            log.warning("Stale ingestion jobs marked failed", jobs=stale)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion-job")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, ingestor: ChatIngestor, paths: List[Path], **build_kwargs: Any) -> str:
+        params = {"files": [p.name for p in paths], "faiss_dir": str(ingestor.faiss_dir), **build_kwargs}
+        job_id = self.store.create("chat_index", ingestor.session_id, params)
+        future = self._pool.submit(self._run, job_id, ingestor, paths, build_kwargs)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+        log.info("Ingestion job queued", job_id=job_id, session_id=ingestor.session_id, files=len(paths))
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINAL_STATES:
+            return job
+        self.store.request_cancel(job_id)
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            self.store.update(job_id, status=CANCELLED)
+        log.info("Ingestion job cancellation requested", job_id=job_id)
+        return self.store.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def shutdown(self):
+        """Stop the worker pool: running jobs finish, queued ones are dropped."""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    # ---------- Internals ----------
+
+    def _forget(self, job_id: str):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _run(self, job_id: str, ingestor: ChatIngestor, paths: List[Path], build_kwargs: Dict[str, Any]):
+        if self.store.is_cancel_requested(job_id):
+            self.store.update(job_id, status=CANCELLED)
+            return
+
+        committed = False
+
+        def progress(stage: str, count: int):
+            nonlocal committed
+            self.store.set_progress(job_id, stage, count)
+            if stage == "indexed":
+                committed = True  # the index is on disk; a late cancel cannot undo it
+            elif self.store.is_cancel_requested(job_id):
+                raise JobCancelled(job_id)
+
+        self.store.update(job_id, status=RUNNING)
+        try:
+            ingestor.build_from_paths(paths, progress=progress, **build_kwargs)
+            self.store.update(job_id, status=SUCCEEDED, result={"session_id": ingestor.session_id, **build_kwargs})
+            log.info("Ingestion job finished", job_id=job_id, session_id=ingestor.session_id)
+        except Exception as e:
+            if not committed and self.store.is_cancel_requested(job_id):
+                self.store.update(job_id, status=CANCELLED)
+                log.info("Ingestion job cancelled", job_id=job_id)
+            else:
+                self.store.update(job_id, status=FAILED, error=getattr(e, "error_message", str(e)))
+                log.error("Ingestion job failed", job_id=job_id, error=str(e))
+
+
+_MANAGER: Optional[IngestionJobManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_job_manager() -> IngestionJobManager:
+    """Return the process-wide ingestion job manager, creating it on first use."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            try:
+                store = JobStore(os.getenv("JOBS_DB_PATH", os.path.join("data", "jobs.sqlite")))
+                _MANAGER = IngestionJobManager(store, max_workers=int(os.getenv("INGESTION_JOB_WORKERS", "2")))
+            except Exception as e:
+                log.error("Failed to initialize ingestion job manager", error=str(e))
+                raise DocumentPortalException("Failed to initialize ingestion job manager", e) from e
+        return _MANAGER
+
+
+def shutdown_job_manager():
+    """Shut down the process-wide job manager, if one was created."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is not None:
+            _MANAGER.shutdown()
+            _MANAGER = None
@@ -0,0 +1,99 @@
+import os
+import re
+from typing import Dict, List
+import numpy as np
+from langchain_core.documents import Document  # type: ignore
+from langchain_core.embeddings import Embeddings  # type: ignore
+from logger import GLOBAL_LOGGER as log
+from utlis.lru_cache import LRUCache
+
+# Sentence boundaries: . ! ? followed by whitespace and a capital/digit/quote, or a blank line
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])|\n\s*\n")
+
+# Query-time sentence vectors stay in memory: they are not chunks, so they never go
+# into the persistent ingestion embedding store
+SENTENCE_EMBEDDING_CACHE_SIZE = int(os.getenv("SENTENCE_EMBEDDING_CACHE_SIZE", "8192"))
+_SENTENCE_VECTORS = LRUCache(max_entries=SENTENCE_EMBEDDING_CACHE_SIZE)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+class EmbeddingsSentenceFilter:
+    """
+    Retrieval stage: trim each retrieved chunk to the sentences relevant to the query.
+
+    Sentences are scored by cosine similarity to the query embedding. A chunk keeps
+    the sentences at or above similarity_threshold (in their original order, and at
+    least its min_sentences best ones); a chunk whose best sentence is below
+    drop_threshold is dropped, unless every chunk would be. Sentence embeddings are
+    kept in a process-wide in-memory LRU and misses go to the uncached provider client,
+    so repeat queries over the same chunks cost no API calls and nothing is written to
+    the on-disk embedding store.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        similarity_threshold: float = 0.45,
+        drop_threshold: float = 0.2,
+        min_sentences: int = 2,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.drop_threshold = drop_threshold
+        self.min_sentences = min_sentences
+
+    def __call__(self, query: str, docs: List[Document]) -> List[Document]:
+        if not docs:
+            return docs
+        sentences = [split_sentences(d.page_content) for d in docs]
+        flat = [s for group in sentences for s in group]
+        if not flat:
+            return docs
+
+        query_vec = np.asarray(self.embeddings.embed_query(query), dtype="float32")
+        sent_vecs = np.asarray(self._embed_sentences(flat), dtype="float32")
+        norms = np.linalg.norm(sent_vecs, axis=1) * (np.linalg.norm(query_vec) or 1.0)
+        sims = (sent_vecs @ query_vec) / np.where(norms == 0, 1.0, norms)
+
+        trimmed = []
+        offset = 0
+        for doc, group in zip(docs, sentences):
+            scores = sims[offset:offset + len(group)]
+            offset += len(group)
+            if not group:
+                continue
+            keep = set(np.flatnonzero(scores >= self.similarity_threshold).tolist())
+            keep.update(np.argsort(-scores)[: self.min_sentences].tolist())
+            text = " ".join(group[i] for i in sorted(keep))
+            trimmed.append((float(scores.max()), Document(page_content=text, metadata=doc.metadata, id=doc.id)))
+
+        kept = [d for best, d in trimmed if best >= self.drop_threshold]
+        if not kept and trimmed:
+            # Never hand the LLM an empty context: keep the single most relevant chunk
+            kept = [max(trimmed, key=lambda item: item[0])[1]]
+
+        before = sum(len(d.page_content) for d in docs)
+        after = sum(len(d.page_content) for d in kept)
+        log.info("Context compressed", docs_in=len(docs), docs_out=len(kept), chars_in=before, chars_out=after)
+        return kept
+
+    def _embed_sentences(self, sentences: List[str]) -> List[List[float]]:
+        # CachedEmbeddings persists every vector it embeds; bypass it for sentences
+        client = getattr(self.embeddings, "underlying", self.embeddings)
+        model = getattr(self.embeddings, "model_name", type(client).__name__)
+        vectors: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for sentence in dict.fromkeys(sentences):
+            vec = _SENTENCE_VECTORS.get((model, sentence))
+            if vec is None:
+                missing.append(sentence)
+            else:
+                vectors[sentence] = vec
+        if missing:
+            for sentence, vec in zip(missing, client.embed_documents(missing)):
+                _SENTENCE_VECTORS.put((model, sentence), vec)
+                vectors[sentence] = vec
+        return [vectors[s] for s in sentences]
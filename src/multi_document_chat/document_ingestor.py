@@ -3,12 +3,14 @@ import sys
 import uuid
 from pathlib import Path
 from datetime import datetime, timezone
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader #type:ignore
+from langchain_community.document_loaders import Docx2txtLoader, TextLoader #type:ignore
 from langchain.text_splitter import RecursiveCharacterTextSplitter #type:ignore
 from langchain_community.vectorstores import FAISS #type:ignore
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
-from utlis.model_loader import ModelLoader
+from utlis.model_loader import MODEL_REGISTRY
+from utlis.document_parser import DOCUMENT_PARSER
+from utlis.file_io import stream_to_disk
 
 
 
@@ -42,13 +44,11 @@ class DocumentIngestor:
             self.session_file_path.mkdir(parents=True, exist_ok=True)
             self.session_faiss_path.mkdir(parents=True, exist_ok=True)
 
-            self.model_loader = ModelLoader()
             self.log.info("DocumentIngestor initialized successfully", 
                         file_path=str(self.file_path),
                         faiss_path=str(self.faiss_dir),
                         session_file_path=str(self.session_file_path),
                         session_faiss_path=str(self.session_faiss_path),
-                        model_loader=str(self.model_loader),
                         supported_file_types=self.SUPPORTED_FILE_TYPES,
                         session_id=self.session_id)
         except Exception as e:
@@ -69,8 +69,7 @@ class DocumentIngestor:
                 unique_filename = f"{uuid.uuid4().hex[:8]}{ext}"
                 temp_path = self.session_file_path / unique_filename
 
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.read())
+                stream_to_disk(uploaded_file, temp_path)
                 
                 self.log.info(f"File saved successfully",
                             filename = uploaded_file.name,
@@ -78,7 +77,8 @@ class DocumentIngestor:
                             session_id = self.session_id)
         
                 if ext == ".pdf":
-                    loader = PyPDFLoader(str(temp_path))
+                    documents.extend(DOCUMENT_PARSER.load(temp_path))
+                    continue
                 elif ext == ".txt":
                     loader = TextLoader(str(temp_path), encoding = "utf-8")
                 elif ext == ".docx":
@@ -109,7 +109,7 @@ class DocumentIngestor:
             self.log.info("Split the documents successfully", count = len(chunks), session_id = self.session_id)
 
             vectorstore = FAISS.from_documents(documents = chunks, 
-                                            embedding = self.model_loader.load_embeddings())
+                                            embedding = MODEL_REGISTRY.get_embeddings())
             self.log.info("Created the vector store successfully", session_id = self.session_id)
 
             vectorstore.save_local(str(self.session_faiss_path))
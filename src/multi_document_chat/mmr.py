@@ -0,0 +1,97 @@
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document  # type: ignore
+from langchain_core.embeddings import Embeddings  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+from logger import GLOBAL_LOGGER as log
+
+# docstore -> (mapping size, docstore id -> FAISS position), rebuilt when the index grows;
+# keyed by docstore so per-request copies of a cached vectorstore share one map
+_POSITIONS: "weakref.WeakKeyDictionary[Any, Tuple[int, Dict[str, int]]]" = weakref.WeakKeyDictionary()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(query_vector: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Greedy maximal marginal relevance over candidate vectors (rows), fully vectorized:
+    each step scores every remaining candidate at once as
+        lambda * sim(query, c) - (1 - lambda) * max sim(c, already selected)
+    and keeps a running max instead of recomputing it. Returns candidate indices.
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    cand = _normalize(np.asarray(candidates, dtype="float32"))
+    query = _normalize(np.asarray(query_vector, dtype="float32").reshape(1, -1))[0]
+    relevance = cand @ query
+    pairwise = cand @ cand.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
+
+
+class MaximalMarginalRelevance:
+    """
+    Retrieval stage: re-rank an over-fetched candidate list down to k diverse chunks.
+
+    Candidate vectors are reconstructed from the FAISS index by docstore id rather
+    than re-embedded; only chunks the index cannot reconstruct fall back to the
+    (cached) embeddings client.
+    """
+
+    def __init__(self, vectorstore: FAISS, embeddings: Embeddings, k: int = 5, lambda_mult: float = 0.5):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.k = k
+        self.lambda_mult = lambda_mult
+
+    def _position(self, doc_id: Optional[str]) -> Optional[int]:
+        if doc_id is None:
+            return None
+        mapping = self.vectorstore.index_to_docstore_id
+        if hasattr(self.vectorstore.docstore, "position_for_id"):
+            return self.vectorstore.docstore.position_for_id(doc_id)
+        size, inverse = _POSITIONS.get(self.vectorstore.docstore, (-1, {}))
+        if size != len(mapping):
+            inverse = {v: i for i, v in mapping.items()}
+            _POSITIONS[self.vectorstore.docstore] = (len(mapping), inverse)
+        return inverse.get(doc_id)
+
+    def candidate_vectors(self, docs: List[Document]) -> np.ndarray:
+        index = self.vectorstore.index
+        vectors: List[Optional[np.ndarray]] = []
+        for doc in docs:
+            position = self._position(doc.id)
+            try:
+                vectors.append(index.reconstruct(int(position)) if position is not None else None)
+            except RuntimeError:  # e.g. IVF without a direct map
+                vectors.append(None)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            embedded = self.embeddings.embed_documents([docs[i].page_content for i in missing])
+            for i, vec in zip(missing, embedded):
+                vectors[i] = np.asarray(vec, dtype="float32")
+        return np.vstack(vectors)
+
+    def __call__(self, query: str, docs: List[Document]) -> List[Document]:
+        if len(docs) <= self.k:
+            return docs
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype="float32")
+        picked = mmr_select(query_vector, self.candidate_vectors(docs), self.k, self.lambda_mult)
+        log.info("MMR re-ranked candidates", candidates=len(docs), selected=len(picked))
+        return [docs[i] for i in picked]
@@ -8,8 +8,9 @@ from langchain_community.vectorstores import FAISS #type:ignore
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain #type:ignore
 from langchain.chains.combine_documents import create_stuff_documents_chain #type:ignore
 from langchain_core.output_parsers import StrOutputParser #type:ignore
-from langchain_core.messages import BaseMessage #type:ignore
-from utlis.model_loader import ModelLoader
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage #type:ignore
+from utlis.model_loader import MODEL_REGISTRY
+from utlis.chat_history import StoreBackedChatMessageHistory, get_chat_history_store
 from exception.custom_exception import DocumentPortalException
 from logger.custom_logger import CustomLogger
 from model.models import PromptType
@@ -52,7 +53,7 @@ class ConversationalRAG:
         """
         try:
             # Implement logic to load retriever from FAISS here
-            embedding_model = ModelLoader().load_embedding_model()
+            embedding_model = MODEL_REGISTRY.get_embeddings()
 
             if os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory does not exist{index_path}")
@@ -96,13 +97,17 @@ class ConversationalRAG:
             str: _description_
         """
         try:
+            # Without an explicit history, use (and extend) the server-side session history
+            session_history = self._get_session_history(self.session_id) if chat_history is None else None
             answer = self.chain.invoke(
                 {
                     "input": user_input,
-                    "chat_history":chat_history if chat_history else []
+                    "chat_history": session_history.messages if session_history else chat_history
                 },
                 config={"configurable": {"session_id": self.session_id}}
             )
+            if session_history is not None and answer:
+                session_history.add_messages([HumanMessage(content=user_input), AIMessage(content=answer)])
 
             if not answer:
                 self.log.warning("No answer found from the RAG chain", session_id=self.session_id)
@@ -118,10 +123,13 @@ class ConversationalRAG:
             self.log.error(f"Error in invoking Conversational RAG", error=str(e))
             raise DocumentPortalException("Error in invoking Conversational RAG", sys)
         
+    def _get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        return StoreBackedChatMessageHistory(get_chat_history_store(), session_id)
+
     def _load_llm(self):
         try:
             # Implement logic to load LLM here
-            model = ModelLoader().load_llm()
+            model = MODEL_REGISTRY.get_llm()
             self.log.info("Loaded LLM",
                         session_id=self.session_id,
                         model_name=model.__class__.__name__)
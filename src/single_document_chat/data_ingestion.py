@@ -2,12 +2,13 @@ import uuid
 from pathlib import Path
 import sys
 from datetime import datetime, timezone
-from langchain_community.document_loaders import PyPDFLoader #type:ignore
 from langchain.text_splitter import RecursiveCharacterTextSplitter #type:ignore
 from langchain_community.vectorstores import FAISS #type:ignore
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
-from utlis.model_loader import ModelLoader
+from utlis.model_loader import MODEL_REGISTRY
+from utlis.document_parser import DOCUMENT_PARSER
+from utlis.file_io import stream_to_disk
 
 class SingleDocIngestor:
     def __init__(self, data_dir:str = "data/single_document_chat", faiss_dir:str="faiss_index"):
@@ -19,7 +20,6 @@ class SingleDocIngestor:
             self.faiss_dir = Path(faiss_dir)
             self.faiss_dir.mkdir(parents=True, exist_ok=True)
 
-            self.model_loader = ModelLoader()
             self.log.info("Single document ingestor initialized successfully", dir_path = str(self.data_dir),
                         faiss_dir = str(self.faiss_dir))
             
@@ -35,12 +35,10 @@ class SingleDocIngestor:
                 unique_filename = f"session_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}.pdf"
 
                 temp_path = self.data_dir / unique_filename
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.read())
+                stream_to_disk(uploaded_file, temp_path)
                 self.log.info("Saved the file successfully", file_name=unique_filename)
             
-                loader = PyPDFLoader(str(temp_path))
-                docs = loader.load()
+                docs = DOCUMENT_PARSER.load(temp_path)
                 documents.extend(docs)
             self.log.info("Loaded the documents successfully", count=len(documents))
             return self._create_retriever(documents)
@@ -55,7 +53,7 @@ class SingleDocIngestor:
             texts = splitter.split_documents(documents)
             self.log.info("Split the documents successfully", count=len(texts))
 
-            vectorstore = FAISS.from_documents(texts, self.model_loader.load_embeddings())
+            vectorstore = FAISS.from_documents(texts, MODEL_REGISTRY.get_embeddings())
             self.log.info("Created the vector store successfully")
 
             # Save the vector store
@@ -2,12 +2,12 @@ import os
 import sys
 from dotenv import load_dotenv #type:ignore
 from langchain_core.chat_history import BaseChatMessageHistory #type:ignore
-from langchain_community.chat_message_histories import ChatMessageHistory #type:ignore
 from langchain_core.runnables.history import RunnableWithMessageHistory #type:ignore
 from langchain_community.vectorstores import FAISS #type:ignore
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain #type:ignore
 from langchain.chains.combine_documents import create_stuff_documents_chain #type:ignore
-from utlis.model_loader import ModelLoader
+from utlis.model_loader import MODEL_REGISTRY
+from utlis.chat_history import StoreBackedChatMessageHistory, get_chat_history_store
 from exception.custom_exception import DocumentPortalException
 from logger.custom_logger import CustomLogger
 from model.models import PromptType
@@ -47,16 +47,16 @@ class ConversationalRAG:
         
     def _load_llm(self):
         try:
-            llm = ModelLoader().load_llm()
+            llm = MODEL_REGISTRY.get_llm()
             self.log.info("Loaded the LLM successfully", llm_type=str(type(llm)), Model_name = llm.__class__.__name__)
             return llm
         except Exception as e:
             self.log.error("Failed to load the LLM", error=str(e))
             raise DocumentPortalException("Failed to load the LLM", sys)
         
-    def _get_session_history(self, session_id: str):
+    def _get_session_history(self, session_id: str) -> BaseChatMessageHistory:
         try:
-            return ChatMessageHistory()
+            return StoreBackedChatMessageHistory(get_chat_history_store(), session_id)
 
         except Exception as e:
             self.log.error("Failed to get the session history", session_id=session_id ,error=str(e))
@@ -64,7 +64,7 @@ class ConversationalRAG:
     
     def load_retriever_from_faiss(self, index_path:str):
         try:
-            embeddings = ModelLoader().load_embeddings()
+            embeddings = MODEL_REGISTRY.get_embeddings()
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory does not exist{index_path}")
 
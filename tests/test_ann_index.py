@@ -0,0 +1,25 @@
+# tests/test_ann_index.py
+
+import faiss
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utlis import ann_index
+
+embeddings = DeterministicFakeEmbedding(size=16)
+
+
+def test_with_search_params_leaves_shared_index_untouched():
+    settings = ann_index.index_settings({"vector_index": {"type": "hnsw"}})
+    vs = ann_index.build_vectorstore([f"chunk {i}" for i in range(50)], embeddings, settings)
+    shared_ef = faiss.downcast_index(vs.index).hnsw.efSearch
+
+    tuned = ann_index.with_search_params(vs, ef_search=shared_ef + 100)
+
+    assert tuned is not vs and tuned.docstore is vs.docstore
+    assert faiss.downcast_index(vs.index).hnsw.efSearch == shared_ef
+    assert tuned.index.params.efSearch == shared_ef + 100
+    assert tuned.similarity_search("chunk 3", k=1)[0].page_content == "chunk 3"
+
+
+def test_with_search_params_is_noop_for_flat():
+    vs = ann_index.build_vectorstore(["a", "b"], embeddings, ann_index.index_settings({}))
+    assert ann_index.with_search_params(vs, nprobe=4, ef_search=8) is vs
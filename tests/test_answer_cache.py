@@ -0,0 +1,53 @@
+# tests/test_answer_cache.py
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+from src.document_chat.retrieval import ConversationalRAG
+from src.multi_document_chat.contextualcompression import EmbeddingsSentenceFilter
+from utlis.answer_cache import SemanticAnswerCache, ANSWER_CACHE
+
+embeddings = DeterministicFakeEmbedding(size=16)
+
+
+def test_answers_are_scoped_by_retrieval_key(tmp_path):
+    cache = SemanticAnswerCache(threshold=0.99)
+    vec = embeddings.embed_query("what is the total?")
+    cache.put(tmp_path, "v1", "what is the total?", vec, "42", retrieval_key="k10-hybrid")
+    assert cache.lookup(tmp_path, "v1", vec, retrieval_key="k10-hybrid") == "42"
+    assert cache.lookup(tmp_path, "v1", vec, retrieval_key="k3-dense") is None
+    assert cache.lookup(tmp_path, "v2", vec, retrieval_key="k10-hybrid") is None
+
+
+def test_invalidate_drops_every_retrieval_key_of_the_index(tmp_path):
+    cache = SemanticAnswerCache()
+    vec = embeddings.embed_query("q")
+    cache.put(tmp_path, "v1", "q", vec, "a", retrieval_key="one")
+    cache.put(tmp_path, "v1", "q", vec, "b", retrieval_key="two")
+    cache.invalidate(tmp_path)
+    assert cache.stats()["entries"] == 0
+
+
+def _rag(stages=()):
+    rag = ConversationalRAG.__new__(ConversationalRAG)
+    rag.index_name = "index"
+    rag.stages = list(stages)
+    return rag
+
+
+def test_retrieval_key_changes_with_k_search_type_and_stages():
+    base = _rag()._retrieval_key("similarity", 5, 5, {}, None)
+    assert base == _rag()._retrieval_key("similarity", 5, 5, {}, None)
+    assert base != _rag()._retrieval_key("similarity", 3, 3, {}, None)
+    assert base != _rag()._retrieval_key("hybrid", 5, 5, {}, {"rrf_k": 60})
+    assert base != _rag([EmbeddingsSentenceFilter(embeddings)])._retrieval_key("similarity", 5, 5, {}, None)
+    assert _rag([EmbeddingsSentenceFilter(embeddings, min_sentences=1)])._retrieval_key("similarity", 5, 5, {}, None) != \
+        _rag([EmbeddingsSentenceFilter(embeddings, min_sentences=3)])._retrieval_key("similarity", 5, 5, {}, None)
+
+
+def test_empty_answer_is_never_cached(tmp_path):
+    rag = _rag()
+    rag.session_id, rag.index_path, rag.embeddings, rag.retrieval_key = "s", str(tmp_path), embeddings, "key"
+    rag.chain = RunnableLambda(lambda _: "")
+    before = ANSWER_CACHE.stats()["entries"]
+    assert rag.invoke("what does the contract say about penalties?") == "no answer generated."
+    assert ANSWER_CACHE.stats()["entries"] == before
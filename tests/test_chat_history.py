@@ -0,0 +1,86 @@
+# tests/test_chat_history.py
+
+from langchain_core.messages import AIMessage, HumanMessage
+from utlis.chat_history import ChatHistoryStore, StoreBackedChatMessageHistory, estimate_tokens
+
+
+def _turns(n):
+    """n question/answer exchanges; every message costs the same number of tokens."""
+    messages = []
+    for i in range(n):
+        messages += [HumanMessage(content=f"question {i:02d}".ljust(36)), AIMessage(content=f"answer {i:02d}".ljust(36))]
+    return messages
+
+
+COST = estimate_tokens(_turns(1)[0])
+
+
+def test_window_keeps_newest_messages_within_budget(tmp_path):
+    store = ChatHistoryStore(tmp_path / "chat.sqlite")
+    store.append("s1", _turns(5))
+    window = store.window("s1", max_tokens=4 * COST)
+    assert [m.content.strip() for m in window] == ["question 03", "answer 03", "question 04", "answer 04"]
+    assert len(store.window("s1", max_tokens=100 * COST)) == 10
+
+
+def test_truncated_window_starts_on_a_user_turn(tmp_path):
+    store = ChatHistoryStore(tmp_path / "chat.sqlite")
+    store.append("s1", _turns(3))
+    window = store.window("s1", max_tokens=3 * COST)
+    assert window[0].type == "human"
+    assert [m.content.strip() for m in window] == ["question 02", "answer 02"]
+
+
+def test_per_session_cap_on_disk_and_in_memory(tmp_path):
+    store = ChatHistoryStore(tmp_path / "chat.sqlite", max_messages=4)
+    store.messages("s1")  # cache the empty session so appends extend it in memory
+    store.append("s1", _turns(2))
+    store.append("s1", _turns(3)[4:])
+    assert [m.content.strip() for m in store.messages("s1")] == ["question 01", "answer 01", "question 02", "answer 02"]
+    store.append("s2", _turns(1))
+
+    reopened = ChatHistoryStore(tmp_path / "chat.sqlite", max_messages=4)
+    assert [m.content.strip() for m in reopened.messages("s1")] == ["question 01", "answer 01", "question 02", "answer 02"]
+    assert len(reopened.messages("s2")) == 2
+
+
+def test_appends_from_another_store_are_picked_up(tmp_path):
+    first = ChatHistoryStore(tmp_path / "chat.sqlite")
+    second = ChatHistoryStore(tmp_path / "chat.sqlite")
+    first.append("s1", _turns(1))
+    assert len(second.messages("s1")) == 2
+    first.append("s1", _turns(2)[2:])
+    assert len(second.messages("s1")) == 4
+
+
+def test_summarize_folds_overflow_into_the_window_prefix(tmp_path):
+    store = ChatHistoryStore(tmp_path / "chat.sqlite")
+    store.append("s1", _turns(4))
+    calls = []
+
+    def summarizer(previous, messages):
+        calls.append((previous, [m.content.strip() for m in messages]))
+        return f"{previous}+{len(messages)}"
+
+    assert store.summarize("s1", summarizer, max_tokens=4 * COST)
+    assert calls == [("", ["question 00", "answer 00", "question 01", "answer 01"])]
+    assert not store.summarize("s1", summarizer, max_tokens=4 * COST)  # nothing new overflows
+
+    window = store.window("s1", max_tokens=10 * COST)
+    assert window[0].type == "system" and "+4" in window[0].content
+    assert [m.content.strip() for m in window[1:]] == ["question 02", "answer 02", "question 03", "answer 03"]
+
+    store.append("s1", _turns(5)[8:])
+    assert store.summarize("s1", summarizer, max_tokens=4 * COST)
+    assert calls[-1] == ("+4", ["question 02", "answer 02"])
+    assert store.summary("s1")[0] == "+4+2"
+
+
+def test_clear_drops_messages_and_summary(tmp_path):
+    store = ChatHistoryStore(tmp_path / "chat.sqlite")
+    history = StoreBackedChatMessageHistory(store, "s1", max_tokens=10 * COST)
+    history.add_messages(_turns(3))
+    store.summarize("s1", lambda previous, messages: "older turns", max_tokens=2 * COST)
+    assert len(history.messages) == 3
+    history.clear()
+    assert history.messages == [] and store.summary("s1") is None
@@ -0,0 +1,43 @@
+# tests/test_compare_scheduler.py
+
+from src.document_compare.compare_scheduler import batch_pairs
+from src.document_compare.page_diff import PagePair
+
+
+def _pairs(n, diff_chars=0):
+    return [PagePair(i, i, "changed", "x" * diff_chars) for i in range(1, n + 1)]
+
+
+def test_empty_input_gives_no_batches():
+    assert batch_pairs([]) == []
+
+
+def test_page_cap_splits_batches_in_order():
+    batches = batch_pairs(_pairs(10), max_tokens=10_000, max_pages=4)
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert [p.ref_page for b in batches for p in b] == list(range(1, 11))
+
+
+def test_token_cap_splits_batches():
+    # each pair costs 400 // 4 + 10 = 110 estimated tokens
+    batches = batch_pairs(_pairs(5, diff_chars=400), max_tokens=250, max_pages=100)
+    assert [len(b) for b in batches] == [2, 2, 1]
+
+
+def test_oversized_pair_gets_its_own_batch():
+    pairs = [PagePair(1, 1, "changed", "x" * 40_000)] + _pairs(2)
+    batches = batch_pairs(pairs, max_tokens=500, max_pages=10)
+    assert [len(b) for b in batches] == [1, 2]
+    assert batches[0][0].ref_page == 1
+
+
+def test_merge_marks_pages_of_failed_batches():
+    from src.document_compare.document_comparator import DocumentComparatorLLM
+
+    pairs = [PagePair(1, 1, "unchanged"), PagePair(2, 2, "changed", "-a\n+b"), PagePair(3, None, "removed", "-c")]
+    batches = [[pairs[1]], [pairs[2]]]
+    rows, failed = DocumentComparatorLLM._merge(pairs, batches, [[{"Page": "2", "change": "a became b"}], None])
+    assert failed == 1
+    assert [r["Page"] for r in rows] == ["1", "2", "ref 3"]
+    assert rows[1]["change"] == "a became b"
+    assert "failed" in rows[2]["change"]
@@ -0,0 +1,68 @@
+# tests/test_contextual_compression.py
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.multi_document_chat.contextualcompression import EmbeddingsSentenceFilter, split_sentences
+from utlis.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+VOCAB = ("invoice", "payment", "weather", "holiday")
+
+
+class KeywordEmbeddings(Embeddings):
+    """One dimension per vocabulary word, so similarity is keyword overlap."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _vec(self, text):
+        words = text.lower().split()
+        return [float(sum(w.startswith(v) for w in words)) for v in VOCAB]
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+
+RELEVANT = "The invoice is due. Payment goes by wire. The weather was mild."
+OFF_TOPIC = "The weather was sunny. A holiday followed. Nobody worked."
+
+
+def test_split_sentences():
+    assert split_sentences("One. Two! Three?\n\nFour") == ["One.", "Two!", "Three?", "Four"]
+
+
+def test_keeps_relevant_sentences_in_order():
+    f = EmbeddingsSentenceFilter(KeywordEmbeddings(), similarity_threshold=0.5, drop_threshold=0.2, min_sentences=1)
+    kept = f("invoice payment", [Document(page_content=RELEVANT, metadata={"source": "a"})])
+    assert kept[0].page_content == "The invoice is due. Payment goes by wire."
+    assert kept[0].metadata == {"source": "a"}
+
+
+def test_min_sentences_keeps_best_even_below_threshold():
+    f = EmbeddingsSentenceFilter(KeywordEmbeddings(), similarity_threshold=0.99, drop_threshold=0.0, min_sentences=2)
+    kept = f("invoice payment", [Document(page_content=RELEVANT)])
+    assert len(split_sentences(kept[0].page_content)) == 2
+
+
+def test_drops_chunks_below_drop_threshold_but_never_all():
+    f = EmbeddingsSentenceFilter(KeywordEmbeddings(), similarity_threshold=0.5, drop_threshold=0.2, min_sentences=1)
+    kept = f("invoice", [Document(page_content=RELEVANT), Document(page_content=OFF_TOPIC)])
+    assert len(kept) == 1 and "invoice" in kept[0].page_content
+
+    only_off_topic = f("invoice", [Document(page_content=OFF_TOPIC)])
+    assert len(only_off_topic) == 1
+
+
+def test_sentence_vectors_bypass_the_persistent_store(tmp_path):
+    provider = KeywordEmbeddings()
+    store = EmbeddingStore(tmp_path / "emb.sqlite")
+    cached = CachedEmbeddings(provider, "keyword-test-model", store=store)
+    f = EmbeddingsSentenceFilter(cached, similarity_threshold=0.5, drop_threshold=0.2, min_sentences=1)
+
+    f("invoice", [Document(page_content=RELEVANT)])
+    f("payment", [Document(page_content=RELEVANT)])
+    assert store.get_many([EmbeddingStore.make_key("keyword-test-model", "The invoice is due.")]) == {}
+    assert len(provider.calls) == 1  # second query reuses the in-memory sentence vectors
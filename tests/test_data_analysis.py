@@ -0,0 +1,95 @@
+# tests/test_data_analysis.py
+
+import asyncio
+import json
+import pytest
+from langchain_core.output_parsers import JsonOutputParser
+from exception.custom_exception import DocumentPortalException
+from langchain_core.runnables import RunnableLambda
+from model.models import Metadata, PromptType
+from prompt.prompt_library import PROMPT_REGISTRY
+from src.document_analyzer.data_analysis import DocumentAnalyzer, pack_sections, split_sections
+
+FILE_META = {"title": "Lease", "author": "A. Smith; B. Jones", "created": "2024-01-31", "modified": "", "page_count": 3}
+
+
+def _analyzer():
+    analyzer = DocumentAnalyzer.__new__(DocumentAnalyzer)
+    analyzer.parser = JsonOutputParser(pydantic_object=Metadata)
+    return analyzer
+
+
+def _schema_fields(instructions: str):
+    schema = json.loads(instructions[instructions.index("```") + 3:instructions.rindex("```")])
+    return set(schema["properties"])
+
+
+def test_llm_is_not_asked_for_fields_the_file_provides():
+    fields = _schema_fields(_analyzer()._format_instructions(FILE_META))
+    assert not fields & {"Title", "Author", "DateCreated", "PageCount"}
+    assert {"Summary", "LastModifiedDate", "Publisher", "Language", "SentimentTone"} <= fields
+    assert _schema_fields(_analyzer()._format_instructions(None)) == set(Metadata.model_fields)
+
+
+def test_file_metadata_fills_the_omitted_fields():
+    response = DocumentAnalyzer._apply_file_metadata({"Summary": ["s"], "LastModifiedDate": "Not Available"}, FILE_META)
+    assert response["Title"] == "Lease" and response["Author"] == ["A. Smith", "B. Jones"]
+    assert response["DateCreated"] == "2024-01-31" and response["PageCount"] == 3
+    assert response["LastModifiedDate"] == "Not Available"
+
+
+def test_single_section_stream_errors_are_wrapped_like_multi_section():
+    analyzer = _analyzer()
+
+    async def broken(text, format_instructions=None):
+        raise ValueError("provider down")
+        yield  # pragma: no cover
+
+    analyzer.astream_analysis = broken
+
+    async def consume():
+        return [e async for e in analyzer.astream_pages_analysis(["one short page"], FILE_META)]
+
+    with pytest.raises(DocumentPortalException):
+        asyncio.run(consume())
+
+
+def test_split_sections_packs_whole_pages_and_skips_blank_ones():
+    sections = split_sections(["a" * 30, "   ", "b" * 30, "c" * 30], max_tokens=25)  # each page is ~48 chars with its marker
+    assert [span for span, _ in sections] == ["1-3", "4"]
+    assert "--- Page 1 ---" in sections[0][1] and "--- Page 3 ---" in sections[0][1]
+    assert "--- Page 2 ---" not in sections[0][1]
+    assert split_sections(["", " "]) == []
+
+
+def test_pack_sections_splits_only_oversized_items():
+    sections = pack_sections([("1", "x" * 10), ("2", "y" * 25), ("3-4", "z" * 5)], max_tokens=5)
+    assert sections == [("1", "x" * 10), ("2", "y" * 20), ("2-4", "y" * 5 + "\n" + "z" * 5)]
+    assert "".join(t for _, t in pack_sections([("1", "abc" * 20)], max_tokens=4)) == "abc" * 20
+
+
+def test_analyze_pages_maps_sections_then_reduces_the_summaries():
+    analyzer = _analyzer()
+    analyzer.section_prompt = PROMPT_REGISTRY[PromptType.SECTION_SUMMARY.value]
+    analyzer.reduce_prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS_REDUCE.value]
+    analyzer.fixing_parser = analyzer.parser
+    reduce_inputs = []
+
+    def summarize(prompt):
+        text = prompt.to_string()
+        return f"summary of {text.count('--- Page')} pages"
+
+    def reduce(prompt):
+        reduce_inputs.append(prompt.to_string())
+        return json.dumps({"Summary": ["whole document"], "LastModifiedDate": "Not Available"})
+
+    analyzer.llm = RunnableLambda(summarize)
+    analyzer.json_llm = RunnableLambda(reduce)
+    pages = ["p" * 10000] * 5  # two pages per default-size section
+
+    response = analyzer.analyze_pages(pages, FILE_META)
+    assert response["Summary"] == ["whole document"] and response["Title"] == "Lease"
+    assert len(reduce_inputs) == 1
+    assert "[Pages 1-2]" in reduce_inputs[0] and "[Pages 5]" in reduce_inputs[0]
+    assert "summary of 2 pages" in reduce_inputs[0]
+    assert asyncio.run(analyzer.aanalyze_pages(pages, FILE_META)) == response
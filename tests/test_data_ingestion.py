@@ -0,0 +1,97 @@
+# tests/test_data_ingestion.py
+
+import json
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.document_ingestion.data_ingestion import FaissManager
+from utlis.config_loader import load_config
+from utlis.faiss_store import FaissStore
+from utlis.file_io import sha256_file
+from utlis.model_loader import MODEL_REGISTRY
+
+embeddings = DeterministicFakeEmbedding(size=16)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # No provider keys in the test environment: serve the real config and fake embeddings
+    config = load_config("config/config.yaml")
+    monkeypatch.setattr(type(MODEL_REGISTRY), "config", property(lambda self: config))
+    monkeypatch.setattr(MODEL_REGISTRY, "get_embeddings", lambda: embeddings)
+    return MODEL_REGISTRY
+
+
+def _legacy_index(index_dir, source):
+    """An index written before the metadata store existed: chunks without doc_sha256."""
+    vs = FAISS.from_texts(["alpha chunk", "beta chunk"], embeddings, metadatas=[{"source": str(source)}] * 2)
+    FaissStore(index_dir).write_base(vs)
+
+
+def test_backfill_ties_legacy_chunks_to_their_document(tmp_path, registry):
+    source = tmp_path / "doc.txt"
+    source.write_text("alpha chunk\nbeta chunk", encoding="utf-8")
+    index_dir = tmp_path / "index"
+    _legacy_index(index_dir, source)
+    (index_dir / "ingested_meta.json").write_text(json.dumps({"rows": {f"{source}::": True}}), encoding="utf-8")
+
+    fm = FaissManager(index_dir)
+    digest = sha256_file(source)
+    assert fm.meta.count() == 2
+    assert fm.meta.existing_documents([digest]) == {digest}
+    assert fm.new_documents([Document(page_content="alpha chunk", metadata={"source": "renamed.txt", "doc_sha256": digest})]) == []
+    assert not (index_dir / "ingested_meta.json").exists()
+    assert (index_dir / "ingested_meta.json.migrated").exists()
+
+
+def test_backfill_without_source_file_keeps_content_fingerprints(tmp_path, registry):
+    index_dir = tmp_path / "index"
+    _legacy_index(index_dir, tmp_path / "gone.txt")
+
+    fm = FaissManager(index_dir)
+    assert fm.meta.count() == 2
+    assert fm.new_documents([Document(page_content="beta  chunk")]) == []
+
+
+def test_backfill_runs_only_on_an_empty_store(tmp_path, registry):
+    index_dir = tmp_path / "index"
+    _legacy_index(index_dir, tmp_path / "gone.txt")
+    FaissManager(index_dir)
+    fm = FaissManager(index_dir)
+    assert fm.meta.count() == 2
+    assert fm.meta.documents_by_session(index_dir.name) == []
+
+
+def _doc(text, doc_hash="d1", source="a.pdf"):
+    return Document(page_content=text, metadata={"source": source, "doc_sha256": doc_hash})
+
+
+def test_fingerprint_ignores_whitespace_and_upload_name():
+    a = FaissManager._fingerprint("Total  due:\n 42", {"doc_sha256": "d1", "source": "a.pdf"})
+    b = FaissManager._fingerprint("Total due: 42", {"doc_sha256": "d1", "source": "renamed.pdf"})
+    assert a == b
+    assert a != FaissManager._fingerprint("Total due: 42", {"doc_sha256": "d2"})
+
+
+def test_new_documents_skips_known_documents_chunks_and_batch_duplicates(tmp_path, registry):
+    fm = FaissManager(tmp_path / "index")
+    fm._record([_doc("alpha", "known-doc")])
+    fm.meta.add_chunks([{"fingerprint": FaissManager._fingerprint("beta", {"doc_sha256": "d1"})}])
+
+    fresh = fm.new_documents([
+        _doc("anything", "known-doc"),  # whole document already ingested
+        _doc("beta"),                    # chunk already ingested
+        _doc("gamma"),
+        _doc("gamma "),                  # same chunk twice in one batch
+        _doc("gamma", "d2"),             # same text, different document
+    ])
+    assert [(d.page_content, d.metadata["doc_sha256"]) for d in fresh] == [("gamma", "d1"), ("gamma", "d2")]
+
+
+def test_recorded_chunks_are_not_offered_again(tmp_path, registry):
+    fm = FaissManager(tmp_path / "index")
+    docs = [_doc("one"), _doc("two")]
+    fm._record(fm.new_documents(docs))
+    assert fm.new_documents(docs) == []
+    assert fm.meta.documents_by_session("index")[0]["chunks"] == 2
@@ -0,0 +1,57 @@
+# tests/test_embedding_cache.py
+
+import sqlite3
+from utlis.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_hits_skip_the_provider_and_misses_are_stored(tmp_path):
+    provider = CountingEmbeddings()
+    store = EmbeddingStore(tmp_path / "emb.sqlite")
+    emb = CachedEmbeddings(provider, "m", store=store)
+
+    assert emb.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert provider.embedded == ["a", "bb"]
+    assert emb.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert provider.embedded == ["a", "bb", "ccc"]
+    assert store.stats()["hits"] == 1
+
+
+def test_row_cap_evicts_least_recently_used(tmp_path):
+    store = EmbeddingStore(tmp_path / "emb.sqlite", max_rows=2)
+    store.put_many("m", {"k1": [1.0]})
+    store.put_many("m", {"k2": [2.0]})
+    store.get_many(["k1"])  # k1 is now more recent than k2
+    store.put_many("m", {"k3": [3.0]})
+    assert set(store.get_many(["k1", "k2", "k3"])) == {"k1", "k3"}
+    assert store.stats()["entries"] == 2 and store.stats()["evictions"] == 1
+
+
+def test_byte_cap_bounds_stored_vectors(tmp_path):
+    store = EmbeddingStore(tmp_path / "emb.sqlite", max_bytes=4 * 8 * 3)  # three 8-dim vectors
+    for i in range(10):
+        store.put_many("m", {f"k{i}": [float(i)] * 8})
+    assert store.stats()["entries"] == 3
+    assert set(store.get_many([f"k{i}" for i in range(10)])) == {"k7", "k8", "k9"}
+
+
+def test_opens_a_store_without_the_last_used_column(tmp_path):
+    path = tmp_path / "old.sqlite"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)")
+    conn.commit()
+    conn.close()
+    store = EmbeddingStore(path, max_rows=1)
+    store.put_many("m", {"a": [1.0], "b": [2.0]})
+    assert store.stats()["entries"] == 1
@@ -0,0 +1,161 @@
+# tests/test_faiss_store.py
+
+import os
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utlis import faiss_store
+from utlis.faiss_store import FaissStore, SegmentedIndex
+
+embeddings = DeterministicFakeEmbedding(size=16)
+
+needs_proc_maps = pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps")
+
+
+def _is_mapped(path) -> bool:
+    with open("/proc/self/maps") as f:
+        return str(path) in f.read()
+
+
+def _base_store(tmp_path) -> FaissStore:
+    store = FaissStore(tmp_path)
+    store.write_base(FAISS.from_texts([f"base chunk {i}" for i in range(20)], embeddings))
+    return store
+
+
+@needs_proc_maps
+def test_load_readonly_memory_maps_flat_index(tmp_path):
+    store = _base_store(tmp_path)
+    vs = store.load_readonly(embeddings)
+    assert _is_mapped(store.faiss_path.resolve())
+    assert vs.similarity_search("base chunk 7", k=1)[0].page_content == "base chunk 7"
+
+
+@needs_proc_maps
+def test_load_readonly_keeps_mmap_with_uncompacted_segment(tmp_path):
+    store = _base_store(tmp_path)
+    store.append(["seg-1"], ["segment chunk"], [{"source": "new.pdf"}], [embeddings.embed_query("segment chunk")])
+    assert store.read_manifest()["segment"]["count"] == 1
+
+    vs = store.load_readonly(embeddings)
+    assert isinstance(vs.index, SegmentedIndex)
+    assert _is_mapped(store.faiss_path.resolve())
+    assert vs.index.ntotal == 21
+
+    hit = vs.similarity_search("segment chunk", k=1)[0]
+    assert hit.id == "seg-1" and hit.metadata == {"source": "new.pdf"}
+    assert vs.docstore.position_for_id("seg-1") == 20
+    assert vs.similarity_search("base chunk 3", k=1)[0].page_content == "base chunk 3"
+
+
+def _append(store, *texts):
+    return store.append(
+        [f"id-{t}" for t in texts], list(texts), [{"source": f"{t}.pdf"} for t in texts],
+        embeddings.embed_documents(list(texts)),
+    )
+
+
+def test_append_commits_records_that_load_replays(tmp_path):
+    store = _base_store(tmp_path)
+    _append(store, "alpha")
+    manifest = _append(store, "beta", "gamma")
+    assert manifest["segment"]["count"] == 3 and store.version() == "1.3"
+
+    vs = FaissStore(tmp_path).load(embeddings)
+    assert vs.index.ntotal == 23
+    assert vs.similarity_search("gamma", k=1)[0].metadata == {"source": "gamma.pdf"}
+
+
+def test_torn_append_is_ignored_and_truncated(tmp_path):
+    store = _base_store(tmp_path)
+    _append(store, "alpha")
+    committed = store.read_manifest()["segment"]
+    with open(store.log_path, "ab") as f:
+        f.write(b'{"id": "torn", "te')  # crash mid-write, manifest never updated
+    assert store.load(embeddings).index.ntotal == 21
+
+    _append(store, "beta")
+    assert store.log_path.stat().st_size > committed["log_bytes"]
+    assert b"torn" not in store.log_path.read_bytes()
+    assert store.load(embeddings).index.ntotal == 22
+
+
+def test_append_rejects_a_different_embedding_dimension(tmp_path):
+    store = _base_store(tmp_path)
+    _append(store, "alpha")
+    with pytest.raises(ValueError):
+        store.append(["x"], ["x"], [{}], [[0.0] * 8])
+
+
+def test_needs_compaction_uses_count_and_ratio(tmp_path, monkeypatch):
+    monkeypatch.setattr(faiss_store, "FAISS_COMPACT_MIN_VECTORS", 2)
+    monkeypatch.setattr(faiss_store, "FAISS_COMPACT_RATIO", 0.2)
+    store = _base_store(tmp_path)
+    assert not store.needs_compaction(_append(store, "alpha", "beta", "gamma"))  # 3 < 20 * 0.2
+    assert store.needs_compaction(_append(store, "delta"))
+
+
+def test_compact_folds_the_segment_into_the_base(tmp_path):
+    store = _base_store(tmp_path)
+    _append(store, "alpha", "beta")
+    seen = []
+
+    def transform(vs):
+        seen.append(vs.index.ntotal)
+        return vs
+
+    vs = store.compact(embeddings, transform=transform)
+    manifest = store.read_manifest()
+    assert seen == [22] and vs.index.ntotal == 22
+    assert manifest["generation"] == 2 and manifest["base_ntotal"] == 22 and not manifest["pending_swap"]
+    assert manifest["segment"]["count"] == 0
+    assert store.vec_path.stat().st_size == 0 and store.log_path.stat().st_size == 0
+    assert not list(tmp_path.glob("index.next.*"))
+
+    reloaded = FaissStore(tmp_path).load(embeddings)
+    assert reloaded.index.ntotal == 22
+    assert reloaded.similarity_search("beta", k=1)[0].id == "id-beta"
+    assert FaissStore(tmp_path).load_readonly(embeddings).index.ntotal == 22
+
+
+def test_crash_between_base_write_and_swap_is_recovered_on_open(tmp_path, monkeypatch):
+    store = _base_store(tmp_path)
+    _append(store, "alpha", "beta")
+
+    def crash():
+        raise SystemExit("killed after committing pending_swap")
+
+    monkeypatch.setattr(store, "_recover", crash)
+    with pytest.raises(SystemExit):
+        store.compact(embeddings)
+    manifest = store.read_manifest()
+    assert manifest["pending_swap"] and manifest["generation"] == 2
+    assert (tmp_path / "index.next.faiss").exists()
+    assert store.read_manifest()["segment"]["count"] == 0
+
+    # The next process finishes the swap instead of replaying the folded segment again
+    reopened = FaissStore(tmp_path)
+    assert reopened.load_readonly(embeddings).index.ntotal == 22
+    manifest = reopened.read_manifest()
+    assert not manifest["pending_swap"] and manifest["base_ntotal"] == 22
+    assert not list(tmp_path.glob("index.next.*"))
+    assert reopened.vec_path.stat().st_size == 0
+    assert reopened.load(embeddings).similarity_search("alpha", k=1)[0].id == "id-alpha"
+
+
+def test_crash_before_the_manifest_commit_keeps_the_old_index(tmp_path, monkeypatch):
+    store = _base_store(tmp_path)
+    _append(store, "alpha")
+
+    def crash(manifest):
+        raise SystemExit("killed before committing pending_swap")
+
+    monkeypatch.setattr(store, "_write_manifest", crash)
+    with pytest.raises(SystemExit):
+        store.compact(embeddings)
+
+    reopened = FaissStore(tmp_path)
+    assert reopened.read_manifest()["segment"]["count"] == 1
+    assert reopened.load(embeddings).index.ntotal == 21
+    _append(reopened, "beta")
+    assert reopened.compact(embeddings).index.ntotal == 22
@@ -0,0 +1,66 @@
+# tests/test_hybrid_retrieval.py
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.document_chat.hybrid_retriever import HybridRetriever, hybrid_settings, reciprocal_rank_fusion
+from utlis.sparse_index import BM25Index, tokenize
+
+TEXTS = {
+    "c1": "Clause 12.3 limits liability to the fees paid.",
+    "c2": "Invoice INV-2024-0042 is payable within thirty days.",
+    "c3": "The tenant maintains the premises and the garden.",
+}
+
+
+def _index(tmp_path) -> BM25Index:
+    index = BM25Index(tmp_path / "sparse.sqlite")
+    index.add(list(TEXTS), list(TEXTS.values()), [{"source": f"{i}.pdf"} for i in TEXTS])
+    return index
+
+
+def _doc(doc_id):
+    return Document(page_content=TEXTS[doc_id], id=doc_id)
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    tokens = tokenize("See Clause 12.3(b) on INV-2024-0042 for the SKU/77-A")
+    assert {"12.3", "inv-2024-0042", "2024", "sku/77-a", "77"} <= set(tokens)
+    assert "the" not in tokens and "on" not in tokens
+
+
+def test_bm25_ranks_exact_terms_first(tmp_path):
+    index = _index(tmp_path)
+    hits = index.search("INV-2024-0042 payable", k=3)
+    assert hits[0][0].id == "c2" and hits[0][0].metadata == {"source": "c2.pdf"}
+    assert [d.id for d, _ in index.search("clause 12.3", k=1)] == ["c1"]
+    assert index.search("nothing matches zebra", k=3) == []
+
+
+def test_bm25_add_is_idempotent_and_reset_empties(tmp_path):
+    index = _index(tmp_path)
+    index.add(["c1"], [TEXTS["c1"]])
+    assert index.count() == 3
+    index.reset()
+    assert index.count() == 0 and index.search("invoice") == []
+
+
+def test_rrf_rewards_documents_on_both_lists():
+    dense = [_doc("c3"), _doc("c1")]
+    sparse = [_doc("c1"), _doc("c2")]
+    fused = reciprocal_rank_fusion([dense, sparse], [1.0, 1.0], k=3, rrf_k=60)
+    assert [d.id for d in fused] == ["c1", "c3", "c2"]
+
+
+def test_rrf_weights_and_k():
+    dense, sparse = [_doc("c3")], [_doc("c2")]
+    assert [d.id for d in reciprocal_rank_fusion([dense, sparse], [1.0, 2.0], k=1)] == ["c2"]
+    assert [d.id for d in reciprocal_rank_fusion([dense, sparse], [2.0, 1.0], k=1)] == ["c3"]
+
+
+def test_hybrid_retriever_surfaces_sparse_only_match(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    vectorstore = FAISS.from_texts(list(TEXTS.values()), embeddings, ids=list(TEXTS))
+    settings = hybrid_settings({"retriever": {"hybrid": {"fetch_k": 3, "dense_weight": 0.1}}})
+    retriever = HybridRetriever.from_settings(vectorstore, _index(tmp_path), 1, settings)
+    assert [d.id for d in retriever.invoke("INV-2024-0042")] == ["c2"]
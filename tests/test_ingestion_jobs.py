@@ -0,0 +1,56 @@
+# tests/test_ingestion_jobs.py
+
+import pytest
+from src.document_ingestion.ingestion_jobs import (
+    CANCELLED, FAILED, RUNNING, SUCCEEDED, IngestionJobManager, JobStore,
+)
+
+
+class FakeIngestor:
+    session_id = "s1"
+    faiss_dir = "faiss_index/s1"
+
+    def __init__(self, store, cancel_after):
+        self.store, self.cancel_after = store, cancel_after
+
+    def build_from_paths(self, paths, progress, **kwargs):
+        for stage in ("parsed_pages", "chunks", "embedded", "indexed"):
+            progress(stage, 1)
+            if stage == self.cancel_after:
+                self.store.request_cancel(self.job_id)
+
+
+def _run(tmp_path, cancel_after):
+    store = JobStore(tmp_path / "jobs.sqlite")
+    manager = IngestionJobManager(store)
+    ingestor = FakeIngestor(store, cancel_after)
+    ingestor.job_id = store.create("chat_index", "s1", {})
+    manager._run(ingestor.job_id, ingestor, [], {})
+    return store.get(ingestor.job_id)["status"]
+
+
+def test_cancel_before_the_index_is_written_cancels(tmp_path):
+    assert _run(tmp_path, cancel_after="chunks") == CANCELLED
+
+
+def test_cancel_after_the_index_is_written_is_ignored(tmp_path):
+    assert _run(tmp_path, cancel_after="indexed") == SUCCEEDED
+
+
+def test_stale_running_jobs_fail_when_a_manager_starts(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite")
+    stale, fresh = store.create("chat_index", "a", {}), store.create("chat_index", "b", {})
+    store.update(stale, status=RUNNING)
+    store.update(fresh, status=RUNNING)
+    with store._conn:
+        store._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", ("2000-01-01T00:00:00+00:00", stale))
+    IngestionJobManager(store, stale_seconds=60)
+    assert store.get(stale)["status"] == FAILED and store.get(stale)["error"]
+    assert store.get(fresh)["status"] == RUNNING
+
+
+def test_shutdown_stops_the_worker_pool(tmp_path):
+    manager = IngestionJobManager(JobStore(tmp_path / "jobs.sqlite"))
+    manager.shutdown()
+    with pytest.raises(RuntimeError):
+        manager.submit(FakeIngestor(manager.store, cancel_after=None), [])
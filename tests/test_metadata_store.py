@@ -0,0 +1,19 @@
+# tests/test_metadata_store.py
+
+from utlis.metadata_store import ChunkMetadataStore
+
+
+def test_for_index_shares_one_store_per_index_dir(tmp_path):
+    store = ChunkMetadataStore.for_index(tmp_path)
+    store.add_chunks([{"fingerprint": "doc:abc", "doc_sha256": "doc", "source": "a.pdf"}])
+    assert ChunkMetadataStore.for_index(tmp_path) is store
+    assert ChunkMetadataStore.for_index(tmp_path / "other") is not store
+    assert store.existing_documents(["doc", "missing"]) == {"doc"}
+
+
+def test_for_index_reopens_when_the_database_was_deleted(tmp_path):
+    store = ChunkMetadataStore.for_index(tmp_path)
+    for path in tmp_path.glob("ingested_meta.sqlite*"):
+        path.unlink()
+    reopened = ChunkMetadataStore.for_index(tmp_path)
+    assert reopened is not store and reopened.count() == 0
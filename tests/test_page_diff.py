@@ -0,0 +1,52 @@
+# tests/test_page_diff.py
+
+from src.document_compare.page_diff import align_pages, line_diff
+
+
+def _summary(pairs):
+    return [(p.label, p.status) for p in pairs]
+
+
+def test_identical_documents_are_all_unchanged():
+    pages = ["one", "two", "three"]
+    assert _summary(align_pages(pages, pages)) == [("1", "unchanged"), ("2", "unchanged"), ("3", "unchanged")]
+
+
+def test_whitespace_only_differences_are_unchanged():
+    assert align_pages(["a  b\n\nc"], ["a b\nc  "])[0].status == "unchanged"
+
+
+def test_inserted_page_does_not_shift_later_pages_into_changes():
+    ref = ["p1", "p2", "p3", "p4"]
+    act = ["p1", "p2", "new", "p3", "p4"]
+    assert _summary(align_pages(ref, act)) == [
+        ("1", "unchanged"),
+        ("2", "unchanged"),
+        ("act 3", "added"),
+        ("3->4", "unchanged"),
+        ("4->5", "unchanged"),
+    ]
+
+
+def test_removed_page_is_reported_once():
+    ref = ["p1", "gone", "p3"]
+    act = ["p1", "p3"]
+    assert _summary(align_pages(ref, act)) == [("1", "unchanged"), ("ref 2", "removed"), ("3->2", "unchanged")]
+
+
+def test_changed_page_carries_line_diff():
+    pairs = align_pages(["fee is 100\nterm 12 months"], ["fee is 200\nterm 12 months"])
+    assert _summary(pairs) == [("1", "changed")]
+    assert "-fee is 100" in pairs[0].diff and "+fee is 200" in pairs[0].diff
+
+
+def test_labels_are_unique_when_removed_and_added_pages_share_a_number():
+    pairs = align_pages(["P", "X", "A"], ["A", "Q"])
+    labels = [p.label for p in pairs]
+    assert len(labels) == len(set(labels))
+    assert {"ref 2", "act 2"} <= set(labels)
+
+
+def test_line_diff_is_truncated():
+    diff = line_diff("", "\n".join(f"line {i}" for i in range(1000)), max_chars=100)
+    assert diff.endswith("(diff truncated)") and len(diff) < 150
@@ -0,0 +1,73 @@
+# tests/test_question_rewrite.py
+
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from src.document_chat import retrieval
+from src.document_chat.retrieval import ConversationalRAG, needs_rewrite
+from utlis.lru_cache import LRUCache
+
+HISTORY = [HumanMessage(content="Summarise the lease"), AIMessage(content="It runs five years.")]
+
+
+@pytest.mark.parametrize("question", [
+    "What does the lease say about the security deposit amount?",
+    "Which clause limits liability for the landlord?",
+])
+def test_standalone_questions_skip_the_rewrite(question):
+    assert not needs_rewrite(question, HISTORY)
+
+
+@pytest.mark.parametrize("question", [
+    "Why?",
+    "And the rent?",
+    "What does it say about the security deposit amount?",
+    "Is that clause enforceable in every state?",
+    "How about the previous tenant's obligations here?",
+])
+def test_follow_ups_are_rewritten(question):
+    assert needs_rewrite(question, HISTORY)
+
+
+def test_no_history_means_nothing_to_rewrite():
+    assert not needs_rewrite("Why?", [])
+    assert not needs_rewrite("Why?", None)
+
+
+@pytest.fixture
+def rag(monkeypatch):
+    monkeypatch.setattr(retrieval, "REWRITE_CACHE", LRUCache(max_entries=8))
+    rag = ConversationalRAG.__new__(ConversationalRAG)
+    rag.calls = []
+
+    def rewrite(payload):
+        rag.calls.append(payload["input"])
+        return f"{payload['input']} (about the lease)"
+
+    rag.question_rewriter = RunnableLambda(rewrite)
+    return rag
+
+
+def test_rewrite_is_cached_per_history_and_question(rag):
+    payload = {"input": "Why?", "chat_history": HISTORY}
+    assert rag._contextualize(payload) == "Why? (about the lease)"
+    assert rag._contextualize(dict(payload)) == "Why? (about the lease)"
+    assert rag.calls == ["Why?"]
+
+    rag._contextualize({"input": "Why?", "chat_history": HISTORY + [HumanMessage(content="And the rent?")]})
+    rag._contextualize({"input": "How?", "chat_history": HISTORY})
+    assert rag.calls == ["Why?", "Why?", "How?"]
+
+
+def test_standalone_question_never_reaches_the_rewriter(rag):
+    question = "What does the lease say about the security deposit amount?"
+    assert rag._contextualize({"input": question, "chat_history": HISTORY}) == question
+    assert rag.calls == []
+
+
+def test_async_rewrite_shares_the_cache(rag):
+    payload = {"input": "Why?", "chat_history": HISTORY}
+    assert asyncio.run(rag._acontextualize(payload)) == "Why? (about the lease)"
+    assert rag._contextualize(payload) == "Why? (about the lease)"
+    assert rag.calls == ["Why?"]
@@ -0,0 +1,46 @@
+# tests/test_structured_output.py
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from utlis.structured_output import RobustJsonOutputParser, repair_json_text
+
+REPAIR_CASES = [
+    ("plain", '{"a": 1}', '{"a": 1}'),
+    ("closed think", '<think>draft {"x": 0}</think>{"a": 1}', '{"a": 1}'),
+    ("unclosed think", '<think>reasoning that never ends\n{"a": 1}', '{"a": 1}'),
+    ("json fence", 'Here you go:\n```json\n{"a": 1}\n```', '{"a": 1}'),
+    ("bare fence", '```\n[1, 2]\n```', '[1, 2]'),
+    ("prose around payload", 'Sure! {"a": [1, 2]} Hope this helps.', '{"a": [1, 2]}'),
+    ("trailing comma in object", '{"a": 1, "b": 2,}', '{"a": 1, "b": 2}'),
+    ("trailing comma in nested list", '{"a": [1, 2, ],\n}', '{"a": [1, 2 ]\n}'),
+    ("comma-brace inside string", '{"a": "x,}", "b": "y,]",}', '{"a": "x,}", "b": "y,]"}'),
+    ("escaped quote in string", '{"a": "say \\",}\\"",}', '{"a": "say \\",}\\""}'),
+]
+
+
+@pytest.mark.parametrize("name, text, expected", REPAIR_CASES, ids=[c[0] for c in REPAIR_CASES])
+def test_repair_json_text(name, text, expected):
+    assert repair_json_text(text) == expected
+
+
+PARSE_CASES = [
+    ("direct object", '{"a": 1}', False, {"a": 1}),
+    ("repaired fence and comma", '```json\n{"a": "1,}",}\n```', False, {"a": "1,}"}),
+    ("unclosed think list", '<think>page 1 changed, listing it\n[{"Page": "1", "change": "x"}]', True, [{"Page": "1", "change": "x"}]),
+    ("object around single list", '{"rows": [{"Page": "1", "change": "x"}]}', True, [{"Page": "1", "change": "x"}]),
+    ("single row object", '{"Page": "2", "change": "y"}', True, [{"Page": "2", "change": "y"}]),
+    ("object kept without expect_list", '{"rows": [1]}', False, {"rows": [1]}),
+]
+
+
+@pytest.mark.parametrize("name, text, expect_list, expected", PARSE_CASES, ids=[c[0] for c in PARSE_CASES])
+def test_robust_parser_local_stages(name, text, expect_list, expected):
+    parser = RobustJsonOutputParser(parser=JsonOutputParser(), expect_list=expect_list)
+    assert parser.parse(text) == expected
+
+
+def test_robust_parser_without_llm_raises_on_unrecoverable_output():
+    parser = RobustJsonOutputParser(parser=JsonOutputParser())
+    with pytest.raises(OutputParserException):
+        parser.parse("no json here at all")
@@ -0,0 +1,93 @@
+# tests/test_vectorstore_cache.py
+
+from utlis.vectorstore_cache import VectorStoreCache
+
+
+def test_attached_object_is_built_once_and_dropped_with_the_entry(tmp_path):
+    cache = VectorStoreCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return object()
+
+    assert cache.get_attached(tmp_path, "index", "bm25", build) is not None
+    assert len(builds) == 1  # nothing cached yet: built but not kept
+
+    cache.get_or_load(tmp_path, "index", lambda: "vectorstore")
+    first = cache.get_attached(tmp_path, "index", "bm25", build)
+    assert cache.get_attached(tmp_path, "index", "bm25", build) is first
+    assert len(builds) == 2
+
+    cache.invalidate(tmp_path)
+    cache.get_or_load(tmp_path, "index", lambda: "vectorstore")
+    assert cache.get_attached(tmp_path, "index", "bm25", build) is not first
+    assert len(builds) == 3
+
+
+def _write_index(index_dir, faiss_bytes=100, name="index"):
+    index_dir.mkdir(parents=True, exist_ok=True)
+    (index_dir / f"{name}.faiss").write_bytes(b"f" * faiss_bytes)
+    (index_dir / f"{name}.manifest.json").write_text('{"version": 1}', encoding="utf-8")
+    return index_dir
+
+
+def _loader(loads):
+    def load():
+        loads.append(1)
+        return object()
+    return load
+
+
+def test_hit_returns_the_same_object(tmp_path):
+    cache, loads = VectorStoreCache(), []
+    index_dir = _write_index(tmp_path / "s1")
+    first = cache.get_or_load(index_dir, "index", _loader(loads))
+    assert cache.get_or_load(index_dir, "index", _loader(loads)) is first
+    assert len(loads) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_changed_index_files_are_reloaded(tmp_path):
+    cache, loads = VectorStoreCache(), []
+    index_dir = _write_index(tmp_path / "s1")
+    first = cache.get_or_load(index_dir, "index", _loader(loads))
+
+    (index_dir / "index.faiss").write_bytes(b"f" * 150)
+    second = cache.get_or_load(index_dir, "index", _loader(loads))
+    assert second is not first
+
+    (index_dir / "index.manifest.json").write_text('{"version": 2, "segments": []}', encoding="utf-8")
+    assert cache.get_or_load(index_dir, "index", _loader(loads)) is not second
+    assert len(loads) == 3 and cache.stats()["entries"] == 1
+
+
+def test_eviction_honours_the_entry_limit(tmp_path):
+    cache, loads = VectorStoreCache(max_entries=2), []
+    dirs = [_write_index(tmp_path / f"s{i}") for i in range(3)]
+    cache.get_or_load(dirs[0], "index", _loader(loads))
+    cache.get_or_load(dirs[1], "index", _loader(loads))
+    cache.get_or_load(dirs[0], "index", _loader(loads))  # s0 is now the most recent
+    cache.get_or_load(dirs[2], "index", _loader(loads))
+
+    assert cache.stats()["entries"] == 2 and cache.evictions == 1
+    cache.get_or_load(dirs[0], "index", _loader(loads))
+    assert len(loads) == 3  # s0 survived, s1 was evicted
+    cache.get_or_load(dirs[1], "index", _loader(loads))
+    assert len(loads) == 4
+
+
+def test_eviction_honours_the_byte_limit(tmp_path):
+    small = _write_index(tmp_path / "small", faiss_bytes=100)
+    entry_bytes = sum(size for _, size in VectorStoreCache._signature(small, "index"))
+    cache, loads = VectorStoreCache(max_bytes=2 * entry_bytes), []
+
+    cache.get_or_load(small, "index", _loader(loads))
+    cache.get_or_load(_write_index(tmp_path / "other", faiss_bytes=100), "index", _loader(loads))
+    assert cache.stats()["bytes"] == 2 * entry_bytes and cache.evictions == 0
+
+    big = _write_index(tmp_path / "big", faiss_bytes=5 * entry_bytes)
+    cache.get_or_load(big, "index", _loader(loads))
+    stats = cache.stats()
+    assert stats["entries"] == 1 and cache.evictions == 2  # the newest entry is kept even over budget
+    assert stats["bytes"] > 2 * entry_bytes
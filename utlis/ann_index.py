@@ -0,0 +1,176 @@
+from __future__ import annotations
+import copy
+import math
+from typing import Any, Dict, List, Optional
+import numpy as np
+import faiss  # type: ignore
+from langchain_community.docstore.in_memory import InMemoryDocstore  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+from langchain_core.embeddings import Embeddings  # type: ignore
+from logger import GLOBAL_LOGGER as log
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_pq")
+
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "type": "flat",
+    "hnsw": {"m": 32, "ef_construction": 200, "ef_search": 64},
+    "ivf_pq": {"nlist": 1024, "pq_m": 16, "pq_bits": 8, "nprobe": 16, "min_train_vectors": 10000},
+}
+
+
+def index_settings(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Merge the `vector_index` block of config.yaml over the defaults.
+    """
+    raw = (config or {}).get("vector_index") or {}
+    settings = {
+        "type": str(raw.get("type", DEFAULT_SETTINGS["type"])).lower(),
+        "hnsw": {**DEFAULT_SETTINGS["hnsw"], **(raw.get("hnsw") or {})},
+        "ivf_pq": {**DEFAULT_SETTINGS["ivf_pq"], **(raw.get("ivf_pq") or {})},
+    }
+    if settings["type"] not in INDEX_TYPES:
+        raise ValueError(f"Unsupported vector_index type '{settings['type']}', expected one of {INDEX_TYPES}")
+    return settings
+
+
+def search_params(settings: Dict[str, Any]) -> Dict[str, int]:
+    """Default query-time knobs for the configured index type."""
+    return {"nprobe": settings["ivf_pq"]["nprobe"], "ef_search": settings["hnsw"]["ef_search"]}
+
+
+def effective_type(settings: Dict[str, Any], dim: int, n_vectors: int) -> str:
+    """
+    The index type to build for n_vectors: IVF-PQ falls back to flat until there is
+    enough data to train its coarse quantizer and codebooks (or if pq_m does not
+    divide the embedding dimension).
+    """
+    kind = settings["type"]
+    if kind == "ivf_pq":
+        ivf = settings["ivf_pq"]
+        if dim % int(ivf["pq_m"]) or n_vectors < int(ivf["min_train_vectors"]):
+            return "flat"
+    return kind
+
+
+def factory_string(kind: str, settings: Dict[str, Any], dim: int, n_vectors: int) -> str:
+    if kind == "hnsw":
+        return f"HNSW{int(settings['hnsw']['m'])}"
+    if kind == "ivf_pq":
+        ivf = settings["ivf_pq"]
+        # ~4*sqrt(N) lists keeps every list large enough to train and to probe
+        nlist = max(1, min(int(ivf["nlist"]), int(4 * math.sqrt(n_vectors))))
+        return f"IVF{nlist},PQ{int(ivf['pq_m'])}x{int(ivf['pq_bits'])}"
+    return "Flat"
+
+
+def build_index(vectors: np.ndarray, settings: Dict[str, Any], add: bool = True) -> faiss.Index:
+    """
+    Create and train (when the type needs it) a FAISS index on vectors, then add them
+    in order unless add is False.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    kind = effective_type(settings, dim, n)
+    spec = factory_string(kind, settings, dim, n)
+    index = faiss.index_factory(dim, spec, faiss.METRIC_L2)  # LangChain FAISS scores by L2
+    if kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efConstruction = int(settings["hnsw"]["ef_construction"])
+    if not index.is_trained:
+        index.train(vectors)
+    if add and n:
+        index.add(vectors)
+    set_search_params(index, **search_params(settings))
+    log.info("FAISS index built", factory=spec, vectors=n, dim=dim)
+    return index
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Apply query-time knobs to whichever of them the index supports (no-op for flat).
+    """
+    index = getattr(index, "base", index)  # SegmentedIndex: tune the ANN base
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        faiss.extract_index_ivf(index).nprobe = int(nprobe)
+    if ef_search is not None:
+        inner = faiss.downcast_index(index)
+        if hasattr(inner, "hnsw"):
+            inner.hnsw.efSearch = int(ef_search)
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Per-call SearchParameters for the knob the index supports, or None (flat, or no knob given).
+    """
+    index = getattr(index, "base", index)
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if ef_search is not None and hasattr(faiss.downcast_index(index), "hnsw"):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+
+class TunedIndex:
+    """
+    Per-request view of a shared index: every search passes its own SearchParameters,
+    so one caller's nprobe/efSearch never changes the index other requests search.
+    Everything else is delegated to the wrapped index.
+    """
+
+    def __init__(self, index: Any, params: faiss.SearchParameters):
+        self.index = index
+        self.params = params
+
+    def search(self, x: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None):
+        return self.index.search(x, k, params=params or self.params)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.index, name)
+
+
+def with_search_params(vs: FAISS, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> FAISS:
+    """
+    Shallow copy of vs whose index searches with the given knobs; the docstore and
+    the (possibly cached, shared) index itself are not modified.
+    """
+    params = search_parameters(vs.index, nprobe=nprobe, ef_search=ef_search)
+    if params is None:
+        return vs
+    tuned = copy.copy(vs)
+    tuned.index = TunedIndex(vs.index, params)
+    return tuned
+
+
+def is_flat(index: faiss.Index) -> bool:
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def needs_rebuild(index: faiss.Index, settings: Dict[str, Any]) -> bool:
+    """True when a flat index has grown enough to become the configured ANN type."""
+    return is_flat(index) and effective_type(settings, index.d, index.ntotal) != "flat"
+
+
+def rebuild(vs: FAISS, settings: Dict[str, Any]) -> FAISS:
+    """
+    Re-index a flat vectorstore's vectors into the configured ANN type. Vectors are
+    re-added in their original order, so the docstore id mapping stays valid.
+    """
+    vectors = vs.index.reconstruct_n(0, vs.index.ntotal)
+    vs.index = build_index(vectors, settings)
+    return vs
+
+
+def build_vectorstore(
+    texts: List[str],
+    embeddings: Embeddings,
+    settings: Dict[str, Any],
+    metadatas: Optional[List[dict]] = None,
+) -> FAISS:
+    """
+    FAISS.from_texts equivalent that builds the configured index type; the index is
+    trained on this first batch of vectors.
+    """
+    vectors = embeddings.embed_documents(texts)
+    index = build_index(np.asarray(vectors, dtype="float32"), settings, add=False)
+    vs = FAISS(embedding_function=embeddings, index=index, docstore=InMemoryDocstore(), index_to_docstore_id={})
+    vs.add_embeddings(text_embeddings=list(zip(texts, vectors)), metadatas=metadatas)
+    return vs
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from logger import GLOBAL_LOGGER as log
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of RAG answers, looked up by question-embedding similarity.
+
+    Entries are bucketed per index directory and retrieval key (a fingerprint of k,
+    search type and retrieval stages, so answers built from a different context are
+    never shared) and stamped with the index version they were answered against; a lookup only matches entries of the current version whose
+    question embedding has cosine similarity >= threshold with the new question.
+    Eviction is TTL plus a global LRU bound. FaissManager invalidates an index's bucket
+    whenever it adds documents; the version stamp covers writes made by other workers.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600, threshold: float = 0.95, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+        self._order: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(index_dir: str | Path, retrieval_key: str = "") -> str:
+        return f"{Path(index_dir).resolve()}::{retrieval_key}"
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(
+        self, index_dir: str | Path, version: str, query_vector: List[float], retrieval_key: str = ""
+    ) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = self._key(index_dir, retrieval_key)
+        query = self._unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key) or OrderedDict()
+            for entry_id in [i for i, e in bucket.items() if e["version"] != version or now - e["created"] > self.ttl_seconds]:
+                self._drop(key, entry_id)
+            bucket = self._buckets.get(key)
+            if bucket:
+                ids = list(bucket.keys())
+                sims = np.vstack([bucket[i]["vector"] for i in ids]) @ query
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._order.move_to_end((key, ids[best]))
+                    self.hits += 1
+                    log.info("Answer cache hit", index_dir=str(index_dir), similarity=round(float(sims[best]), 4))
+                    return bucket[ids[best]]["answer"]
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        index_dir: str | Path,
+        version: str,
+        question: str,
+        query_vector: List[float],
+        answer: str,
+        retrieval_key: str = "",
+    ):
+        if not self.enabled or not answer:
+            return
+        key = self._key(index_dir, retrieval_key)
+        entry_id = uuid.uuid4().hex
+        with self._lock:
+            self._buckets.setdefault(key, OrderedDict())[entry_id] = {
+                "question": question,
+                "vector": self._unit(query_vector),
+                "answer": answer,
+                "version": version,
+                "created": time.monotonic(),
+            }
+            self._order[(key, entry_id)] = None
+            while len(self._order) > self.max_entries:
+                old_key, old_id = next(iter(self._order))
+                self._drop(old_key, old_id)
+                self.evictions += 1
+
+    def invalidate(self, index_dir: str | Path):
+        """Drop every bucket of index_dir, whatever its retrieval key."""
+        prefix = self._key(index_dir)
+        with self._lock:
+            for key in [k for k in self._buckets if k.startswith(prefix)]:
+                for entry_id in list(self._buckets[key]):
+                    self._drop(key, entry_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._order),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # ---------- Internals (caller holds the lock) ----------
+
+    def _drop(self, key: str, entry_id: str):
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(entry_id, None)
+            if not bucket:
+                del self._buckets[key]
+        self._order.pop((key, entry_id), None)
+
+
+ANSWER_CACHE = SemanticAnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    enabled=os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
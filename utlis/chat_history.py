@@ -0,0 +1,238 @@
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+from langchain_core.chat_history import BaseChatMessageHistory  # type: ignore
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage  # type: ignore
+from langchain_core.output_parsers import StrOutputParser  # type: ignore
+from prompt.prompt_library import PROMPT_REGISTRY
+from model.models import PromptType
+from logger import GLOBAL_LOGGER as log
+from utlis.lru_cache import LRUCache
+
+CHAT_HISTORY_MAX_SESSIONS = int(os.getenv("CHAT_HISTORY_MAX_SESSIONS", "1000"))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "200"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+
+_ROLES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+# (previous summary, messages falling out of the window) -> new summary
+Summarizer = Callable[[str, List[BaseMessage]], str]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    # ~4 characters per token for English text, plus per-message overhead
+    return len(str(message.content)) // 4 + 4
+
+
+class ChatHistoryStore:
+    """
+    Per-session chat history: an in-memory LRU of recent sessions in front of SQLite.
+
+    Every append is written through to SQLite, so a session evicted from memory (or
+    served by another worker) is reloaded from disk. Each session keeps at most
+    max_messages on disk. window() returns the newest messages that fit a token
+    budget, prefixed with the session's rolling summary of older turns when one
+    exists (see summarize()).
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        max_sessions: int = CHAT_HISTORY_MAX_SESSIONS,
+        max_messages: int = CHAT_HISTORY_MAX_MESSAGES,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_messages = max_messages
+        self._memory = LRUCache(max_entries=max_sessions)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,"
+            " role TEXT NOT NULL, content TEXT NOT NULL, created_at TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);"
+            "CREATE TABLE IF NOT EXISTS summaries (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL,"
+            " upto_id INTEGER NOT NULL, updated_at TEXT);"
+        )
+        self._conn.commit()
+
+    # ---------- Reads ----------
+
+    def _load(self, session_id: str) -> List[tuple]:
+        """[(row id, message)] for the session, oldest first."""
+        cached = self._memory.get(session_id)
+        if cached is not None:
+            # Another worker may have appended since: compare against the newest row id
+            with self._lock:
+                newest = self._conn.execute(
+                    "SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+            if newest == (cached[-1][0] if cached else None):
+                return cached
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, self.max_messages),
+            ).fetchall()
+        messages = [(row_id, _ROLES.get(role, HumanMessage)(content=content)) for row_id, role, content in reversed(rows)]
+        self._memory.put(session_id, messages)
+        return messages
+
+    def messages(self, session_id: str) -> List[BaseMessage]:
+        return [m for _, m in self._load(session_id)]
+
+    def summary(self, session_id: str) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT summary, upto_id FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+
+    def window(self, session_id: str, max_tokens: int = CHAT_HISTORY_TOKEN_BUDGET) -> List[BaseMessage]:
+        """
+        Newest messages within max_tokens (whole messages, in order), preceded by the
+        summary of older turns if the session has one.
+        """
+        entries = self._load(session_id)
+        summary = self.summary(session_id)
+        budget = max_tokens
+        prefix: List[BaseMessage] = []
+        if summary:
+            prefix = [SystemMessage(content=f"Summary of the earlier conversation: {summary[0]}")]
+            budget -= estimate_tokens(prefix[0])
+            entries = [(row_id, m) for row_id, m in entries if row_id > summary[1]]
+
+        kept: List[BaseMessage] = []
+        for _, message in reversed(entries):
+            cost = estimate_tokens(message)
+            if cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        if len(kept) < len(entries):
+            # Start the truncated window on a user turn, not half an exchange
+            while kept and kept[-1].type == "ai":
+                kept.pop()
+        return prefix + list(reversed(kept))
+
+    # ---------- Writes ----------
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]):
+        if not messages:
+            return
+        now = _now()
+        with self._lock:
+            with self._conn:
+                previous = self._conn.execute(
+                    "SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                ids = []
+                for m in messages:
+                    cur = self._conn.execute(
+                        "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                        (session_id, m.type, str(m.content), now),
+                    )
+                    ids.append(cur.lastrowid)
+                # Bound what is kept on disk per session
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id NOT IN"
+                    " (SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                    (session_id, session_id, self.max_messages),
+                )
+        cached = self._memory.get(session_id)
+        if cached is not None:
+            if (cached[-1][0] if cached else None) == previous:
+                self._memory.put(session_id, (cached + list(zip(ids, messages)))[-self.max_messages:])
+            else:
+                self._memory.pop(session_id)  # stale: reload from disk on next read
+
+    def clear(self, session_id: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+        self._memory.pop(session_id)
+
+    def summarize(self, session_id: str, summarizer: Summarizer, max_tokens: int = CHAT_HISTORY_TOKEN_BUDGET) -> bool:
+        """
+        Fold the messages that no longer fit the token window into the session's
+        rolling summary. Returns True if the summary changed.
+        """
+        entries = self._load(session_id)
+        summary = self.summary(session_id)
+        previous, upto = (summary[0], summary[1]) if summary else ("", 0)
+        pending = [(row_id, m) for row_id, m in entries if row_id > upto]
+
+        budget, keep_from = max_tokens, len(pending)
+        for i in range(len(pending) - 1, -1, -1):
+            budget -= estimate_tokens(pending[i][1])
+            if budget < 0:
+                break
+            keep_from = i
+        overflow = pending[:keep_from]
+        if not overflow:
+            return False
+
+        new_summary = summarizer(previous, [m for _, m in overflow])
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO summaries (session_id, summary, upto_id, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary,"
+                    " upto_id = excluded.upto_id, updated_at = excluded.updated_at",
+                    (session_id, new_summary, overflow[-1][0], _now()),
+                )
+        log.info("Chat history summarized", session_id=session_id, folded=len(overflow))
+        return True
+
+    def stats(self):
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(DISTINCT session_id) FROM messages").fetchone()[0]
+        return {"sessions_on_disk": sessions, "memory": self._memory.stats()}
+
+
+def llm_summarizer(llm) -> Summarizer:
+    """Summarizer backed by the chat_history_summary prompt and the given chat model."""
+    chain = PROMPT_REGISTRY[PromptType.CHAT_HISTORY_SUMMARY.value] | llm | StrOutputParser()
+    return lambda summary, messages: chain.invoke({"summary": summary or "(none)", "messages": messages})
+
+
+class StoreBackedChatMessageHistory(BaseChatMessageHistory):
+    """LangChain BaseChatMessageHistory view of one session in a ChatHistoryStore."""
+
+    def __init__(self, store: ChatHistoryStore, session_id: str, max_tokens: int = CHAT_HISTORY_TOKEN_BUDGET):
+        self.store = store
+        self.session_id = session_id
+        self.max_tokens = max_tokens
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        return self.store.window(self.session_id, self.max_tokens)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.append(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+
+_STORE: Optional[ChatHistoryStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_chat_history_store() -> ChatHistoryStore:
+    """Process-wide history store; path from CHAT_HISTORY_DB_PATH."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ChatHistoryStore(os.getenv("CHAT_HISTORY_DB_PATH", os.path.join("data", "chat_history.sqlite")))
+        return _STORE
@@ -0,0 +1,26 @@
+from __future__ import annotations
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Bounded pool for blocking disk/CPU work (PDF parsing, file writes, FAISS loads) so
+# async route handlers never run it on the event loop thread.
+BLOCKING_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BLOCKING_POOL_WORKERS", "8")),
+    thread_name_prefix="doc-portal-blocking",
+)
+
+
+def shutdown_blocking_pool():
+    """Stop BLOCKING_POOL at application shutdown; queued work that has not started is dropped."""
+    BLOCKING_POOL.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable on BLOCKING_POOL and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BLOCKING_POOL, functools.partial(func, *args, **kwargs))
@@ -3,9 +3,11 @@ from pathlib import Path
 from typing import Iterable, List
 from fastapi import UploadFile #type:ignore
 from langchain.schema import Document #type:ignore
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader #type:ignore
+from langchain_community.document_loaders import Docx2txtLoader, TextLoader #type:ignore
 from logger import custom_logger
 from exception.custom_exception import DocumentPortalException
+from utlis.document_parser import DOCUMENT_PARSER
+from utlis.file_io import sha256_file
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 #log = custom_logger.get_logger(__name__)
@@ -17,7 +19,8 @@ def load_documents(paths: Iterable[Path]) -> List[Document]:
         for p in paths:
             ext = p.suffix.lower()
             if ext == ".pdf":
-                loader = PyPDFLoader(str(p))
+                docs.extend(DOCUMENT_PARSER.load(p))
+                continue
             elif ext == ".docx":
                 loader = Docx2txtLoader(str(p))
             elif ext == ".txt":
@@ -25,7 +28,11 @@ def load_documents(paths: Iterable[Path]) -> List[Document]:
             else:
                 print("""log.warning("Unsupported extension skipped", path=str(p))""")
                 continue
-            docs.extend(loader.load())
+            loaded = loader.load()
+            digest = sha256_file(p)
+            for d in loaded:
+                d.metadata.setdefault("doc_sha256", digest)
+            docs.extend(loaded)
         print("""log.info("Documents loaded", count=len(docs))""")
         return docs
     except Exception as e:
@@ -50,6 +57,14 @@ class FastAPIFileAdapter:
     def __init__(self, uf: UploadFile):
         self._uf = uf
         self.name = uf.filename
+        self.size = uf.size
+        self._started = False
+    def read(self, size: int = -1) -> bytes:
+        # Streamed reads from the spooled upload; rewinds once so reads start at byte 0
+        if not self._started:
+            self._uf.file.seek(0)
+            self._started = True
+        return self._uf.file.read(size)
     def getbuffer(self) -> bytes:
         self._uf.file.seek(0)
         return self._uf.file.read()
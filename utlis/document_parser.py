@@ -0,0 +1,83 @@
+from __future__ import annotations
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from langchain.schema import Document #type:ignore
+from logger import GLOBAL_LOGGER as log
+from utlis.file_io import sha256_file
+from utlis.pdf_extractor import extract_pages
+
+
+class DocumentParser:
+    """
+    Single PDF parsing backend (PyMuPDF via the parallel page extractor) with a
+    content-addressed on-disk cache of page text, keyed by the file's sha256.
+
+    Analysis, comparison and chat ingestion all parse through this, so the same file
+    yields the same page text everywhere and is only parsed once.
+    """
+
+    def __init__(self, cache_dir: Optional[str | Path] = None):
+        self.cache_dir = Path(cache_dir or os.getenv("PARSED_PAGE_CACHE_DIR", os.path.join("cache", "parsed_pages")))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_path(self, digest: str) -> Path:
+        return self.cache_dir / digest[:2] / f"{digest}.json"
+
+    def parse_pages(self, pdf_path: str | Path, digest: Optional[str] = None) -> List[str]:
+        """
+        Return the text of every page, served from the cache when this content was seen before.
+        """
+        digest = digest or sha256_file(Path(pdf_path))
+        cache_path = self._cache_path(digest)
+        try:
+            pages = json.loads(cache_path.read_text(encoding="utf-8"))["pages"]
+            with self._lock:
+                self.hits += 1
+            log.info("Parsed pages served from cache", pdf_path=str(pdf_path), sha256=digest, pages=len(pages))
+            return pages
+        except (OSError, ValueError, KeyError):
+            pass
+
+        pages = extract_pages(pdf_path)
+        with self._lock:
+            self.misses += 1
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"pages": pages}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, cache_path)  # atomic: concurrent readers never see a partial file
+        except OSError as e:
+            log.warning("Could not write parsed page cache", sha256=digest, error=str(e))
+        return pages
+
+    def load(self, pdf_path: str | Path) -> List[Document]:
+        """
+        One LangChain Document per page, with 0-based 'page' metadata like PyPDFLoader.
+        """
+        digest = sha256_file(Path(pdf_path))
+        pages = self.parse_pages(pdf_path, digest=digest)
+        return [
+            Document(
+                page_content=text,
+                metadata={"source": str(pdf_path), "page": i, "total_pages": len(pages), "doc_sha256": digest},
+            )
+            for i, text in enumerate(pages)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache_dir": str(self.cache_dir),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+DOCUMENT_PARSER = DocumentParser()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings #type:ignore
+from logger import GLOBAL_LOGGER as log
+from utlis.lru_cache import LRUCache
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "500000"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+
+class EmbeddingStore:
+    """
+    On-disk SQLite store of chunk embeddings keyed by sha256(model name + chunk text).
+
+    Vectors are stored as packed float32 blobs. A single connection is shared across
+    threads and guarded by a lock; WAL mode keeps readers in other workers unblocked.
+    Beyond max_rows vectors or max_bytes of blobs the least recently used rows are
+    evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+        max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL DEFAULT 0)"
+        )
+        # Stores created before eviction existed have no last_used column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "last_used" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite caps bound parameters per statement, so look up in slices
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+            if found:
+                with self._conn:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                    )
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, model_name: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, model_name, len(v), array("f", v).tobytes(), now) for k, v in items.items()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._evict()
+
+    def _evict(self):
+        # Caller holds the lock inside a transaction
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        if count <= self.max_rows and total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used ASC"):
+            if count <= self.max_rows and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        log.info("Embedding cache evicted entries", evicted=len(doomed), entries=count, bytes=total)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+            return {
+                "path": str(self.db_path),
+                "entries": count,
+                "bytes": total,
+                "max_entries": self.max_rows,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document embeddings from an EmbeddingStore and only
+    sends cache misses to the underlying provider. Query embeddings are kept apart
+    (providers such as Google embed queries and documents with different task types) in
+    a small in-process LRU, so the retriever, re-ranking stages and the answer cache can
+    all embed the same question for one API call.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, store: Optional[EmbeddingStore] = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store or get_embedding_store()
+        self._queries = LRUCache(max_entries=QUERY_EMBEDDING_CACHE_SIZE)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingStore.make_key(self.model_name, t) for t in texts]
+        cached = self.store.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.store.put_many(self.model_name, fresh)
+            cached.update(fresh)
+
+        log.info("Embeddings resolved", total=len(texts), cached=len(texts) - len(missing), embedded=len(missing))
+        return [cached[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._queries.get(text)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._queries.put(text, vector)
+        return list(vector)
+
+
+_STORE: Optional[EmbeddingStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """Return the process-wide embedding store, opening it on first use."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = EmbeddingStore(os.getenv("EMBEDDING_CACHE_PATH", os.path.join("cache", "embeddings.sqlite")))
+        return _STORE
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings #type:ignore
+from logger import GLOBAL_LOGGER as log
+
+RATE_LIMIT_MARKERS = ("429", "rate limit", "ratelimit", "resource exhausted", "resourceexhausted", "quota", "too many requests")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available, so callers
+    sharing a bucket are collectively held to `rate` requests per second.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider: str, requests_per_minute: float) -> TokenBucket:
+    """Return the process-wide bucket for a provider, creating it on first use."""
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(provider)
+        if bucket is None or bucket.rate != requests_per_minute / 60.0:
+            bucket = TokenBucket(rate=requests_per_minute / 60.0)
+            _BUCKETS[provider] = bucket
+        return bucket
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    for attr in ("status_code", "code"):
+        if getattr(error, attr, None) == 429:
+            return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that splits documents into fixed-size batches and embeds them on a
+    bounded thread pool. Every provider call goes through the provider's token bucket and
+    is retried with jittered exponential backoff when the provider reports a rate limit.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        provider: str,
+        batch_size: int = 100,
+        max_workers: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        requests_per_minute: float = 1500,
+    ):
+        self.underlying = underlying
+        self.provider = provider
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = get_rate_limiter(provider, requests_per_minute)
+
+    @classmethod
+    def from_config(cls, underlying: Embeddings, provider: str, config: Dict[str, Any]) -> "BatchedEmbeddings":
+        return cls(underlying, provider, **(config or {}))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        started = time.perf_counter()
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        log.info(
+            "Embedding batches completed",
+            provider=self.provider,
+            texts=len(texts),
+            batches=len(batches),
+            seconds=round(time.perf_counter() - started, 3),
+        )
+        return [vec for batch in results for vec in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(self.underlying.embed_query, text)
+
+    # ---------- Internals ----------
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        return self._call(self.underlying.embed_documents, batch)
+
+    def _call(self, fn, arg):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                return fn(arg)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limited(e):
+                    raise
+                # Full jitter keeps concurrent batches from retrying in lock-step
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                log.warning("Embedding rate limited, backing off", provider=self.provider, attempt=attempt, delay=round(delay, 2))
+                time.sleep(delay)
@@ -0,0 +1,367 @@
+from __future__ import annotations
+import os
+import json
+import contextlib
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import faiss  # type: ignore
+from langchain_core.documents import Document #type:ignore
+from langchain_community.vectorstores import FAISS #type:ignore
+from langchain_core.embeddings import Embeddings #type:ignore
+from logger import GLOBAL_LOGGER as log
+from utlis.ann_index import set_search_params
+from utlis.sqlite_docstore import LazyIndexToDocstoreId, SqliteDocstore, write_docstore
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # pragma: no cover - non-POSIX dev machines
+    fcntl = None
+
+FAISS_COMPACT_MIN_VECTORS = int(os.getenv("FAISS_COMPACT_MIN_VECTORS", "1000"))
+FAISS_COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.25"))
+# Query workers load indexes memory-mapped with a lazily read docstore
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() in ("1", "true", "yes")
+
+
+def mmap_read_index(path: str | Path) -> Tuple[faiss.Index, str]:
+    """
+    Read an index memory-mapped; returns (index, name of the flag used).
+
+    IO_FLAG_MMAP_IFC also maps the code arrays of IndexFlatCodes (flat indexes and
+    HNSW storage), which plain IO_FLAG_MMAP copies to the heap; IO_FLAG_MMAP is the
+    fallback for builds or index types that reject it (it maps IVF inverted lists).
+    """
+    last_error: Optional[Exception] = None
+    for name in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP"):
+        flag = getattr(faiss, name, None)
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY), name
+        except RuntimeError as e:
+            last_error = e
+    raise last_error or RuntimeError("faiss has no memory-mapped read flags")
+
+
+class SegmentedIndex:
+    """
+    Read-only view of a memory-mapped base index plus an in-memory flat index of the
+    segment vectors appended after it. Segment vectors take positions base.ntotal
+    onwards, matching the docstore order; results of both are merged by distance.
+    """
+
+    def __init__(self, base: faiss.Index, vectors: np.ndarray):
+        self.base = base
+        self.segment = faiss.IndexFlat(base.d, base.metric_type)
+        self.segment.add(np.ascontiguousarray(vectors, dtype="float32"))
+
+    @property
+    def d(self) -> int:
+        return self.base.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + self.segment.ntotal
+
+    @property
+    def metric_type(self) -> int:
+        return self.base.metric_type
+
+    def search(self, x: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None):
+        D, I = self.base.search(x, k, params=params)
+        D2, I2 = self.segment.search(x, k)
+        I2 = np.where(I2 >= 0, I2 + self.base.ntotal, -1)
+        D, I = np.hstack([D, D2]), np.hstack([I, I2])
+        # Empty slots carry +/-FLT_MAX, so they sort behind every real hit
+        order = np.argsort(D if self.metric_type == faiss.METRIC_L2 else -D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        if position >= self.base.ntotal:
+            return self.segment.reconstruct(position - self.base.ntotal)
+        return self.base.reconstruct(position)
+
+
+def _fsync_write(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class FaissStore:
+    """
+    Append-friendly persistence for a LangChain FAISS index.
+
+    Files in index_dir (for index_name "index"):
+      index.faiss / index.pkl   canonical FAISS files (the compacted base)
+      index.docstore.sqlite     the base docstore in a lazily readable form (read-only loads)
+      index.segment.vec         append-only float32 vectors added since the last compaction
+      index.segment.log         append-only JSON lines (docstore id, text, metadata), same order
+      index.manifest.json       committed extents of the segment files, replaced atomically
+
+    An add appends to the segment files, fsyncs, then commits the new extents in the
+    manifest; bytes past the committed extents (a torn write) are ignored on load and
+    truncated before the next append. Compaction rewrites the canonical files from
+    base + segment and is itself recoverable through the manifest's pending_swap flag.
+
+    load_readonly() serves query paths: the .faiss file is memory-mapped and documents
+    are read from the SQLite docstore on demand, so workers share the index through
+    the page cache instead of each unpickling a private copy. Records still in the
+    segment are layered on top in memory rather than forcing a full heap load.
+    """
+
+    def __init__(self, index_dir: str | Path, index_name: str = "index"):
+        self.index_dir = Path(index_dir)
+        self.index_name = index_name
+        self.faiss_path = self.index_dir / f"{index_name}.faiss"
+        self.pkl_path = self.index_dir / f"{index_name}.pkl"
+        self.docstore_path = self.index_dir / f"{index_name}.docstore.sqlite"
+        self.vec_path = self.index_dir / f"{index_name}.segment.vec"
+        self.log_path = self.index_dir / f"{index_name}.segment.log"
+        self.manifest_path = self.index_dir / f"{index_name}.manifest.json"
+        self.lock_path = self.index_dir / f"{index_name}.lock"
+        self.next_name = f"{index_name}.next"
+
+    # ---------- Manifest ----------
+
+    def _empty_manifest(self, base_ntotal: int = 0, generation: int = 0) -> Dict[str, Any]:
+        return {
+            "generation": generation,
+            "base_ntotal": base_ntotal,
+            "pending_swap": False,
+            "segment": {"count": 0, "dim": None, "vec_bytes": 0, "log_bytes": 0},
+        }
+
+    def read_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self._empty_manifest()
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        _fsync_write(self.manifest_path, json.dumps(manifest).encode("utf-8"))
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive cross-process lock for writers sharing one index directory."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    # ---------- Public API ----------
+
+    def version(self) -> str:
+        """Changes whenever the index content does: compaction generation + committed segment records."""
+        manifest = self.read_manifest()
+        return f"{manifest.get('generation', 0)}.{manifest['segment']['count']}"
+
+    def exists(self) -> bool:
+        return self.faiss_path.exists() and self.pkl_path.exists()
+
+    def write_base(self, vs: FAISS):
+        """Persist a freshly built index as the canonical files with an empty segment."""
+        with self._locked():
+            self._swap_in(vs, self.read_manifest().get("generation", 0) + 1)
+
+    def load(self, embeddings: Embeddings) -> FAISS:
+        """Load the canonical files and replay committed segment records on top."""
+        for _ in range(3):
+            manifest = self.read_manifest()
+            if manifest.get("pending_swap"):
+                with self._locked():
+                    manifest = self._recover()
+            try:
+                vs = FAISS.load_local(
+                    str(self.index_dir),
+                    embeddings,
+                    index_name=self.index_name,
+                    allow_dangerous_deserialization=True,  # ok if you trust the index
+                )
+                replayed = self._replay(vs, manifest["segment"])
+            except (OSError, ValueError, EOFError):
+                replayed = -1
+            # A compaction that ran while we were reading changes the generation: retry
+            if replayed >= 0 and self.read_manifest().get("generation") == manifest.get("generation"):
+                if replayed:
+                    log.info("FAISS segment replayed", index_dir=str(self.index_dir), records=replayed)
+                return vs
+        with self._locked():
+            return self._load_locked(embeddings)
+
+    def load_readonly(self, embeddings: Embeddings) -> FAISS:
+        """
+        Memory-mapped, read-only load of the compacted base, with any committed segment
+        records added on top in memory (SegmentedIndex). Falls back to load() during an
+        interrupted swap or when the base predates the SQLite docstore.
+        """
+        manifest = self.read_manifest()
+        if manifest.get("pending_swap") or not self.docstore_path.exists():
+            return self.load(embeddings)
+        try:
+            index, flag = mmap_read_index(self.faiss_path)
+            docstore = SqliteDocstore(self.docstore_path)
+            seg = manifest["segment"]
+            records, vectors = self._read_segment(seg) if seg["count"] else ([], None)
+        except (RuntimeError, OSError, ValueError) as e:
+            log.warning("Memory-mapped FAISS load failed, loading into memory", index_dir=str(self.index_dir), error=str(e))
+            return self.load(embeddings)
+        # A compaction that ran while we were reading changes the generation
+        if self.read_manifest().get("generation") != manifest.get("generation") or docstore.count() != index.ntotal:
+            docstore.close()
+            return self.load(embeddings)
+        if records:
+            docstore.extend(
+                [r["id"] for r in records],
+                [Document(page_content=r["text"], metadata=r["metadata"], id=r["id"]) for r in records],
+            )
+            index = SegmentedIndex(index, vectors)
+        log.info("FAISS index memory-mapped", index_dir=str(self.index_dir), flag=flag, segment_records=len(records))
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=LazyIndexToDocstoreId(docstore),
+        )
+
+    def append(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: List[List[float]]) -> Dict[str, Any]:
+        """Durably append records to the segment and commit them in the manifest."""
+        if not ids:
+            return self.read_manifest()
+        dim = len(vectors[0])
+        vec_blob = array("f", [x for v in vectors for x in v]).tobytes()
+        log_blob = "".join(
+            json.dumps({"id": i, "text": t, "metadata": m}, ensure_ascii=False, default=str) + "\n"
+            for i, t, m in zip(ids, texts, metadatas)
+        ).encode("utf-8")
+
+        with self._locked():
+            manifest = self.read_manifest()
+            if manifest.get("pending_swap"):
+                manifest = self._recover()
+            seg = manifest["segment"]
+            if seg["dim"] not in (None, dim):
+                raise ValueError(f"Embedding dimension changed: segment has {seg['dim']}, got {dim}")
+
+            for path, committed, blob in ((self.vec_path, seg["vec_bytes"], vec_blob), (self.log_path, seg["log_bytes"], log_blob)):
+                with open(path, "ab") as f:
+                    f.truncate(committed)  # drop any torn write past the committed extent
+                    f.write(blob)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            seg.update(
+                count=seg["count"] + len(ids),
+                dim=dim,
+                vec_bytes=seg["vec_bytes"] + len(vec_blob),
+                log_bytes=seg["log_bytes"] + len(log_blob),
+            )
+            self._write_manifest(manifest)
+        return manifest
+
+    def needs_compaction(self, manifest: Optional[Dict[str, Any]] = None) -> bool:
+        manifest = manifest or self.read_manifest()
+        count = manifest["segment"]["count"]
+        return count >= max(FAISS_COMPACT_MIN_VECTORS, FAISS_COMPACT_RATIO * manifest.get("base_ntotal", 0))
+
+    def compact(self, embeddings: Embeddings, transform: Optional[Callable[[FAISS], FAISS]] = None) -> FAISS:
+        """
+        Fold the segment into the canonical files (rebuilt from disk, not from a caller's
+        copy). transform, if given, may replace the index before it is written (re-indexing).
+        """
+        with self._locked():
+            vs = self._load_locked(embeddings)
+            if transform is not None:
+                vs = transform(vs)
+            self._swap_in(vs, self.read_manifest().get("generation", 0) + 1)
+        log.info("FAISS index compacted", index_dir=str(self.index_dir), ntotal=vs.index.ntotal)
+        return vs
+
+    # ---------- Internals (caller holds the lock where it matters) ----------
+
+    def _load_locked(self, embeddings: Embeddings) -> FAISS:
+        manifest = self._recover() if self.read_manifest().get("pending_swap") else self.read_manifest()
+        vs = FAISS.load_local(
+            str(self.index_dir), embeddings, index_name=self.index_name, allow_dangerous_deserialization=True
+        )
+        self._replay(vs, manifest["segment"])
+        return vs
+
+    def _read_segment(self, seg: Dict[str, Any]) -> Tuple[List[dict], np.ndarray]:
+        """Committed segment records and their vectors (count x dim float32)."""
+        with open(self.vec_path, "rb") as f:
+            raw = array("f")
+            raw.frombytes(f.read(seg["vec_bytes"]))
+        with open(self.log_path, "rb") as f:
+            records = [json.loads(line) for line in f.read(seg["log_bytes"]).decode("utf-8").splitlines() if line]
+        dim = seg["dim"]
+        if len(raw) != seg["count"] * dim or len(records) != seg["count"]:
+            raise ValueError("Segment shorter than its committed manifest extents")
+        return records, np.frombuffer(raw, dtype="float32").reshape(seg["count"], dim)
+
+    def _replay(self, vs: FAISS, seg: Dict[str, Any]) -> int:
+        if not seg["count"]:
+            return 0
+        records, vectors = self._read_segment(seg)
+        vs.add_embeddings(
+            text_embeddings=[(r["text"], v.tolist()) for r, v in zip(records, vectors)],
+            metadatas=[r["metadata"] for r in records],
+            ids=[r["id"] for r in records],
+        )
+        return len(records)
+
+    def _swap_in(self, vs: FAISS, generation: int):
+        # 1) write the new canonical files under a temporary name
+        vs.save_local(str(self.index_dir), index_name=self.next_name)
+        for suffix in (".faiss", ".pkl"):
+            with open(self.index_dir / f"{self.next_name}{suffix}", "rb") as f:
+                os.fsync(f.fileno())
+        write_docstore(vs, self.index_dir / f"{self.next_name}.docstore.sqlite")
+        # 2) commit the intent: from here a crash is finished by _recover()
+        manifest = self._empty_manifest(base_ntotal=vs.index.ntotal, generation=generation)
+        manifest["pending_swap"] = True
+        self._write_manifest(manifest)
+        self._recover()
+
+    def _recover(self) -> Dict[str, Any]:
+        """Finish an interrupted swap: move .next files into place and reset the segment."""
+        manifest = self.read_manifest()
+        for suffix, target in ((".faiss", self.faiss_path), (".pkl", self.pkl_path), (".docstore.sqlite", self.docstore_path)):
+            src = self.index_dir / f"{self.next_name}{suffix}"
+            if src.exists():
+                os.replace(src, target)
+        for path in (self.vec_path, self.log_path):
+            if path.exists():
+                with open(path, "r+b") as f:
+                    f.truncate(0)
+        manifest["pending_swap"] = False
+        self._write_manifest(manifest)
+        return manifest
+
+
+def load_faiss_index(
+    index_dir: str | Path,
+    embeddings: Embeddings,
+    index_name: str = "index",
+    search_params: Optional[Dict[str, Any]] = None,
+    read_only: bool = False,
+) -> FAISS:
+    """
+    Load an index written by FaissStore (or a plain save_local index). read_only loads
+    are memory-mapped and must not be added to.
+    """
+    store = FaissStore(index_dir, index_name)
+    vs = store.load_readonly(embeddings) if read_only else store.load(embeddings)
+    if search_params:
+        set_search_params(vs.index, **search_params)
+    return vs
@@ -1,5 +1,7 @@
 from __future__ import annotations
+import os
 import re
+import hashlib
 import uuid
 from pathlib import Path
 from datetime import datetime
@@ -10,6 +12,8 @@ from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
 
 #log = CustomLogger.get_logger(__name__)
 
@@ -20,6 +24,73 @@ def generate_session_id(prefix: str = "session") -> str:
     ist = ZoneInfo("Asia/Kolkata")
     return f"{prefix}_{datetime.now(ist).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
+def sha256_file(path: Path, block_size: int = 1024 * 1024) -> str:
+    """Hex sha256 of a file's bytes, read in fixed-size blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class UploadTooLargeError(ValueError):
+    pass
+
+def _iter_upload_chunks(uploaded, chunk_size: int):
+    if hasattr(uploaded, "read"):
+        for block in iter(lambda: uploaded.read(chunk_size), b""):
+            yield block
+    else:
+        view = memoryview(uploaded.getbuffer())  # fallback: already in memory, don't copy it
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+
+def stream_to_disk(uploaded, out_path: Path, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    Copy an uploaded file to out_path in fixed-size blocks and return its hex sha256.
+
+    The declared size (if any) is checked before reading, and the running total while
+    copying, so an oversized upload is rejected without ever holding it in memory.
+    Data goes to a temporary sibling first and is renamed into place when complete.
+    """
+    name = getattr(uploaded, "name", str(out_path))
+    declared = getattr(uploaded, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise UploadTooLargeError(f"{name} is {declared} bytes; limit is {max_bytes} bytes")
+
+    out_path = Path(out_path)
+    tmp_path = out_path.with_name(out_path.name + ".part")
+    h = hashlib.sha256()
+    written = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for block in _iter_upload_chunks(uploaded, chunk_size):
+                written += len(block)
+                if written > max_bytes:
+                    raise UploadTooLargeError(f"{name} exceeds the upload limit of {max_bytes} bytes")
+                h.update(block)
+                f.write(block)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return h.hexdigest()
+
+def sha256_upload(fileobj, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    Hex sha256 of a seekable upload stream, read in blocks and rewound afterwards, so
+    a result can be looked up by content before anything is saved.
+    """
+    h = hashlib.sha256()
+    read = 0
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(chunk_size), b""):
+        read += len(block)
+        if read > max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes")
+        h.update(block)
+    fileobj.seek(0)
+    return h.hexdigest()
+
 def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
     """Save uploaded files (Streamlit-like) and return local paths."""
     try:
@@ -36,11 +107,7 @@ def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path
             fname = f"{safe_name}_{uuid.uuid4().hex[:6]}{ext}"
             fname = f"{uuid.uuid4().hex[:8]}{ext}"
             out = target_dir / fname
-            with open(out, "wb") as f:
-                if hasattr(uf, "read"):
-                    f.write(uf.read())
-                else:
-                    f.write(uf.getbuffer())  # fallback
+            stream_to_disk(uf, out)
             saved.append(out)
             print("""log.info("File saved for ingestion", uploaded=name, saved_as=str(out))""")
         return saved
@@ -0,0 +1,158 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+# SQLite caps bound parameters per statement, so IN (...) lookups go in slices
+_SLICE = 500
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+_STORES: Dict[Path, "ChunkMetadataStore"] = {}
+_STORES_LOCK = threading.Lock()
+
+
+class ChunkMetadataStore:
+    """
+    SQLite (WAL) store of what a FAISS index already contains.
+
+    chunks    one row per indexed chunk: fingerprint (primary key), doc_sha256, source,
+              session_id, page; secondary indexes on source, session and document
+    documents one row per ingested document: doc_sha256 -> source, session, chunk count
+
+    Replaces the ingested_meta.json file, which was loaded whole and rewritten on every
+    add. Writes are batched into a single transaction; other workers can keep reading
+    while one of them writes. Use for_index() to share one connection per index dir;
+    an index built before this store existed is backfilled once (see backfill()).
+    """
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._backfill_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " fingerprint TEXT PRIMARY KEY, doc_sha256 TEXT, source TEXT, session_id TEXT,"
+            " page INTEGER, created_at TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source);"
+            "CREATE INDEX IF NOT EXISTS idx_chunks_session ON chunks (session_id);"
+            "CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks (doc_sha256);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_sha256 TEXT PRIMARY KEY, source TEXT, session_id TEXT, chunks INTEGER NOT NULL DEFAULT 0,"
+            " created_at TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_documents_session ON documents (session_id);"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def for_index(cls, index_dir: str | Path) -> "ChunkMetadataStore":
+        """Process-wide store for index_dir (reopened if its file was deleted)."""
+        db_path = (Path(index_dir) / "ingested_meta.sqlite").resolve()
+        with _STORES_LOCK:
+            store = _STORES.get(db_path)
+            if store is None or not db_path.exists():
+                if store is not None:
+                    store.close()
+                store = _STORES[db_path] = cls(db_path)
+            return store
+
+    # ---------- Lookups ----------
+
+    def _existing(self, table: str, column: str, keys: Iterable[str]) -> Set[str]:
+        keys = list({k for k in keys if k})
+        found: Set[str] = set()
+        with self._lock:
+            for i in range(0, len(keys), _SLICE):
+                part = keys[i:i + _SLICE]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", part
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def existing_fingerprints(self, fingerprints: Iterable[str]) -> Set[str]:
+        return self._existing("chunks", "fingerprint", fingerprints)
+
+    def existing_documents(self, doc_hashes: Iterable[str]) -> Set[str]:
+        return self._existing("documents", "doc_sha256", doc_hashes)
+
+    def chunks_by_source(self, source: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM chunks WHERE source = ?", (source,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def documents_by_session(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM documents WHERE session_id = ?", (session_id,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # ---------- Writes ----------
+
+    def add_chunks(self, records: List[Dict[str, Any]]):
+        """
+        Insert chunk records (fingerprint, doc_sha256, source, session_id, page) in one
+        transaction and bump the per-document chunk counts.
+        """
+        if not records:
+            return
+        now = _now()
+        chunk_rows = [
+            (r["fingerprint"], r.get("doc_sha256"), r.get("source"), r.get("session_id"), r.get("page"), now)
+            for r in records
+        ]
+        per_doc: Dict[str, Dict[str, Any]] = {}
+        for r in records:
+            if r.get("doc_sha256"):
+                entry = per_doc.setdefault(r["doc_sha256"], {"source": r.get("source"), "session_id": r.get("session_id"), "chunks": 0})
+                entry["chunks"] += 1
+        doc_rows = [(h, e["source"], e["session_id"], e["chunks"], now) for h, e in per_doc.items()]
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO chunks (fingerprint, doc_sha256, source, session_id, page, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    chunk_rows,
+                )
+                self._conn.executemany(
+                    "INSERT INTO documents (doc_sha256, source, session_id, chunks, created_at) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(doc_sha256) DO UPDATE SET chunks = chunks + excluded.chunks",
+                    doc_rows,
+                )
+
+    def backfill(self, build_records: Callable[[], List[Dict[str, Any]]]) -> int:
+        """
+        Fill an empty store from build_records() (the chunks of an existing index).
+        Runs at most once per store: a store that already has rows is left alone.
+        """
+        with self._backfill_lock:
+            if self.count():
+                return 0
+            records = build_records()
+            self.add_chunks(records)
+            return len(records)
+
+    def reset(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM chunks")
+                self._conn.execute("DELETE FROM documents")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
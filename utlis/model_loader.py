@@ -1,7 +1,13 @@
 import os
+import json
 import sys
+import threading
+from typing import Any, Dict, Optional, Tuple
 from dotenv import load_dotenv #type:ignore
 from utlis.config_loader import load_config
+from utlis.embedding_cache import CachedEmbeddings
+from utlis.embedding_executor import BatchedEmbeddings
+from utlis.structured_output import native_json_mode
 
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
@@ -12,16 +18,18 @@ from langchain_openai.chat_models import ChatOpenAI #type:ignore
 
 log = CustomLogger().get_logger(__name__)
 
+CONFIG_PATH = os.getenv("CONFIG_PATH", "config/config.yaml")
+
 class ModelLoader:
     """
     A class to load and manage LLM and embeddings based on configuration settings.
     """
     
-    def __init__(self):
+    def __init__(self, config_path: str = CONFIG_PATH):
         # Load the environment variables from .env file
         load_dotenv()
         self._validate_env()
-        self.config = load_config('config/config.yaml')
+        self.config = load_config(config_path)
         log.info("Configuration loaded successfully.", config_keys=list(self.config.keys()))
 
     def _validate_env(self):
@@ -36,6 +44,36 @@ class ModelLoader:
             raise DocumentPortalException(f"Missing required environment variables", sys)
         log.info("All required environment variables are set", available_keys=list(self.api_keys.keys()))
         
+    def embedding_settings(self) -> Dict[str, Any]:
+        """
+        Resolve the embedding provider and model name from configuration.
+        """
+        embedding_config = self.config['embedding_model']['google']
+        return {
+            "provider": embedding_config.get('provider', 'google'),
+            "model_name": embedding_config['model_name'],
+        }
+
+    def llm_settings(self) -> Dict[str, Any]:
+        """
+        Resolve the LLM provider block selected by the LLM_PROVIDER env var.
+        """
+        llm_block = self.config['llm']
+        provider_key = os.getenv('LLM_PROVIDER', "groq")
+
+        if provider_key not in llm_block:
+            log.error("LLM provider not available in config", provider_key= provider_key)
+            raise ValueError(f"Provider {provider_key} not in the config")
+
+        llm_config = llm_block[provider_key]
+        return {
+            "provider": llm_config.get('provider'),
+            "model_name": llm_config.get('model_name'),
+            "temperature": llm_config.get('temperature', 0.2),
+            "max_tokens": llm_config.get('max_tokens', 2048),
+            "json_mode": bool(llm_config.get('json_mode', False)),
+        }
+
     def load_embeddings(self):
         """
         Load embeddings based on configuration.
@@ -43,7 +81,7 @@ class ModelLoader:
         try:
             log.info("Loading embeddings...")
             # google embedding
-            model_name=self.config['embedding_model']['google']['model_name']
+            model_name=self.embedding_settings()['model_name']
             return GoogleGenerativeAIEmbeddings(model=model_name)
             
         except Exception as e:
@@ -54,21 +92,13 @@ class ModelLoader:
         """
         Load model based on configuration
         """
-        
-        llm_block = self.config['llm']
         log.info('Loading LLM......')
-        
-        provider_key = os.getenv('LLM_PROVIDER', "groq")
-        
-        if provider_key not in llm_block:
-            log.error("LLM provider not available in config", provider_key= provider_key)
-            raise ValueError(f"Provider {provider_key} not in the config")
-        
-        llm_config = llm_block[provider_key]
-        provider= llm_config.get('provider')
-        model_name= llm_config.get('model_name')
-        temperature= llm_config.get('temperature', 0.2)  
-        max_tokens= llm_config.get('max_tokens', 2048)
+
+        settings = self.llm_settings()
+        provider= settings['provider']
+        model_name= settings['model_name']
+        temperature= settings['temperature']
+        max_tokens= settings['max_tokens']
         
         if provider == 'groq':
             llm = ChatGroq(
@@ -93,6 +123,118 @@ class ModelLoader:
             )
             
         return llm
+
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe cache of LLM and embedding clients.
+
+    Clients are keyed by provider and model settings, so every request served by a
+    worker reuses the same instance (and its HTTP connection pool). The config file
+    mtime is checked on each lookup; when it changes the registry reloads itself.
+    """
+
+    def __init__(self, config_path: str = CONFIG_PATH):
+        self.config_path = config_path
+        self._lock = threading.RLock()
+        self._loader: Optional[ModelLoader] = None
+        self._config_mtime: Optional[float] = None
+        self._llms: Dict[Tuple, Any] = {}
+        self._embeddings: Dict[Tuple, Any] = {}
+
+    def _read_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+
+    def _current_loader(self) -> ModelLoader:
+        mtime = self._read_mtime()
+        with self._lock:
+            if self._loader is None or mtime != self._config_mtime:
+                if self._loader is not None:
+                    log.info("Config change detected, reloading model registry", config_path=self.config_path)
+                self._reset()
+                self._loader = ModelLoader(self.config_path)
+                self._config_mtime = mtime
+            return self._loader
+
+    def _reset(self):
+        self._loader = None
+        self._llms.clear()
+        self._embeddings.clear()
+
+    @property
+    def config(self) -> dict:
+        return self._current_loader().config
+
+    def llm_identity(self) -> str:
+        """
+        Stable string naming the configured LLM (provider, model and settings), for cache keys.
+        """
+        return json.dumps(self._current_loader().llm_settings(), sort_keys=True, default=str)
+
+    def get_llm(self):
+        """
+        Return the shared LLM client for the currently configured provider.
+        """
+        loader = self._current_loader()
+        key = tuple(sorted(loader.llm_settings().items()))
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is None:
+                llm = loader.load_llm()
+                self._llms[key] = llm
+                log.info("LLM registered", settings=dict(key))
+            return llm
+
+    def get_json_llm(self):
+        """
+        The shared LLM with the provider's native JSON output mode bound, when the
+        config enables it; used for calls whose output is parsed as JSON.
+        """
+        return native_json_mode(self.get_llm(), self._current_loader().llm_settings())
+
+    def get_embeddings(self):
+        """
+        Return the shared embeddings client for the configured embedding model.
+        Cache misses go through the batched, rate-limited embedding executor.
+        """
+        loader = self._current_loader()
+        settings = loader.embedding_settings()
+        key = tuple(sorted(settings.items()))
+        with self._lock:
+            emb = self._embeddings.get(key)
+            if emb is None:
+                batched = BatchedEmbeddings.from_config(
+                    loader.load_embeddings(),
+                    settings['provider'],
+                    loader.config.get('embedding_executor', {}),
+                )
+                emb = CachedEmbeddings(batched, settings['model_name'])
+                self._embeddings[key] = emb
+                log.info("Embeddings registered", settings=dict(key))
+            return emb
+
+    def warm_up(self):
+        """
+        Build the default LLM and embeddings eagerly (called at app startup).
+        """
+        self.get_llm()
+        self.get_embeddings()
+        log.info("Model registry warmed up", llms=len(self._llms), embeddings=len(self._embeddings))
+
+    def reload(self):
+        """
+        Drop every cached client and re-read the config on next access.
+        """
+        with self._lock:
+            self._reset()
+            self._config_mtime = None
+        log.info("Model registry reset")
+
+
+MODEL_REGISTRY = ModelRegistry()
     
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import fitz  # type: ignore
+
+# Kept free of logger/model imports: this module is imported by every pool worker.
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(8, os.cpu_count() or 1))))
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "50"))
+PDF_SERIAL_THRESHOLD = int(os.getenv("PDF_SERIAL_THRESHOLD", "64"))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: the API process is multi-threaded, so forking it is unsafe
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def shutdown_pool():
+    """Stop the extraction worker processes (application shutdown); a later call starts a new pool."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=True, cancel_futures=True)
+            _POOL = None
+
+
+def _extract_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(i).get_text() for i in range(start, stop)]  # type: ignore
+
+
+def page_count(pdf_path: str | Path) -> int:
+    with fitz.open(str(pdf_path)) as doc:
+        if doc.needs_pass:
+            raise ValueError(f"PDF is encrypted: {Path(pdf_path).name}")
+        return doc.page_count
+
+
+def _pdf_date(value: str) -> str:
+    # PDF dates look like D:20240131094500+05'30' -> 2024-01-31T09:45:00
+    digits = (value or "").removeprefix("D:")[:14]
+    if len(digits) < 8 or not digits.isdigit():
+        return ""
+    date = f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]}"
+    return f"{date}T{digits[8:10]}:{digits[10:12]}:{digits[12:14]}" if len(digits) == 14 else date
+
+
+def pdf_metadata(pdf_path: str | Path) -> Dict[str, Any]:
+    """
+    Document-info fields straight from the PDF (no text extraction): title, author,
+    creation/modification dates and page count. Missing fields are empty strings.
+    """
+    with fitz.open(str(pdf_path)) as doc:
+        meta = doc.metadata or {}
+        return {
+            "title": (meta.get("title") or "").strip(),
+            "author": (meta.get("author") or "").strip(),
+            "created": _pdf_date(meta.get("creationDate") or ""),
+            "modified": _pdf_date(meta.get("modDate") or ""),
+            "page_count": doc.page_count,
+        }
+
+
+def shard_ranges(total: int, shard_size: int) -> List[Tuple[int, int]]:
+    shard_size = max(1, shard_size)
+    return [(start, min(start + shard_size, total)) for start in range(0, total, shard_size)]
+
+
+def extract_pages(
+    pdf_path: str | Path,
+    workers: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    serial_threshold: Optional[int] = None,
+) -> List[str]:
+    """
+    Extract the text of every page with PyMuPDF, in page order.
+
+    Documents with more than serial_threshold pages are split into shard_size page
+    ranges that are extracted concurrently on a shared process pool; smaller ones
+    (or workers <= 1) are read serially in-process, where pool overhead would dominate.
+    """
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    shard_size = PDF_SHARD_PAGES if shard_size is None else shard_size
+    serial_threshold = PDF_SERIAL_THRESHOLD if serial_threshold is None else serial_threshold
+
+    path = str(pdf_path)
+    total = page_count(path)
+    if workers <= 1 or total <= serial_threshold:
+        return _extract_range(path, 0, total)
+
+    ranges = shard_ranges(total, shard_size)
+    pool = _get_pool(workers)
+    futures = [pool.submit(_extract_range, path, start, stop) for start, stop in ranges]
+    pages: List[str] = []
+    for future in futures:  # futures are in shard order, so pages stay in page order
+        pages.extend(future.result())
+    return pages
@@ -0,0 +1,161 @@
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence
+from prompt.prompt_library import PROMPT_REGISTRY
+from logger import GLOBAL_LOGGER as log
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def prompt_version(prompt_names: Iterable[str], *extra: str) -> str:
+    """
+    Short hash of the named PROMPT_REGISTRY templates plus any extra strings (e.g.
+    output-format instructions). Editing a prompt or schema changes the version, so
+    results produced by the old one are never served again.
+    """
+    h = hashlib.sha256()
+    for name in prompt_names:
+        h.update(name.encode("utf-8"))
+        h.update(PROMPT_REGISTRY[name].pretty_repr().encode("utf-8"))
+    for part in extra:
+        h.update(part.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Persistent SQLite cache of finished /analyze and /compare results.
+
+    Keys combine the operation, the uploaded files' sha256s (in order), the prompt
+    version and the model identity, so a hit is exactly the output the same pipeline
+    would produce again. Entries expire after ttl_seconds; beyond max_entries or
+    max_bytes of stored JSON the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        enabled: bool = RESULT_CACHE_ENABLED,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, kind TEXT NOT NULL, result TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used);"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(kind: str, sha256s: Sequence[str], version: str, model: str) -> str:
+        return hashlib.sha256("\n".join([kind, *sha256s, version, model]).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, kind: str, result: Any):
+        if not self.enabled:
+            return
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, kind, result, size, created_at, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, kind, payload, len(payload.encode("utf-8")), now, now),
+                )
+                self._evict(now)
+
+    def _evict(self, now: float):
+        # Caller holds the lock inside a transaction
+        if self.ttl_seconds:
+            self.evictions += self._conn.execute(
+                "DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        log.info("Result cache evicted entries", evicted=len(doomed), entries=count, bytes=total)
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM results")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "path": str(self.db_path),
+                "entries": count,
+                "bytes": total,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_CACHE: Optional[ResultCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide result cache; path from RESULT_CACHE_PATH."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResultCache(os.getenv("RESULT_CACHE_PATH", os.path.join("cache", "results.sqlite")))
+        return _CACHE
@@ -0,0 +1,150 @@
+from __future__ import annotations
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document  # type: ignore
+from logger import GLOBAL_LOGGER as log
+
+# Keeps identifiers such as "12.3", "INV-2024-0042" or "SKU/77-A" as single terms
+# ("12.3(b)" gives "12.3" and "b": parentheses are not joined)
+_TOKEN_RE = re.compile(r"\w+(?:[.\-/]\w+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        tokens.append(tok)
+        if not tok.isalnum():
+            # Also index the parts, so "2024" still matches "INV-2024-0042"
+            tokens.extend(p for p in re.split(r"[.\-/]", tok) if p and p not in _STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index over the chunks of one FAISS index (one session).
+
+    Stored in SQLite (WAL) next to the FAISS files: postings(term, doc, tf) indexed by
+    term, per-term document frequencies, and the chunk text/metadata under the same
+    docstore id FAISS uses, so sparse and dense hits can be fused by id. add() is
+    incremental: only the new chunks' postings are written.
+    """
+
+    def __init__(self, db_path: str | Path, k1: float = 1.5, b: float = 0.75):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs (rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,"
+            " length INTEGER NOT NULL, text TEXT, metadata TEXT);"
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, doc)) WITHOUT ROWID;"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def for_index(cls, index_dir: str | Path, settings: Optional[Dict[str, Any]] = None) -> "BM25Index":
+        settings = settings or {}
+        return cls(Path(index_dir) / "sparse.sqlite", k1=float(settings.get("k1", 1.5)), b=float(settings.get("b", 0.75)))
+
+    @staticmethod
+    def exists_for(index_dir: str | Path) -> bool:
+        return (Path(index_dir) / "sparse.sqlite").exists()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[dict]] = None):
+        """Index new chunks; ids already present are skipped."""
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        added = 0
+        with self._lock:
+            with self._conn:
+                df: Counter = Counter()
+                for doc_id, text, md in zip(ids, texts, metadatas):
+                    tf = Counter(tokenize(text))
+                    cur = self._conn.execute(
+                        "INSERT OR IGNORE INTO docs (id, length, text, metadata) VALUES (?, ?, ?, ?)",
+                        (doc_id, sum(tf.values()), text, json.dumps(md or {}, ensure_ascii=False, default=str)),
+                    )
+                    if not cur.rowcount:
+                        continue
+                    added += 1
+                    self._conn.executemany(
+                        "INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                        [(term, cur.lastrowid, n) for term, n in tf.items()],
+                    )
+                    df.update(tf.keys())
+                self._conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                    list(df.items()),
+                )
+        log.info("Sparse index updated", path=str(self.db_path), added=added)
+
+    def reset(self):
+        with self._lock:
+            with self._conn:
+                for table in ("postings", "terms", "docs"):
+                    self._conn.execute(f"DELETE FROM {table}")
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score for query, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            n_docs, total_len = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            avg_len = total_len / n_docs
+            dfs = dict(self._conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms).fetchall())
+            rows = self._conn.execute(
+                f"SELECT p.term, p.doc, p.tf, d.length FROM postings p JOIN docs d ON d.rowid = p.doc"
+                f" WHERE p.term IN ({placeholders})",
+                terms,
+            ).fetchall()
+
+            scores: Dict[int, float] = {}
+            for term, doc, tf, length in rows:
+                df = dfs.get(term, 0)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+                scores[doc] = scores.get(doc, 0.0) + idf * norm
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            if not top:
+                return []
+            docs = {
+                rowid: (doc_id, text, metadata)
+                for rowid, doc_id, text, metadata in self._conn.execute(
+                    f"SELECT rowid, id, text, metadata FROM docs WHERE rowid IN ({','.join('?' * len(top))})",
+                    [rowid for rowid, _ in top],
+                ).fetchall()
+            }
+        return [
+            (Document(page_content=docs[rowid][1], metadata=json.loads(docs[rowid][2]), id=docs[rowid][0]), score)
+            for rowid, score in top
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+from langchain_community.docstore.base import Docstore  # type: ignore
+from langchain_core.documents import Document  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+
+
+def write_docstore(vs: FAISS, path: str | Path):
+    """
+    Write vs's docstore and position -> id mapping to a fresh SQLite file at path.
+
+    The file is written once per compaction and never modified afterwards, so it uses
+    the default rollback journal (no -wal side files to carry along on rename).
+    """
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute("CREATE TABLE docs (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, text TEXT, metadata TEXT)")
+        rows = []
+        for position, doc_id in sorted(vs.index_to_docstore_id.items()):
+            doc = vs.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                rows.append((position, doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str)))
+        conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+    finally:
+        conn.close()
+
+
+class SqliteDocstore(Docstore):
+    """
+    Read-only docstore over a file written by write_docstore.
+
+    Documents are fetched on demand with indexed lookups instead of unpickling the
+    whole docstore, so a worker only pays for the chunks its queries actually return
+    and the file's pages are shared between workers through the OS page cache.
+
+    extend() appends in-memory documents after the file's positions; the read-only
+    loader uses it for segment records that are not compacted into the file yet.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._base_count = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        self._tail_ids: List[str] = []
+        self._tail: Dict[str, Document] = {}
+        self._tail_positions: Dict[str, int] = {}
+
+    def extend(self, ids: List[str], docs: List[Document]):
+        for doc_id, doc in zip(ids, docs):
+            self._tail_positions[doc_id] = self._base_count + len(self._tail_ids)
+            self._tail_ids.append(doc_id)
+            self._tail[doc_id] = doc
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._tail:
+            return self._tail[search]
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]), id=search)
+
+    def id_for_position(self, position: int) -> str:
+        if position >= self._base_count:
+            try:
+                return self._tail_ids[position - self._base_count]
+            except IndexError:
+                raise KeyError(position) from None
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM docs WHERE position = ?", (position,)).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def position_for_id(self, doc_id: str):
+        if doc_id in self._tail_positions:
+            return self._tail_positions[doc_id]
+        with self._lock:
+            row = self._conn.execute("SELECT position FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def count(self) -> int:
+        return self._base_count + len(self._tail_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LazyIndexToDocstoreId(Mapping):
+    """FAISS position -> docstore id, resolved from the SQLite file on lookup."""
+
+    def __init__(self, docstore: SqliteDocstore):
+        self._docstore = docstore
+
+    def __getitem__(self, position: int) -> str:
+        return self._docstore.id_for_position(int(position))
+
+    def __len__(self) -> int:
+        return self._docstore.count()
+
+    def __iter__(self) -> Iterator[int]:
+        with self._docstore._lock:
+            rows = self._docstore._conn.execute("SELECT position FROM docs ORDER BY position").fetchall()
+        tail = range(self._docstore._base_count, self._docstore.count())
+        return iter([r[0] for r in rows] + list(tail))
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import re
+import json
+import threading
+from typing import Any, Dict, Optional
+from langchain_core.exceptions import OutputParserException  # type: ignore
+from langchain_core.output_parsers import BaseOutputParser, JsonOutputParser  # type: ignore
+from langchain.output_parsers import OutputFixingParser  # type: ignore
+from logger import GLOBAL_LOGGER as log
+
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL | re.IGNORECASE)
+_OPEN_THINK_RE = re.compile(r"^\s*<think>.*?(?=[\[{])", re.DOTALL | re.IGNORECASE)
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+
+
+def native_json_mode(llm: Any, settings: Dict[str, Any]) -> Any:
+    """
+    Bind the provider's own JSON output mode when the config enables it (llm.<provider>.json_mode).
+
+    OpenAI and Groq get response_format=json_object (Groq also hides reasoning so r1-style
+    models do not emit <think> blocks); Google gets response_mime_type=application/json.
+    Other providers, or json_mode: false, return the model unchanged.
+    """
+    if not settings.get("json_mode"):
+        return llm
+    provider = settings.get("provider")
+    if provider == "openai":
+        return llm.bind(response_format={"type": "json_object"})
+    if provider == "groq":
+        return llm.bind(response_format={"type": "json_object"}, reasoning_format="hidden")
+    if provider == "google":
+        return llm.bind(response_mime_type="application/json")
+    return llm
+
+
+def _balanced_json(text: str) -> Optional[str]:
+    """The first complete top-level JSON object/array in text (string-aware bracket matching)."""
+    start = next((i for i, ch in enumerate(text) if ch in "{["), None)
+    if start is None:
+        return None
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Drop commas directly before a closing } or ] (string-aware, so string values are untouched)."""
+    out = []
+    in_string, escaped = False, False
+    pending = None  # index in out of a comma that may turn out to be trailing
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            pending = len(out)
+        elif ch in "}]" and pending is not None:
+            del out[pending]
+        if ch != "," and not ch.isspace():
+            pending = None
+        out.append(ch)
+    return "".join(out)
+
+
+def repair_json_text(text: str) -> str:
+    """
+    Local fixes for the usual ways a model wraps or breaks JSON: <think> reasoning
+    blocks, markdown code fences, prose around the payload and trailing commas.
+    """
+    text = _THINK_RE.sub("", text)
+    text = _OPEN_THINK_RE.sub("", text)  # reasoning cut off before its closing tag
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    text = _balanced_json(text) or text
+    return _strip_trailing_commas(text).strip()
+
+
+class StructuredOutputStats:
+    """
+    Process-wide counters of how each structured output was obtained: parsed as
+    returned, repaired locally, fixed by an extra LLM call, or not at all.
+    """
+
+    STAGES = ("direct", "repaired", "llm_fixed", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {stage: 0 for stage in self.STAGES}
+
+    def record(self, stage: str, source: str):
+        with self._lock:
+            self._counts[stage] += 1
+        if stage != "direct":
+            log.info("Structured output recovered" if stage != "failed" else "Structured output failed", stage=stage, source=source)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        # Each local repair is an OutputFixingParser round-trip that did not happen
+        counts["llm_calls_avoided"] = counts["repaired"]
+        return counts
+
+
+STRUCTURED_OUTPUT_STATS = StructuredOutputStats()
+
+
+class RobustJsonOutputParser(BaseOutputParser[Any]):
+    """
+    JSON output parser with staged recovery.
+
+    1. Parse the completion as-is with the wrapped JsonOutputParser.
+    2. Repair it locally (repair_json_text) and parse again.
+    3. Only then send it to the LLM through OutputFixingParser.
+
+    With expect_list, an object wrapping a single list (what providers' JSON-object
+    modes return for list schemas) is unwrapped to that list.
+    """
+
+    parser: JsonOutputParser
+    llm: Any = None
+    source: str = "llm"
+    expect_list: bool = False
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def _type(self) -> str:
+        return "robust_json"
+
+    def get_format_instructions(self) -> str:
+        return self.parser.get_format_instructions()
+
+    def _shape(self, result: Any) -> Any:
+        if self.expect_list and isinstance(result, dict):
+            lists = [v for v in result.values() if isinstance(v, list)]
+            if len(lists) == 1:
+                return lists[0]
+            if "Page" in result:
+                return [result]
+        return result
+
+    def _local(self, text: str) -> Optional[Any]:
+        try:
+            result = self.parser.parse(text)
+            STRUCTURED_OUTPUT_STATS.record("direct", self.source)
+            return self._shape(result)
+        except (OutputParserException, ValueError):
+            pass
+        try:
+            result = json.loads(repair_json_text(text))
+            STRUCTURED_OUTPUT_STATS.record("repaired", self.source)
+            return self._shape(result)
+        except ValueError:
+            return None
+
+    def _fixer(self) -> OutputFixingParser:
+        return OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
+
+    async def aparse_result(self, result, *, partial: bool = False) -> Any:
+        return await self.aparse(result[0].text)
+
+    def parse(self, text: str) -> Any:
+        result = self._local(text)
+        if result is not None:
+            return result
+        if self.llm is None:
+            STRUCTURED_OUTPUT_STATS.record("failed", self.source)
+            raise OutputParserException(f"Invalid JSON output: {text[:200]}", llm_output=text)
+        try:
+            result = self._fixer().parse(text)
+        except Exception:
+            STRUCTURED_OUTPUT_STATS.record("failed", self.source)
+            raise
+        STRUCTURED_OUTPUT_STATS.record("llm_fixed", self.source)
+        return self._shape(result)
+
+    async def aparse(self, text: str) -> Any:
+        result = self._local(text)
+        if result is not None:
+            return result
+        if self.llm is None:
+            STRUCTURED_OUTPUT_STATS.record("failed", self.source)
+            raise OutputParserException(f"Invalid JSON output: {text[:200]}", llm_output=text)
+        try:
+            result = await self._fixer().aparse(text)
+        except Exception:
+            STRUCTURED_OUTPUT_STATS.record("failed", self.source)
+            raise
+        STRUCTURED_OUTPUT_STATS.record("llm_fixed", self.source)
+        return self._shape(result)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from logger import GLOBAL_LOGGER as log
+
+INDEX_FILE_SUFFIXES = (".faiss", ".pkl", ".docstore.sqlite", ".manifest.json")
+
+
+class VectorStoreCache:
+    """
+    Session-keyed LRU cache of loaded FAISS vectorstores.
+
+    Entries are bounded both by count and by an estimated byte budget (on-disk size of
+    the index files). Each entry remembers the mtime/size signature of its files, so an
+    index rewritten by another worker is reloaded instead of served stale.
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(index_dir: str | Path, index_name: str) -> str:
+        return f"{Path(index_dir).resolve()}::{index_name}"
+
+    @staticmethod
+    def _signature(index_dir: str | Path, index_name: str) -> Tuple[Tuple[int, int], ...]:
+        sig = []
+        for suffix in INDEX_FILE_SUFFIXES:
+            path = Path(index_dir) / f"{index_name}{suffix}"
+            try:
+                st = path.stat()
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((0, 0))
+        return tuple(sig)
+
+    def get_or_load(self, index_dir: str | Path, index_name: str, loader: Callable[[], Any]):
+        """
+        Return the cached vectorstore for index_dir, calling loader() on a miss.
+        """
+        key = self._key(index_dir, index_name)
+        signature = self._signature(index_dir, index_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["signature"] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["vectorstore"]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+
+        vectorstore = loader()
+        size = sum(s for _, s in signature)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {"vectorstore": vectorstore, "signature": signature, "bytes": size, "attached": {}}
+            self._bytes += size
+            self._evict()
+        log.info("Vectorstore cached", index_dir=str(index_dir), index_name=index_name, bytes=size)
+        return vectorstore
+
+    def get_attached(self, index_dir: str | Path, index_name: str, name: str, loader: Callable[[], Any]):
+        """
+        Return an object built over the same index (e.g. its BM25 index), kept on the
+        cached vectorstore's entry so it is dropped together with it. Without a cached
+        entry, loader() is called and the result is not kept.
+        """
+        key = self._key(index_dir, index_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and name in entry["attached"]:
+                return entry["attached"][name]
+        value = loader()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value = entry["attached"].setdefault(name, value)
+        return value
+
+    def invalidate(self, index_dir: str | Path, index_name: Optional[str] = None):
+        """
+        Drop cached vectorstores for index_dir (all index names if index_name is None).
+        """
+        prefix = f"{Path(index_dir).resolve()}::"
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)
+                    and (index_name is None or k == prefix + index_name)]
+            for k in keys:
+                self._drop(k)
+        if keys:
+            log.info("Vectorstore cache invalidated", index_dir=str(index_dir), entries=len(keys))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # ---------- Internals (caller holds the lock) ----------
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["bytes"]
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the byte budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            key, _ = next(iter(self._entries.items()))
+            self._drop(key)
+            self.evictions += 1
+            log.info("Vectorstore evicted from cache", key=key)
+
+
+VECTORSTORE_CACHE = VectorStoreCache(
+    max_entries=int(os.getenv("VECTORSTORE_CACHE_MAX_ENTRIES", "8")),
+    max_bytes=int(os.getenv("VECTORSTORE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))),
+)